@@ -0,0 +1,136 @@
+"""Generate valid C programs in the subset the compiler supports, for benchmarks.
+
+Usage: python -m benchmarks.corpus [--functions N] [--statements N] [--depth N]
+                                   [--nesting N] [--locals N] [--statics N] [--seed N] > program.c
+
+Every size parameter grows the program linearly: expressions and nested blocks are
+spines, a leaf or a single statement next to the part that recurses, so doubling the
+depth doubles their size. Functions only call functions defined before them and loops
+have constant trip counts, so every generated program terminates.
+"""
+import argparse
+import random
+from dataclasses import dataclass
+
+BINARY_OPERATORS = ["+", "-", "*", "<", "<=", ">", ">=", "==", "!=", "&&", "||"]
+UNARY_OPERATORS = ["-", "!", "~"]
+
+@dataclass(slots = True)
+class CorpusShape:
+    """Sizes of a generated program, each one a scaling axis of benchmarks.scaling_benchmark."""
+    functions: int = 20
+    statements: int = 10
+    depth: int = 3
+    nesting: int = 2
+    locals: int = 4
+    statics: int = 4
+
+
+class _Generator:
+    def __init__(self, shape, seed):
+        self.shape = shape
+        self.random = random.Random(seed)
+        self.lines = []
+        self.variables = []
+
+    def program(self):
+        for i in range(self.shape.statics):
+            type_ = "long" if i % 2 else "int"
+            self.lines.append(f"static {type_} s{i} = {i + 1};")
+        for i in range(self.shape.functions):
+            self.function(i)
+        self.main()
+        return "\n".join(self.lines) + "\n"
+
+    def function(self, index):
+        self.lines.append(f"{'long' if index % 2 else 'int'} f{index}(int a, long b) {{")
+        self.variables = ["a", "b"] + [f"s{i}" for i in range(self.shape.statics)]
+        for i in range(self.shape.locals):
+            type_ = "long" if i % 2 else "int"
+            self.lines.append(f"    {type_} v{i} = {self.expression(1)};")
+            self.variables.append(f"v{i}")
+        self.block(index, self.shape.nesting, 1)
+        self.lines.append(f"    return {self.expression(self.shape.depth)};")
+        self.lines.append("}")
+
+    def block(self, function, nesting, indent):
+        """The function's statements, wrapped in nesting levels of nested control flow."""
+        # Capped, so deep nesting does not make the source quadratic in size.
+        pad = "    " * min(indent, 4)
+        if nesting == 0:
+            for _ in range(self.shape.statements):
+                self.statement(function, pad)
+            return
+        self.statement(function, pad)
+        match nesting % 4:
+            case 0:
+                self.lines.append(f"{pad}if ({self.expression(1)}) {{")
+            case 1:
+                self.lines.append(f"{pad}for (int i{nesting} = 0; i{nesting} < 2; i{nesting} = i{nesting} + 1) {{")
+            case 2:
+                self.lines.append(f"{pad}{{")
+            case 3:
+                self.lines.append(f"{pad}do {{")
+        self.block(function, nesting - 1, indent + 1)
+        self.lines.append(f"{pad}}}" + (" while (0);" if nesting % 4 == 3 else ""))
+
+    def statement(self, function, pad):
+        target = self.random.choice(self.variables)
+        match self.random.randrange(6):
+            case 0 if function > 0:
+                callee = self.random.randrange(function)
+                self.lines.append(f"{pad}{target} = f{callee}({self.expression(1)}, {self.expression(1)});")
+            case 1:
+                self.lines.append(f"{pad}if ({self.expression(self.shape.depth)}) {target} = {self.expression(1)};"
+                                  f" else {target} = {self.expression(1)};")
+            case 2:
+                self.lines.append(f"{pad}{target} = {self.expression(self.shape.depth)} ? {self.leaf()} : {self.leaf()};")
+            case 3:
+                self.lines.append(f"{pad}{target} = {target} / ({self.leaf()} % 7 + 8);")
+            case _:
+                self.lines.append(f"{pad}{target} = {self.expression(self.shape.depth)};")
+
+    def expression(self, depth):
+        if depth <= 1:
+            return self.leaf()
+        inner = self.expression(depth - 1)
+        if self.random.randrange(4) == 0:
+            return f"{self.random.choice(UNARY_OPERATORS)}({inner})"
+        operator = self.random.choice(BINARY_OPERATORS)
+        if self.random.randrange(2):
+            return f"({inner} {operator} {self.leaf()})"
+        return f"({self.leaf()} {operator} {inner})"
+
+    def leaf(self):
+        if self.random.randrange(3) == 0:
+            return str(self.random.randrange(100))
+        return self.random.choice(self.variables)
+
+    def main(self):
+        self.lines.append("int main(void) {")
+        self.lines.append("    long sum = 0;")
+        for i in range(self.shape.functions):
+            self.lines.append(f"    sum = sum + f{i}({i}, {i}L);")
+        for i in range(self.shape.statics):
+            self.lines.append(f"    sum = sum + s{i};")
+        self.lines.append("    return (int) (sum % 256);")
+        self.lines.append("}")
+
+
+def generate(shape = None, seed = 0):
+    """Returns the source of a program of the given CorpusShape, the same for the same seed."""
+    return _Generator(shape or CorpusShape(), seed).program()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    defaults = CorpusShape()
+    for name in CorpusShape.__dataclass_fields__:
+        arg_parser.add_argument(f"--{name}", type=int, default=getattr(defaults, name))
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+    shape = CorpusShape(**{name: getattr(args, name) for name in CorpusShape.__dataclass_fields__})
+    print(generate(shape, args.seed), end="")
+
+
+if __name__ == "__main__":
+    main()
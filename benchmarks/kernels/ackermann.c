@@ -0,0 +1,19 @@
+#include "print.h"
+
+/* Deep, irregular recursion. */
+
+int ackermann(int m, int n) {
+    if (m == 0)
+        return n + 1;
+    if (n == 0)
+        return ackermann(m - 1, 1);
+    return ackermann(m - 1, ackermann(m, n - 1));
+}
+
+int main(void) {
+    long sum = 0;
+    for (int n = 0; n < 9; n = n + 1)
+        sum = sum + ackermann(3, n);
+    print_line(sum);
+    return 0;
+}
@@ -0,0 +1,46 @@
+#include "print.h"
+
+/* Multiplication, division and powers by repeated addition, as in tests/big_test.c. */
+
+int mul(int a, int b) {
+    int result = 0;
+    int i = 0;
+    while (i < b) {
+        result = result + a;
+        i = i + 1;
+    }
+    return result;
+}
+
+int div(int a, int b) {
+    int result = 0;
+    int sum = b;
+    while (sum <= a) {
+        result = result + 1;
+        sum = sum + b;
+    }
+    return result;
+}
+
+int mod(int a, int b) {
+    return a - mul(div(a, b), b);
+}
+
+int pow(int base, int exp) {
+    int result = 1;
+    for (int i = 0; i < exp; i = i + 1)
+        result = mul(result, base);
+    return result;
+}
+
+int main(void) {
+    long checksum = 0;
+    for (int round = 0; round < 160; round = round + 1) {
+        for (int a = 1; a < 120; a = a + 1) {
+            checksum = checksum + mod(mul(a, a + round), 7 + a % 5);
+            checksum = checksum + pow(a % 9 + 1, 6);
+        }
+    }
+    print_line(checksum);
+    return 0;
+}
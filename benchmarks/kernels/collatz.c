@@ -0,0 +1,30 @@
+#include "print.h"
+
+/* Longest Collatz chain: long arithmetic in a data dependent loop. */
+
+int chain_length(long n) {
+    int length = 1;
+    while (n != 1) {
+        if (n % 2 == 0)
+            n = n / 2;
+        else
+            n = 3 * n + 1;
+        length = length + 1;
+    }
+    return length;
+}
+
+int main(void) {
+    int longest = 0;
+    long start = 0;
+    for (long n = 1; n < 150000; n = n + 1) {
+        int length = chain_length(n);
+        if (length > longest) {
+            longest = length;
+            start = n;
+        }
+    }
+    print_line(start);
+    print_line(longest);
+    return 0;
+}
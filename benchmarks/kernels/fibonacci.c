@@ -0,0 +1,14 @@
+#include "print.h"
+
+/* Naive recursion: call overhead and argument passing. */
+
+int fibonacci(int n) {
+    if (n < 2)
+        return n;
+    return fibonacci(n - 1) + fibonacci(n - 2);
+}
+
+int main(void) {
+    print_line(fibonacci(33));
+    return 0;
+}
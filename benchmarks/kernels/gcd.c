@@ -0,0 +1,24 @@
+#include "print.h"
+
+/* Euclid's algorithm over every pair: recursion and remainder. */
+
+int gcd(int a, int b) {
+    if (b == 0)
+        return a;
+    return gcd(b, a % b);
+}
+
+int main(void) {
+    long sum = 0;
+    int coprime = 0;
+    for (int a = 1; a < 900; a = a + 1) {
+        for (int b = 1; b < 900; b = b + 1) {
+            int g = gcd(a, b);
+            sum = sum + g;
+            coprime = coprime + (g == 1);
+        }
+    }
+    print_line(sum);
+    print_line(coprime);
+    return 0;
+}
@@ -0,0 +1,27 @@
+#include "print.h"
+
+/* Trial division: loops dominated by remainder and compare. */
+
+int is_prime(int n) {
+    if (n < 2)
+        return 0;
+    for (int d = 2; d * d <= n; d = d + 1) {
+        if (n % d == 0)
+            return 0;
+    }
+    return 1;
+}
+
+int main(void) {
+    int count = 0;
+    long sum = 0;
+    for (int n = 0; n < 250000; n = n + 1) {
+        if (is_prime(n)) {
+            count = count + 1;
+            sum = sum + n;
+        }
+    }
+    print_line(count);
+    print_line(sum);
+    return 0;
+}
@@ -0,0 +1,16 @@
+int putchar(int c);
+
+int print_long(long n) {
+    if (n < 0) {
+        putchar(45);
+        n = -n;
+    }
+    if (n >= 10)
+        print_long(n / 10);
+    return putchar(48 + (int) (n % 10));
+}
+
+int print_line(long n) {
+    print_long(n);
+    return putchar(10);
+}
@@ -0,0 +1,23 @@
+#include "print.h"
+
+/* A linear congruential generator: static state, long multiply and remainder, conversions. */
+
+static long state = 12345;
+
+int next(void) {
+    state = (state * 1103515245L + 12345L) % 2147483648L;
+    return (int) (state / 65536L);
+}
+
+int main(void) {
+    long histogram = 0;
+    int mixed = 0;
+    for (int i = 0; i < 8000000; i = i + 1) {
+        int r = next();
+        histogram = histogram + r % 16;
+        mixed = mixed + (r - 16384) / 256;
+    }
+    print_line(histogram);
+    print_line(mixed);
+    return 0;
+}
@@ -0,0 +1,51 @@
+"""Compare the dispatch scanner in lexer.tokenize against the regex reference lexer.
+
+Usage: python -m benchmarks.lexer_benchmark [--copies N] [--repeat N] [files...]
+"""
+import argparse
+import subprocess
+import time
+from benchmarks import results
+from src.lexer import tokenize, regex_tokenize
+
+
+def best_time(func, code, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(code)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def token_stream(func, code):
+    return [(token.token_type, token.value) for token in func(code)]
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("files", nargs="*", default=results.DEFAULT_SOURCES)
+    arg_parser.add_argument("--copies", type=int, default=200, help="Times each source is repeated to build the input.")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timing runs per lexer, best is reported.")
+    args = arg_parser.parse_args()
+
+    # The lexer only ever sees preprocessed code, so benchmark on gcc -E output.
+    sources = [
+        subprocess.run(["gcc", "-E", "-P", file], capture_output=True, text=True, check=True).stdout
+        for file in args.files
+    ]
+    code = "\n".join(sources) * args.copies
+
+    if token_stream(tokenize, code) != token_stream(regex_tokenize, code):
+        raise SystemExit("Token streams differ between lexers")
+
+    lines = code.count("\n")
+    tokens = len(tokenize(code))
+    regex = best_time(regex_tokenize, code, args.repeat)
+    scanner = best_time(tokenize, code, args.repeat)
+    print(f"{lines} lines, {tokens} tokens")
+    print(f"{'regex':<10}{regex * 1000:10.1f} ms{tokens / regex:14.0f} tokens/s")
+    print(f"{'scanner':<10}{scanner * 1000:10.1f} ms{tokens / scanner:14.0f} tokens/s")
+    print(f"speedup   {regex / scanner:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
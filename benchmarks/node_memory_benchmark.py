@@ -0,0 +1,91 @@
+"""Report bytes per node for the slotted AST/IR/assembly classes against __dict__ based twins.
+
+Usage: python -m benchmarks.node_memory_benchmark [--count N] [--source FILE]
+
+With --source the file is compiled to legalized assembly and the node counts of
+its C AST, TACKY and assembly AST are used to estimate the whole program footprint.
+"""
+import argparse
+import inspect
+import subprocess
+import tempfile
+import tracemalloc
+from collections import Counter
+from dataclasses import fields, is_dataclass, make_dataclass, field
+from src import c_ast, ir_ast, assembly_ast, lexer, parser, emitter, asm_generator, asm_allocator
+from src.compilation_context import CompilationContext
+from src.semantic_analysis import symbol_table
+from src.semantic_analysis.semantic_analyser import validate_program
+
+NODE_MODULES = [c_ast, ir_ast, assembly_ast, symbol_table]
+
+
+def node_classes():
+    for module in NODE_MODULES:
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ == module.__name__ and is_dataclass(cls):
+                yield cls
+
+def dict_twin(cls):
+    return make_dataclass(cls.__name__, [(f.name, f.type, field(default=None)) for f in fields(cls)])
+
+def bytes_per_instance(cls, count):
+    kwargs = {f.name: None for f in fields(cls)}
+    objs = [None] * count
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(count):
+        objs[i] = cls(**kwargs)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / count
+
+def count_nodes(root):
+    counts = Counter()
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, list):
+            stack.extend(node)
+        elif is_dataclass(node) and not isinstance(node, type):
+            counts[type(node)] += 1
+            stack.extend(getattr(node, f.name) for f in fields(node))
+    return counts
+
+def compile_counts(source):
+    with tempfile.NamedTemporaryFile(suffix=".i") as preprocessed:
+        subprocess.run(["gcc", "-E", "-P", source, "-o", preprocessed.name], check=True)
+        program = parser.Parser(lexer.lex(preprocessed.name, stream=True)).parse_program()
+    ctx = CompilationContext()
+    program = validate_program(ctx, program)
+    ir = emitter.emit_program(ctx, program)
+    asm = asm_generator.lower_program(ctx, ir)
+    asm_allocator.legalize(ctx, asm)
+    counts = count_nodes(program) + count_nodes(ir) + count_nodes(asm)
+    counts.update(type(entry) for entry in ctx.symbol_table.values())
+    return counts
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--count", type=int, default=20000, help="Instances allocated per class.")
+    arg_parser.add_argument("--source", help="C file whose node counts weight the totals.")
+    args = arg_parser.parse_args()
+
+    sizes = {}
+    print(f"{'node':<24}{'__dict__':>10}{'slots':>10}{'saved':>8}")
+    for cls in node_classes():
+        before = bytes_per_instance(dict_twin(cls), args.count)
+        after = bytes_per_instance(cls, args.count)
+        sizes[cls] = (before, after)
+        print(f"{cls.__name__:<24}{before:10.0f}{after:10.0f}{1 - after / before:8.0%}")
+
+    if args.source:
+        counts = compile_counts(args.source)
+        before = sum(sizes[cls][0] * n for cls, n in counts.items() if cls in sizes)
+        after = sum(sizes[cls][1] * n for cls, n in counts.items() if cls in sizes)
+        print(f"\n{args.source}: {sum(counts.values())} nodes, "
+              f"{before / 1024:.1f} KiB with __dict__, {after / 1024:.1f} KiB slotted ({1 - after / before:.0%} saved)")
+
+
+if __name__ == "__main__":
+    main()
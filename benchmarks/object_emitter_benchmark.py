@@ -0,0 +1,124 @@
+"""Compare object_emitter against printing assembly and running it through as.
+
+Usage: python -m benchmarks.object_emitter_benchmark [--repeat N] [files...]
+
+Every object is checked to be byte for byte identical to the one as produces, for each
+given source and for a generated function that uses every instruction form the backend
+can emit with every register and operand kind.
+"""
+import argparse
+import io
+import os
+import subprocess
+import tempfile
+import time
+from benchmarks import results
+from src import lexer, parser, emitter, asm_generator, asm_allocator, code_emitter, object_emitter
+from src.assembly_ast import *
+from src.compilation_context import CompilationContext
+from src.gcc_runner import preprocess
+from src.semantic_analysis.semantic_analyser import validate_program
+from src.semantic_analysis.symbol_table import IntInit, LongInit
+
+IMMEDIATES = [0, 1, -1, 127, -128, 128, -129, 2147483647, -2147483648]
+WIDE_IMMEDIATES = [2147483648, -2147483649, 4294967295, 9223372036854775807, -9223372036854775808]
+
+
+def compile_to_asm(file):
+    ctx = CompilationContext()
+    c_ast = parser.Parser(lexer.stream_tokens(io.StringIO(preprocess(file)))).parse_program()
+    ir = emitter.emit_program(ctx, validate_program(ctx, c_ast))
+    asm = asm_generator.lower_program(ctx, ir)
+    asm_allocator.legalize(ctx, asm)
+    return ctx, asm
+
+def instruction_matrix():
+    """An AsmProgram with every instruction form for every register and operand kind."""
+    registers = [AsmReg(reg) for reg in AsmRegs]
+    memory = [AsmStack(-4), AsmStack(-128), AsmStack(-129), AsmStack(-100000), AsmData("local"), AsmData("external")]
+    sources = [AsmImm(value) for value in IMMEDIATES] + registers + memory
+    instructions = []
+    for t in AssemblyType:
+        for dst in registers + memory:
+            for src in sources:
+                if isinstance(src, (AsmStack, AsmData)) and not isinstance(dst, AsmReg):
+                    continue
+                instructions.append(AsmMov(t, src, dst))
+                instructions.append(AsmCmp(t, src, dst))
+                for binop in (AsmBinaryOperator.Add, AsmBinaryOperator.Sub):
+                    instructions.append(AsmBinary(binop, t, src, dst))
+                if isinstance(dst, AsmReg):
+                    instructions.append(AsmBinary(AsmBinaryOperator.Mult, t, src, dst))
+            for unop in AsmUnaryOperator:
+                instructions.append(AsmUnary(unop, t, dst))
+            instructions.append(AsmIdiv(t, dst))
+        instructions.append(AsmCdq(t))
+    for dst in registers:
+        instructions.extend(AsmMov(AssemblyType.Quadword, AsmImm(value), dst) for value in WIDE_IMMEDIATES)
+        instructions.append(AsmMovsx(AsmStack(-8), dst))
+        instructions.append(AsmMovsx(AsmData("external"), dst))
+        instructions.extend(AsmMovsx(src, dst) for src in registers)
+    for operand in registers + memory:
+        instructions.extend(AsmSetCC(cc, operand) for cc in AsmCondCode)
+        instructions.append(AsmPush(operand))
+    instructions.extend(AsmPush(AsmImm(value)) for value in IMMEDIATES)
+    # Branches both within and beyond reach of a short jump.
+    instructions[len(instructions) // 2:len(instructions) // 2] = [AsmLabel("middle")]
+    for i, cc in enumerate(AsmCondCode):
+        instructions.insert(i * 50, AsmJmpCC(cc, "middle"))
+        instructions.append(AsmJmpCC(cc, "end"))
+    instructions.extend([AsmJmp("middle"), AsmJmp("end"), AsmCall("helper"), AsmCall("external_function"),
+                         AsmLabel("end"), AsmRet()])
+    return AsmProgram([
+        AsmFunctionDef("matrix", True, instructions),
+        AsmFunctionDef("helper", False, [AsmCall("matrix"), AsmRet()]),
+        AsmStaticVar("local", False, 4, IntInit(3)),
+        AsmStaticVar("global_long", True, 8, LongInit(-1)),
+        AsmStaticVar("zeroed", False, 8, LongInit(0)),
+    ])
+
+def assemble_with_as(assembly_code, object_file):
+    subprocess.run(["as", "-o", object_file, "-"], input=assembly_code, text=True, check=True)
+    with open(object_file, "rb") as f:
+        return f.read()
+
+def best_time(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(label, ctx, asm, repeat, directory):
+    object_file = os.path.join(directory, "reference.o")
+    expected = assemble_with_as(code_emitter.emit_program_code(ctx, asm), object_file)
+    if object_emitter.emit_object(ctx, asm) != expected:
+        ours = os.path.join(directory, "ours.o")
+        with open(ours, "wb") as f:
+            f.write(object_emitter.emit_object(ctx, asm))
+        raise SystemExit(f"Object files differ for {label}, compare: objdump -dr {object_file} {ours}")
+
+    native = best_time(lambda: object_emitter.emit_object(ctx, asm), repeat)
+    external = best_time(lambda: assemble_with_as(code_emitter.emit_program_code(ctx, asm), object_file), repeat)
+    print(f"{label:<24}{len(expected):9} B{external * 1000:11.2f} ms{native * 1000:11.2f} ms{external / native:9.1f}x")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("files", nargs="*", default=results.DEFAULT_SOURCES)
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timing runs per backend, best is reported.")
+    args = arg_parser.parse_args()
+
+    print(f"{'input':<24}{'object':>11}{'as':>14}{'native':>14}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for file in args.files:
+            ctx, asm = compile_to_asm(file)
+            report(os.path.basename(file), ctx, asm, args.repeat, directory)
+        ctx = CompilationContext()
+        ctx.backend_symbol_table = {"helper": None, "external_function": None, "matrix": None}
+        report("instruction matrix", ctx, instruction_matrix(), args.repeat, directory)
+    print("All objects are identical to as output.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare the built-in preprocessor against spawning gcc -E -P.
+
+Usage: python -m benchmarks.preprocessor_benchmark [--functions N] [--repeat N] [files...]
+
+Startup is measured on each given file, throughput on a generated file of N functions
+that uses an include guard, object-like and function-like macros and conditionals.
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+from benchmarks import results
+from src import preprocessor
+from src.lexer import tokenize
+
+HEADER = """\
+#ifndef GENERATED_H
+#define GENERATED_H
+#define SQUARE(x) ((x) * (x))
+#define MAX(a, b) ((a) > (b) ? (a) : (b))
+#define SCALE 3
+#endif
+"""
+
+FUNCTION = """\
+#if SCALE > 2
+int f{i}(int a, int b) {{ /* scaled */ return MAX(SQUARE(a), b) * SCALE + {i}; }}
+#else
+int f{i}(int a, int b) {{ return a + b; }}
+#endif
+"""
+
+
+def gcc_preprocess(file):
+    return subprocess.run(["gcc", "-E", "-P", file], capture_output=True, text=True, check=True).stdout
+
+def best_time(func, file, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(file)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def check_same_tokens(file):
+    ours = [(token.token_type, token.value) for token in tokenize(preprocessor.preprocess(file))]
+    gcc = [(token.token_type, token.value) for token in tokenize(gcc_preprocess(file))]
+    if ours != gcc:
+        raise SystemExit(f"Token streams differ for {file}")
+
+def report(label, file, repeat):
+    check_same_tokens(file)
+    builtin = best_time(preprocessor.preprocess, file, repeat)
+    gcc = best_time(gcc_preprocess, file, repeat)
+    lines = sum(1 for _ in open(file))
+    print(f"{label:<24}{lines:8} lines{gcc * 1000:10.2f} ms{builtin * 1000:10.2f} ms{gcc / builtin:9.1f}x")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("files", nargs="*", default=results.DEFAULT_SOURCES)
+    arg_parser.add_argument("--functions", type=int, default=5000, help="Functions in the generated throughput input.")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Timing runs per preprocessor, best is reported.")
+    args = arg_parser.parse_args()
+
+    print(f"{'input':<24}{'size':>14}{'gcc -E':>13}{'built-in':>13}{'speedup':>10}")
+    for file in args.files:
+        report(os.path.basename(file), file, args.repeat)
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "generated.h"), "w") as f:
+            f.write(HEADER)
+        generated = os.path.join(directory, "generated.c")
+        with open(generated, "w") as f:
+            f.write('#include "generated.h"\n')
+            f.write("".join(FUNCTION.format(i=i) for i in range(args.functions)))
+        report(f"generated ({args.functions} fns)", generated, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
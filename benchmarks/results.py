@@ -0,0 +1,74 @@
+"""Stored benchmark results, one JSON file per benchmark and commit, for comparing runs across commits.
+
+Results are written to benchmarks/results/<benchmark>/<commit>.json, which is ignored by git.
+The commit is the abbreviated HEAD, with a -dirty suffix when the tree has uncommitted changes.
+A benchmark that runs in several configurations, such as with different compiler flags, stores
+each under a variant of its own, <commit>.<variant>.json, so they do not overwrite each other.
+"""
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+# The inputs benchmarks run on when given no files.
+DEFAULT_SOURCES = ["tests/big_test.c", "tests/full_test.c", "tests/test.c"]
+
+
+def _git(*args):
+    result = subprocess.run(["git", *args], capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def current_revision():
+    """The revision results of this tree are stored under."""
+    commit = _git("rev-parse", "--short", "HEAD") or "unknown"
+    dirty = _git("status", "--porcelain", "--untracked-files=no", "--", "src")
+    return f"{commit}-dirty" if dirty else commit
+
+def resolve_revision(revision):
+    """Accepts anything git rev-parse does, or a stored name such as abc1234-dirty."""
+    if revision.endswith("-dirty"):
+        return revision
+    return _git("rev-parse", "--short", revision) or revision
+
+def variant(*parts):
+    """A short file name part identifying a configuration, or None for the default empty one."""
+    text = " ".join(parts)
+    return hashlib.sha1(text.encode()).hexdigest()[:10] if text else None
+
+def _path(benchmark, revision, variant):
+    name = revision if variant is None else f"{revision}.{variant}"
+    return os.path.join(RESULTS_DIR, benchmark, f"{name}.json")
+
+def save(benchmark, data, variant = None):
+    """Stores data for the current revision and variant, with metadata, and returns the file's path."""
+    revision = current_revision()
+    os.makedirs(os.path.join(RESULTS_DIR, benchmark), exist_ok=True)
+    path = _path(benchmark, revision, variant)
+    record = {"revision": revision, "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "python": platform.python_version(), "machine": platform.node(), **data}
+    with open(path, "w") as f:
+        json.dump(record, f, indent=1)
+    return path
+
+def load(benchmark, revision, variant = None):
+    """The stored results of revision and variant, or None if they were never benchmarked."""
+    path = _path(benchmark, resolve_revision(revision), variant)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def history(benchmark):
+    """Every stored result of benchmark, oldest first."""
+    directory = os.path.join(RESULTS_DIR, benchmark)
+    if not os.path.isdir(directory):
+        return []
+    records = []
+    for name in os.listdir(directory):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name)) as f:
+                records.append(json.load(f))
+    return sorted(records, key=lambda record: record["time"])
@@ -0,0 +1,158 @@
+"""Measure how fast the code the compiler generates runs, against gcc -O0 and gcc -O2.
+
+Usage: python -m benchmarks.runtime_benchmark [--kernel NAME ...] [--repeat N] [--flags FLAGS]
+                                              [--max-regression X] [--compare REVISION]
+                                              [--history] [--no-save]
+
+Every kernel in benchmarks/kernels is built by the compiler, given --flags, and by gcc at -O0
+and -O2. Each binary is run --repeat times and the best wall time is kept. Every run must
+print the same output and exit with the same status as gcc -O0's build, or the benchmark
+fails. Times are reported relative to gcc, which also makes runs on machines of different
+speed comparable.
+
+Results are stored per commit and flags (see benchmarks.results) and each run is checked
+against a stored one built with the same flags, by default the latest of another commit: a kernel
+whose time relative to gcc -O0 grew by more than --max-regression times is a code quality
+regression, which is reported and makes the run exit with status 1. --history prints the
+stored runs, oldest first.
+"""
+import argparse
+import math
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks import results
+
+KERNELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "kernels")
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+COMPILER = "compiler"
+REFERENCE = "gcc -O0"
+BUILDS = [COMPILER, REFERENCE, "gcc -O2"]
+
+
+def kernels():
+    return sorted(name[:-len(".c")] for name in os.listdir(KERNELS_DIR) if name.endswith(".c"))
+
+def build(build_name, source, executable, flags):
+    if build_name == COMPILER:
+        command = [sys.executable, "-m", "src.compiler_driver", "--no-cache", *flags, source, "-o", executable]
+    else:
+        # The kernels reuse names of C library functions, such as div and pow.
+        command = build_name.split() + ["-w", source, "-o", executable]
+    result = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"{build_name} failed to build {source}:\n{result.stdout}{result.stderr}")
+
+def run(executable, repeat):
+    """Returns the best wall time of repeat runs in seconds, and the output and status of the last."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([executable], capture_output=True, text=True)
+        best = min(best, time.perf_counter() - start)
+    return best, (result.stdout, result.returncode)
+
+def benchmark_kernel(kernel, repeat, flags, directory):
+    """Returns {build: best seconds}, after checking every build behaves like the reference."""
+    source = os.path.join(KERNELS_DIR, f"{kernel}.c")
+    seconds, outputs = {}, {}
+    for build_name in BUILDS:
+        executable = os.path.join(directory, f"{kernel}-{build_name.replace(' ', '')}")
+        build(build_name, source, executable, flags)
+        seconds[build_name], outputs[build_name] = run(executable, repeat)
+    for build_name, output in outputs.items():
+        if output != outputs[REFERENCE]:
+            raise SystemExit(f"{kernel}: {build_name} printed {output[0]!r} and exited {output[1]}, "
+                             f"{REFERENCE} printed {outputs[REFERENCE][0]!r} and exited {outputs[REFERENCE][1]}")
+    return seconds
+
+def ratios(result):
+    """The compiler's time relative to gcc -O0 per kernel."""
+    return {kernel: seconds[COMPILER] / seconds[REFERENCE] for kernel, seconds in result["kernels"].items()}
+
+def geometric_mean(values):
+    values = list(values)
+    return math.exp(sum(map(math.log, values)) / len(values)) if values else float("nan")
+
+def print_kernels(kernel_seconds):
+    print(f"{'kernel':<12}" + "".join(f"{build_name:>11}" for build_name in BUILDS) + "   vs -O0   vs -O2   (ms)")
+    for kernel, seconds in kernel_seconds.items():
+        print(f"{kernel:<12}" + "".join(f"{seconds[build_name] * 1000:11.1f}" for build_name in BUILDS)
+              + f"{seconds[COMPILER] / seconds[REFERENCE]:9.2f}{seconds[COMPILER] / seconds['gcc -O2']:9.2f}")
+    print(f"{'geomean':<12}" + " " * 11 * len(BUILDS)
+          + f"{geometric_mean(s[COMPILER] / s[REFERENCE] for s in kernel_seconds.values()):9.2f}"
+          + f"{geometric_mean(s[COMPILER] / s['gcc -O2'] for s in kernel_seconds.values()):9.2f}")
+
+def regressions(current, stored, max_regression):
+    """Kernels whose time relative to gcc -O0 grew more than max_regression times since stored."""
+    old_ratios = ratios(stored)
+    problems = []
+    for kernel, ratio in ratios(current).items():
+        if kernel in old_ratios and ratio > old_ratios[kernel] * max_regression:
+            problems.append(f"{kernel}: {ratio:.2f}x gcc -O0, was {old_ratios[kernel]:.2f}x at {stored['revision']}")
+    return problems
+
+def previous_run(flags):
+    """The latest stored run of another revision with the same flags, or None."""
+    revision = results.current_revision()
+    candidates = [record for record in results.history("runtime")
+                  if record["revision"] != revision and record["flags"] == flags]
+    return candidates[-1] if candidates else None
+
+def print_history():
+    records = results.history("runtime")
+    if not records:
+        print("No stored runtime results.")
+        return
+    names = sorted({kernel for record in records for kernel in record["kernels"]})
+    print(f"{'revision':<18}{'flags':<12}" + "".join(f"{name:>11}" for name in names) + "    geomean   (x gcc -O0)")
+    for record in records:
+        record_ratios = ratios(record)
+        print(f"{record['revision']:<18}{' '.join(record['flags']) or '-':<12}"
+              + "".join(f"{record_ratios[name]:11.2f}" if name in record_ratios else f"{'-':>11}" for name in names)
+              + f"{geometric_mean(record_ratios.values()):11.2f}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--kernel", action="append", choices=kernels(), help="Kernel to run, repeatable. Default: all.")
+    arg_parser.add_argument("--repeat", type=int, default=5, help="Runs per binary, best is reported.")
+    arg_parser.add_argument("--flags", default="", help="Extra compiler_driver options for the compiler's builds.")
+    arg_parser.add_argument("--max-regression", type=float, default=1.15,
+                            help="Fail when a kernel's time relative to gcc -O0 grows by more than this factor.")
+    arg_parser.add_argument("--compare", metavar="REVISION", help="Check against the stored results of REVISION.")
+    arg_parser.add_argument("--history", action="store_true", help="Print the stored results and exit.")
+    arg_parser.add_argument("--no-save", dest="save", action="store_false", help="Do not store the results.")
+    args = arg_parser.parse_args()
+    if args.history:
+        print_history()
+        return
+    flags = shlex.split(args.flags)
+    if args.compare:
+        stored = results.load("runtime", args.compare, results.variant(*flags))
+        if stored is None or stored["flags"] != flags:
+            raise SystemExit(f"No stored runtime results for {args.compare} with flags {shlex.join(flags) or '(none)'}")
+    else:
+        stored = previous_run(flags)
+
+    kernel_seconds = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for kernel in args.kernel or kernels():
+            kernel_seconds[kernel] = benchmark_kernel(kernel, args.repeat, flags, directory)
+    print_kernels(kernel_seconds)
+    current = {"flags": flags, "repeat": args.repeat, "kernels": kernel_seconds}
+    if args.save:
+        print(f"\nResults stored in {results.save('runtime', current, results.variant(*flags))}")
+
+    if stored is not None:
+        problems = regressions(current, stored, args.max_regression)
+        if problems:
+            raise SystemExit("Generated code got slower:\n  " + "\n  ".join(problems))
+        print(f"No kernel got more than {args.max_regression:.2f}x slower relative to gcc -O0 than at {stored['revision']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Measure how every compiler stage scales along each axis of the generated corpus.
+
+Usage: python -m benchmarks.scaling_benchmark [--axis NAME ...] [--sizes 1,2,4,8] [--repeat N]
+                                              [--max-exponent X] [--compare REVISION] [--no-save]
+
+For each axis of benchmarks.corpus.CorpusShape the axis is set to its SWEEP_START times each
+factor in --sizes and every stage is run on the program in-process: the built-in preprocessor, then the work of
+each CompilerStage up to the compiler's own output (ALL emits the assembly text, C encodes the
+object file; gcc is not timed). Wall time is the best of --repeat runs, peak memory is what
+tracemalloc sees allocated on top of the stage's input. The cyclic garbage collector is paused
+while a stage is timed: its pauses grow with everything that is live, and would be charged to
+whichever stage happens to trigger one.
+
+A stage scales super-linearly when the exponent of a least squares fit of log time against
+log tokens exceeds --max-exponent; those are reported and make the run exit with status 1.
+Results are stored per commit (see benchmarks.results) and --compare prints the time ratio
+of this run to a stored one.
+"""
+import argparse
+import gc
+import math
+import os
+import tempfile
+import time
+import tracemalloc
+from dataclasses import replace, fields
+from src import preprocessor, lexer, parser, emitter, asm_generator, asm_allocator, code_emitter, object_emitter
+from src.compilation_context import CompilationContext
+from src.compiler_stages import CompilerStage
+from src.semantic_analysis.semantic_analyser import validate_program
+from benchmarks import corpus, results
+
+STAGES = ["preprocess", CompilerStage.LEX.name, CompilerStage.PARSE.name, CompilerStage.VALIDATE.name,
+          CompilerStage.TACKY.name, CompilerStage.CODEGEN.name, CompilerStage.ALL.name, CompilerStage.C.name]
+AXES = [f.name for f in fields(corpus.CorpusShape)]
+
+# Where each axis' sweep starts, large enough that the axis dominates the program's size by
+# the end of the sweep. The other axes keep their CorpusShape defaults.
+SWEEP_START = {"functions": 20, "statements": 10, "depth": 3, "nesting": 4, "locals": 32, "statics": 256}
+
+# Below this a stage's time is mostly constant overhead, too noisy to fit an exponent to.
+MIN_FIT_SECONDS = 0.002
+
+
+def compile_stages(file, measure):
+    """Runs every stage on file in order, each through measure(stage, func), which returns func()."""
+    ctx = CompilationContext()
+    preprocessed = measure("preprocess", lambda: preprocessor.preprocess(file))
+    tokens = measure(CompilerStage.LEX.name, lambda: lexer.tokenize(preprocessed))
+    c_ast = measure(CompilerStage.PARSE.name, lambda: parser.Parser(tokens).parse_program())
+    analysed = measure(CompilerStage.VALIDATE.name, lambda: validate_program(ctx, c_ast))
+    ir = measure(CompilerStage.TACKY.name, lambda: emitter.emit_program(ctx, analysed))
+
+    def codegen():
+        asm = asm_generator.lower_program(ctx, ir)
+        asm_allocator.legalize(ctx, asm)
+        return asm
+    asm = measure(CompilerStage.CODEGEN.name, codegen)
+    measure(CompilerStage.ALL.name, lambda: code_emitter.emit_program_code(ctx, asm))
+    measure(CompilerStage.C.name, lambda: object_emitter.emit_object(ctx, asm))
+    return len(tokens)
+
+def time_stages(file, repeat):
+    """Returns the token count and the best wall time of each stage in seconds."""
+    best = dict.fromkeys(STAGES, float("inf"))
+
+    def measure(stage, func):
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            result = func()
+            best[stage] = min(best[stage], time.perf_counter() - start)
+        finally:
+            gc.enable()
+        return result
+
+    for _ in range(repeat):
+        gc.collect()
+        tokens = compile_stages(file, measure)
+    return tokens, best
+
+def peak_memory(file):
+    """Returns the peak bytes each stage allocates on top of what was live when it started."""
+    peaks = {}
+
+    def measure(stage, func):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = func()
+        peaks[stage] = tracemalloc.get_traced_memory()[1] - before
+        return result
+
+    tracemalloc.start()
+    try:
+        compile_stages(file, measure)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+def scaling_exponent(tokens, seconds):
+    """Slope of the least squares line through (log tokens, log seconds), or None if too noisy."""
+    points = [(math.log(n), math.log(s)) for n, s in zip(tokens, seconds) if s >= MIN_FIT_SECONDS]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if variance == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+def run_axis(axis, sizes, repeat, directory):
+    """Benchmarks the corpus grown along axis by each factor in sizes."""
+    runs = []
+    for factor in sizes:
+        shape = replace(corpus.CorpusShape(), **{axis: SWEEP_START[axis] * factor})
+        file = os.path.join(directory, f"{axis}-{factor}.c")
+        with open(file, "w") as f:
+            f.write(corpus.generate(shape))
+        tokens, seconds = time_stages(file, repeat)
+        runs.append({"factor": factor, axis: getattr(shape, axis), "tokens": tokens,
+                     "seconds": seconds, "peak_bytes": peak_memory(file)})
+    exponents = {stage: scaling_exponent([run["tokens"] for run in runs], [run["seconds"][stage] for run in runs])
+                 for stage in STAGES}
+    return {"runs": runs, "exponents": exponents}
+
+def print_axis(axis, result, max_exponent):
+    print(f"\n{axis}")
+    print(f"{'value':>8}{'tokens':>9}" + "".join(f"{stage:>11}" for stage in STAGES) + "   (ms)")
+    for run in result["runs"]:
+        print(f"{run[axis]:8}{run['tokens']:9}" + "".join(f"{run['seconds'][stage] * 1000:11.2f}" for stage in STAGES))
+    print(f"{'peak KiB':>17}" + "".join(f"{result['runs'][-1]['peak_bytes'][stage] / 1024:11.0f}" for stage in STAGES))
+    print(f"{'exponent':>17}" + "".join(_format_exponent(result["exponents"][stage], max_exponent) for stage in STAGES))
+
+def _format_exponent(exponent, max_exponent):
+    if exponent is None:
+        return f"{'-':>11}"
+    return f"{exponent:10.2f}" + ("!" if exponent > max_exponent else " ")
+
+def super_linear(axes, max_exponent):
+    return [f"{stage} grows as tokens^{exponent:.2f} along {axis}"
+            for axis, result in axes.items()
+            for stage, exponent in result["exponents"].items()
+            if exponent is not None and exponent > max_exponent]
+
+def print_comparison(axes, stored):
+    """Prints this run's time relative to the stored one, per stage over the axes both measured."""
+    print(f"\nTime relative to {stored['revision']} (below 1.00 is faster):")
+    ratios = {stage: [] for stage in STAGES}
+    for axis, result in axes.items():
+        old_runs = {run["factor"]: run for run in stored["axes"].get(axis, {}).get("runs", [])}
+        for run in result["runs"]:
+            old = old_runs.get(run["factor"])
+            if old is None or old["tokens"] != run["tokens"]:
+                continue
+            for stage in STAGES:
+                if stage in old["seconds"]:
+                    ratios[stage].append(run["seconds"][stage] / old["seconds"][stage])
+    # The geometric mean, so a run twice as fast and one twice as slow cancel out.
+    print("".join(f"{stage:>11}" for stage in STAGES))
+    print("".join(f"{math.exp(sum(map(math.log, r)) / len(r)):11.2f}" if r else f"{'-':>11}"
+                  for r in ratios.values()))
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--axis", action="append", choices=AXES, help="Axis to scale, repeatable. Default: all.")
+    arg_parser.add_argument("--sizes", default="1,2,4,8", help="Comma separated factors the base program is grown by.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Timing runs per program, best is reported.")
+    arg_parser.add_argument("--max-exponent", type=float, default=1.3,
+                            help="Flag stages whose time grows faster than tokens to this power.")
+    arg_parser.add_argument("--compare", metavar="REVISION", help="Compare with the stored results of REVISION.")
+    arg_parser.add_argument("--no-save", dest="save", action="store_false", help="Do not store the results.")
+    args = arg_parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    stored = None
+    if args.compare:
+        stored = results.load("scaling", args.compare)
+        if stored is None:
+            raise SystemExit(f"No stored scaling results for {args.compare}")
+
+    axes = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # One untimed compile, so first-use costs such as lazily compiled tables are not charged to the first size.
+        warm_up = os.path.join(directory, "warm-up.c")
+        with open(warm_up, "w") as f:
+            f.write(corpus.generate())
+        compile_stages(warm_up, lambda stage, func: func())
+        for axis in args.axis or AXES:
+            axes[axis] = run_axis(axis, sizes, args.repeat, directory)
+            print_axis(axis, axes[axis], args.max_exponent)
+
+    if stored is not None:
+        print_comparison(axes, stored)
+    if args.save:
+        print(f"\nResults stored in {results.save('scaling', {'sizes': sizes, 'axes': axes})}")
+
+    problems = super_linear(axes, args.max_exponent)
+    if problems:
+        raise SystemExit("Super-linear scaling:\n  " + "\n  ".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+#!/bin/bash
+python -m src.compile_client "$@"
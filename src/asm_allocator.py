@@ -1,8 +1,11 @@
 from .assembly_ast import *
 from .c_ast import Int, Long, FunType
-from .semantic_analysis.symbol_table import SymbolEntry, StaticAttr, symbol_table
+from .semantic_analysis.symbol_table import SymbolEntry, StaticAttr
 from .semantic_analysis.typechecker import static_type_conversion
-from typing import List, Dict
+from typing import List
+from dataclasses import fields
+from .compilation_context import CompilationContext
+from .time_trace import traced, function_definition
 
 TMP_REG_1 = AsmReg(AsmRegs.R10)
 TMP_REG_2 = AsmReg(AsmRegs.R11)
@@ -11,23 +14,18 @@ QUADWORD_SIZE = 8
 STACK_ALIGNMENT = 16
 MAX_ITER = 100
 
-identifiers: Dict[str, int] = {}
-stack_counter: int = 0
-
 class BackendSymEntry:
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class ObjEntry(BackendSymEntry):
     type: AssemblyType
     is_static: bool
 
-@dataclass
+@dataclass(slots = True)
 class FunEntry(BackendSymEntry):
     defined: bool
 
-backend_symbol_table: dict[str, BackendSymEntry] = {}
-
 
 def _two_stack_operands(instruction: AsmInstruction) -> List[AsmInstruction]:
     """
@@ -146,17 +144,16 @@ def legalize_operands(fn_def: AsmFunctionDef) -> None:
     else:
         raise RuntimeError("Compiler error, legalize_operands reached iteration limit")
 
-def add_stack_frame(fn_def: AsmFunctionDef) -> None:
-    stack_frame_size = abs(stack_counter)
+def add_stack_frame(ctx: CompilationContext, fn_def: AsmFunctionDef) -> None:
+    stack_frame_size = abs(ctx.stack_counter)
     stack_frame_size += STACK_ALIGNMENT - (stack_frame_size % STACK_ALIGNMENT)
     fn_def.instructions.insert(0, AsmBinary(AsmBinaryOperator.Sub, AssemblyType.Quadword, AsmImm(stack_frame_size), AsmReg(AsmRegs.SP)))
 
-def _get_stack_slot(identifier: str) -> AsmOperand:
-    global identifiers, stack_counter
-    if identifier in identifiers:
-        return AsmStack(identifiers[identifier])
+def _get_stack_slot(ctx: CompilationContext, identifier: str) -> AsmOperand:
+    if identifier in ctx.stack_slots:
+        return AsmStack(ctx.stack_slots[identifier])
 
-    sym_entry = backend_symbol_table[identifier]
+    sym_entry = ctx.backend_symbol_table[identifier]
     if sym_entry is not None and sym_entry.is_static:
             return AsmData(identifier)
         
@@ -167,32 +164,31 @@ def _get_stack_slot(identifier: str) -> AsmOperand:
     else:
         raise RuntimeError(f"Compiler error, cant find size of type {sym_entry.type}")
     
-    stack_counter -= size
+    ctx.stack_counter -= size
     if sym_entry.type == AssemblyType.Quadword: # align quadword
-        stack_counter -= stack_counter % 8
+        ctx.stack_counter -= ctx.stack_counter % 8
 
-    identifiers[identifier] = stack_counter
-    return AsmStack(stack_counter)
+    ctx.stack_slots[identifier] = ctx.stack_counter
+    return AsmStack(ctx.stack_counter)
 
-def _remove_pseudos(node):
+def _remove_pseudos(ctx: CompilationContext, node):
     if isinstance(node, AsmPseudo):
-        return _get_stack_slot(node.identifier)
+        return _get_stack_slot(ctx, node.identifier)
     return node
 
-def _check_instruction(instr: AsmInstruction) -> AsmInstruction:
+def _check_instruction(ctx: CompilationContext, instr: AsmInstruction) -> AsmInstruction:
     new_attrs = {}
-    for attr, value in instr.__dict__.items():
-        new_attrs[attr] = _remove_pseudos(value)
+    for field in fields(instr):
+        new_attrs[field.name] = _remove_pseudos(ctx, getattr(instr, field.name))
     return type(instr)(**new_attrs)
 
-def lower_pseudo_regs(function_definition: AsmFunctionDef) -> None:
+def lower_pseudo_regs(ctx: CompilationContext, function_definition: AsmFunctionDef) -> None:
     """
     Replaces pseudo-registers with locations on the stack.
     """
-    global identifiers, stack_counter
-    identifiers.clear()
-    stack_counter = 0
-    function_definition.instructions = [_check_instruction(instr) for instr in function_definition.instructions]
+    ctx.stack_slots.clear()
+    ctx.stack_counter = 0
+    function_definition.instructions = [_check_instruction(ctx, instr) for instr in function_definition.instructions]
 
 def _to_backend_entry(sym_entry: SymbolEntry):
     sym_type = sym_entry.type
@@ -206,16 +202,21 @@ def _to_backend_entry(sym_entry: SymbolEntry):
     else:
         raise RuntimeError(f"Cannot convert {sym_entry} to backend symbol table")
 
-def convert_symbol_table():
-    backend_symbol_table.update({
+def convert_symbol_table(ctx: CompilationContext):
+    ctx.backend_symbol_table.update({
         identifier: _to_backend_entry(sym_entry)
-        for identifier, sym_entry in symbol_table.items()
+        for identifier, sym_entry in ctx.symbol_table.items()
     })
 
-def legalize(program: AsmProgram) -> None:
-    convert_symbol_table()
+@traced(function_definition)
+def legalize_function(ctx: CompilationContext, fn_def: AsmFunctionDef) -> None:
+    lower_pseudo_regs(ctx, fn_def)
+    add_stack_frame(ctx, fn_def)
+    legalize_operands(fn_def)
+
+@traced()
+def legalize(ctx: CompilationContext, program: AsmProgram) -> None:
+    convert_symbol_table(ctx)
     for toplevel in program.top_levels:
         if isinstance(toplevel, AsmFunctionDef):
-            lower_pseudo_regs(toplevel)
-            add_stack_frame(toplevel)
-            legalize_operands(toplevel)
\ No newline at end of file
+            legalize_function(ctx, toplevel)
\ No newline at end of file
@@ -1,7 +1,8 @@
 from .ir_ast import *
 from .assembly_ast import *
 from .c_ast import ConstInt, ConstLong, Int, Long
-from .semantic_analysis.symbol_table import symbol_table
+from .compilation_context import CompilationContext
+from .time_trace import traced, function_definition
 
 _RELATIONAL_MAP = {
     IRBinaryOperator.Equal          : AsmCondCode.E,
@@ -25,24 +26,26 @@ SIZE_OF_RBP = 8
 SIZE_OF_PROLOGUE = SIZE_OF_RIP + SIZE_OF_RBP
 SIZE_OF_STACK_ARG = 8
 
-def lower_program(program: IRProgram) -> AsmProgram:
-    toplevels = [lower_toplevel(toplevel) for toplevel in program.toplevels]
+@traced()
+def lower_program(ctx: CompilationContext, program: IRProgram) -> AsmProgram:
+    toplevels = [lower_toplevel(ctx, toplevel) for toplevel in program.toplevels]
     return AsmProgram(toplevels)
 
-def lower_toplevel(toplevel: IRTopLevel):
+def lower_toplevel(ctx: CompilationContext, toplevel: IRTopLevel):
     match toplevel:
         case IRFunctionDefinition():
-            return lower_function_definition(toplevel)
+            return lower_function_definition(ctx, toplevel)
         case IRStaticVariable(name, global_, type, init):
             return AsmStaticVar(name, global_, get_type_alignment(type), init)
         case _:
             raise NotImplementedError(f"Top-level object {toplevel} cannot be transformed to assembly AST yet.")
 
-def lower_function_definition(func_def: IRFunctionDefinition) -> AsmFunctionDef:
+@traced(function_definition)
+def lower_function_definition(ctx: CompilationContext, func_def: IRFunctionDefinition) -> AsmFunctionDef:
     param_regs = AsmRegs.system_v_argument_regs()
     asm_instructions = []
     for reg, param in zip(param_regs, func_def.params):
-        param_type = lower_operand_type(IRVar(param))
+        param_type = lower_operand_type(ctx, IRVar(param))
         asm_instructions.append(
             AsmMov(
                 param_type, 
@@ -53,7 +56,7 @@ def lower_function_definition(func_def: IRFunctionDefinition) -> AsmFunctionDef:
 
     stack_params = func_def.params[len(param_regs):]
     for i, param in enumerate(stack_params):
-        param_type = lower_operand_type(IRVar(param))
+        param_type = lower_operand_type(ctx, IRVar(param))
         asm_instructions.append(
             AsmMov(
                 param_type, 
@@ -63,31 +66,31 @@ def lower_function_definition(func_def: IRFunctionDefinition) -> AsmFunctionDef:
         )
         
     for instruction in func_def.body:
-        asm_instructions += lower_instr(instruction)
+        asm_instructions += lower_instr(ctx, instruction)
     return AsmFunctionDef(func_def.name, func_def.global_, asm_instructions)
 
-def lower_instr(instruction: IRInstruction) -> List[AsmInstruction]:
+def lower_instr(ctx: CompilationContext, instruction: IRInstruction) -> List[AsmInstruction]:
     match instruction:
         case IRReturn(val):
-            return lower_return(val)
+            return lower_return(ctx, val)
         case IRUnary(unop, src, dst):
-            return lower_unary(unop, src, dst)
+            return lower_unary(ctx, unop, src, dst)
         case IRBinary(binop, src1, src2, dst):
-            return lower_binary(binop, src1, src2, dst)
+            return lower_binary(ctx, binop, src1, src2, dst)
         case IRJump(target):
             return [AsmJmp(target)]
         case IRJumpIfZero(condition, target):
-            return [AsmCmp(lower_operand_type(condition), AsmImm(0), lower_operand(condition)),
+            return [AsmCmp(lower_operand_type(ctx, condition), AsmImm(0), lower_operand(condition)),
                     AsmJmpCC(AsmCondCode.E, target)]
         case IRJumpIfNotZero(condition, target):
-            return [AsmCmp(lower_operand_type(condition), AsmImm(0), lower_operand(condition)),
+            return [AsmCmp(lower_operand_type(ctx, condition), AsmImm(0), lower_operand(condition)),
                     AsmJmpCC(AsmCondCode.NE, target)]
         case IRCopy(src, dst):
-            return [AsmMov(lower_operand_type(src), lower_operand(src), lower_operand(dst))]
+            return [AsmMov(lower_operand_type(ctx, src), lower_operand(src), lower_operand(dst))]
         case IRLabel(identifier):
             return [AsmLabel(identifier)]
         case IRFunCall(fun_name, args, dst):
-            return lower_fun_call(fun_name, args, dst)
+            return lower_fun_call(ctx, fun_name, args, dst)
         case IRSignExtend(src, dst):
             return [AsmMovsx(lower_operand(src), lower_operand(dst))]
         case IRTruncate(src, dst):
@@ -99,16 +102,16 @@ def lower_instr(instruction: IRInstruction) -> List[AsmInstruction]:
         case _:
             raise NotImplementedError(f"IR instruction {instruction} can not be transformed to assembly AST yet.")
     
-def lower_return(ir_val: IRVal) -> List[AsmInstruction]:
+def lower_return(ctx: CompilationContext, ir_val: IRVal) -> List[AsmInstruction]:
     val = lower_operand(ir_val)
     return [AsmMov(
-                lower_operand_type(ir_val), 
+                lower_operand_type(ctx, ir_val), 
                 val, 
                 AsmReg(AsmRegs.AX)
             ), 
             AsmRet()]
         
-def lower_fun_call(fun_name: str, args: List[IRVal], dst: IRVal) -> List[AsmInstruction]:
+def lower_fun_call(ctx: CompilationContext, fun_name: str, args: List[IRVal], dst: IRVal) -> List[AsmInstruction]:
     arg_registers = AsmRegs.system_v_argument_regs()
     instructions = []
     register_args, stack_args = args[:6], args[6:]
@@ -118,11 +121,11 @@ def lower_fun_call(fun_name: str, args: List[IRVal], dst: IRVal) -> List[AsmInst
         instructions.append(AsmBinary(AsmBinaryOperator.Sub, AssemblyType.Quadword, AsmImm(stack_padding), AsmReg(AsmRegs.SP)))
 
     for tacky_arg, reg in zip(register_args, arg_registers):
-        assembly_arg, arg_type = lower_arg(tacky_arg)
+        assembly_arg, arg_type = lower_arg(ctx, tacky_arg)
         instructions.append(AsmMov(arg_type, assembly_arg, AsmReg(reg)))
 
     for tacky_arg in stack_args[::-1]:
-        operand, op_type = lower_arg(tacky_arg)
+        operand, op_type = lower_arg(ctx, tacky_arg)
         if can_push_directly(operand, op_type):
             instructions.append(AsmPush(operand))
         else:
@@ -134,34 +137,34 @@ def lower_fun_call(fun_name: str, args: List[IRVal], dst: IRVal) -> List[AsmInst
     if bytes_to_remove:
         instructions.append(AsmBinary(AsmBinaryOperator.Add, AssemblyType.Quadword, AsmImm(bytes_to_remove), AsmReg(AsmRegs.SP)))
 
-    dst_operand, dst_type = lower_arg(dst)
+    dst_operand, dst_type = lower_arg(ctx, dst)
     instructions.append(AsmMov(dst_type, AsmReg(AsmRegs.AX), dst_operand))
     return instructions
 
 def compute_stack_padding(stack_args) -> int:
     return SIZE_OF_STACK_ARG if len(stack_args) % 2 == 1 else 0
 
-def lower_arg(arg: IRVal) -> tuple[AsmOperand, AssemblyType]:
-    return lower_operand(arg), lower_operand_type(arg)
+def lower_arg(ctx: CompilationContext, arg: IRVal) -> tuple[AsmOperand, AssemblyType]:
+    return lower_operand(arg), lower_operand_type(ctx, arg)
 
 def can_push_directly(op: AsmOperand, op_type: AssemblyType) -> bool:
     return isinstance(op, (AsmImm, AsmReg)) or op_type == AssemblyType.Quadword
 
-def lower_unary(unop, ir_src, ir_dst):
-    src, src_type, dst = lower_operand(ir_src), lower_operand_type(ir_src), lower_operand(ir_dst)
+def lower_unary(ctx: CompilationContext, unop, ir_src, ir_dst):
+    src, src_type, dst = lower_operand(ir_src), lower_operand_type(ctx, ir_src), lower_operand(ir_dst)
     match unop:
         case IRUnaryOperator.Not:
             return [AsmCmp(src_type, AsmImm(0), src),
-                    AsmMov(lower_operand_type(ir_dst), AsmImm(0), dst),
+                    AsmMov(lower_operand_type(ctx, ir_dst), AsmImm(0), dst),
                     AsmSetCC(AsmCondCode.E, dst)]
         case _:
             return [AsmMov(src_type, src, dst), 
                     AsmUnary(lower_operator(unop), src_type, dst)]
 
         
-def lower_binary(binop, ir_src1, ir_src2, ir_dst):
+def lower_binary(ctx: CompilationContext, binop, ir_src1, ir_src2, ir_dst):
     src1, src2, dst = lower_operand(ir_src1), lower_operand(ir_src2), lower_operand(ir_dst)
-    src1_type = lower_operand_type(ir_src1)
+    src1_type = lower_operand_type(ctx, ir_src1)
     match binop:
         case IRBinaryOperator.Divide:
             dividend_reg = AsmReg(AsmRegs.AX)
@@ -177,7 +180,7 @@ def lower_binary(binop, ir_src1, ir_src2, ir_dst):
         case relational if binop.is_relational:
             relational = lower_relational(relational)
             return [AsmCmp(src1_type, src2, src1),
-                    AsmMov(lower_operand_type(ir_dst), AsmImm(0), dst),
+                    AsmMov(lower_operand_type(ctx, ir_dst), AsmImm(0), dst),
                     AsmSetCC(relational, dst)]
         case arithmetic if binop.is_arithmetic:
             binop = lower_operator(arithmetic)
@@ -186,15 +189,15 @@ def lower_binary(binop, ir_src1, ir_src2, ir_dst):
         case _:
             raise RuntimeError(f"Compiler error, cannot lower binary {binop}")
 
-def lower_operand_type(operand: IRVal):
+def lower_operand_type(ctx: CompilationContext, operand: IRVal):
     match operand:
         case IRConstant(ConstInt()):
             return AssemblyType.Longword
         case IRConstant(ConstLong()):
             return AssemblyType.Quadword
-        case IRVar(identifier) if symbol_table[identifier].type is Int:
+        case IRVar(identifier) if ctx.symbol_table[identifier].type is Int:
             return AssemblyType.Longword
-        case IRVar(identifier) if symbol_table[identifier].type is Long:
+        case IRVar(identifier) if ctx.symbol_table[identifier].type is Long:
             return AssemblyType.Quadword
         case _:
             raise RuntimeError(f"Compiler error, cannot determine type of {operand}")
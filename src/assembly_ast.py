@@ -4,7 +4,7 @@ from dataclasses import dataclass
 from typing import List
 from .semantic_analysis.typechecker import StaticInit
 
-@dataclass
+@dataclass(slots = True)
 class AsmProgram():
     top_levels: List[AsmTopLevel]
 
@@ -16,15 +16,15 @@ class AssemblyType(Enum):
 
 
 class AsmTopLevel():
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class AsmFunctionDef(AsmTopLevel):
     name: str
     global_: bool
     instructions: List[AsmInstruction]
 
-@dataclass
+@dataclass(slots = True)
 class AsmStaticVar(AsmTopLevel):
     name: str
     global_: bool
@@ -33,73 +33,74 @@ class AsmStaticVar(AsmTopLevel):
 
 
 class AsmInstruction():
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class AsmMov(AsmInstruction):
     type_: AssemblyType
     src: AsmOperand
     dst: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmMovsx(AsmInstruction):
     src: AsmOperand
     dst: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmUnary(AsmInstruction):
     unary_operator: AsmUnaryOperator
     type_: AssemblyType
     operand: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmBinary(AsmInstruction):
     binary_operator: AsmBinaryOperator
     type_: AssemblyType
     src: AsmOperand
     dst: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmCmp(AsmInstruction):
     type_: AssemblyType
     operand1: AsmOperand
     operand2: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmIdiv(AsmInstruction):
     type_: AssemblyType
     src: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmCdq(AsmInstruction):
     type_: AssemblyType
 
-@dataclass
+@dataclass(slots = True)
 class AsmJmp(AsmInstruction):
     identifier: str
 
-@dataclass
+@dataclass(slots = True)
 class AsmJmpCC(AsmInstruction):
     cond_code: AsmCondCode
     identifier: str
 
-@dataclass
+@dataclass(slots = True)
 class AsmSetCC(AsmInstruction):
     cond_code: AsmCondCode
     operand: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmLabel(AsmInstruction):
     identifier: str
     
-@dataclass
+@dataclass(slots = True)
 class AsmPush(AsmInstruction):
     operand: AsmOperand
 
-@dataclass
+@dataclass(slots = True)
 class AsmCall(AsmInstruction):
     identifier: str
 
+@dataclass(slots = True)
 class AsmRet(AsmInstruction):
     pass
 
@@ -117,25 +118,25 @@ class AsmBinaryOperator(Enum):
 
 
 class AsmOperand():
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class AsmImm(AsmOperand):
     int: int
 
-@dataclass
+@dataclass(slots = True)
 class AsmReg(AsmOperand):
     reg: AsmRegs
     
-@dataclass
+@dataclass(slots = True)
 class AsmPseudo(AsmOperand):
     identifier: str
 
-@dataclass
+@dataclass(slots = True)
 class AsmStack(AsmOperand):
     int: int
 
-@dataclass
+@dataclass(slots = True)
 class AsmData(AsmOperand):
     identifier: str
 
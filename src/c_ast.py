@@ -6,37 +6,37 @@ from typing import List
 
 
 class ASTNode(ABC):
-    pass
+    __slots__ = ()
 
 
 
-@dataclass
+@dataclass(slots = True)
 class Program(ASTNode):
     declarations: List[Declaration]
 
 
 
 class Declaration(ASTNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class FunDecl(Declaration):
     function_declaration: FunctionDeclaration
 
-@dataclass
+@dataclass(slots = True)
 class VarDecl(Declaration):
     variable_declaration: VariableDeclaration
 
 
 
-@dataclass
+@dataclass(slots = True)
 class VariableDeclaration(ASTNode):
     name: str
     init: Exp | None
     var_type: Type
     storage_class: StorageClass | None
 
-@dataclass
+@dataclass(slots = True)
 class FunctionDeclaration(ASTNode):
     name: str
     params: List[str]
@@ -47,6 +47,8 @@ class FunctionDeclaration(ASTNode):
 
 
 class Type(ASTNode): 
+    __slots__ = ()
+
     @classmethod
     def size(cls) -> int:
         raise NotImplementedError()
@@ -100,7 +102,7 @@ class ULong(UnsignedType):
     BIT_WIDTH = 64
 
 
-@dataclass(frozen = True)
+@dataclass(frozen = True, slots = True)
 class FunType(Type):
     params: List[Type]
     ret: Type
@@ -113,80 +115,80 @@ class StorageClass(Enum):
 
 
 
-@dataclass
+@dataclass(slots = True)
 class Block(ASTNode):
     block_items: List[BlockItem]
 
 
 
 class ForInit(ASTNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class InitDecl(ForInit):
     declaration: VariableDeclaration
 
-@dataclass
+@dataclass(slots = True)
 class InitExp(ForInit):
     exp: Exp | None = None
 
 
 
 class BlockItem(ASTNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class D(BlockItem):
     declaration: Declaration
 
-@dataclass
+@dataclass(slots = True)
 class S(BlockItem):
     statement: Statement
 
 
 
 class Statement(BlockItem):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class Return(Statement):
     exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class Expression(Statement):
     exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class If(Statement):
     condition: Exp
     then: Statement
     else_: Statement | None
 
-@dataclass
+@dataclass(slots = True)
 class Compound(Statement):
     block: Block
 
-@dataclass
+@dataclass(slots = True)
 class Break(Statement):
     label: str | None = None
 
-@dataclass
+@dataclass(slots = True)
 class Continue(Statement):
     label: str | None = None
 
-@dataclass
+@dataclass(slots = True)
 class While(Statement):
     condition: Exp
     body: Statement
     label: str | None = None
 
-@dataclass
+@dataclass(slots = True)
 class DoWhile(Statement):
     body: Statement
     condition: Exp
     label: str | None = None
     
-@dataclass
+@dataclass(slots = True)
 class For(Statement):
     init: ForInit
     condition: Exp | None
@@ -195,49 +197,49 @@ class For(Statement):
     label: str | None = None
     
 class Null(Statement):
-    pass
+    __slots__ = ()
 
 
-@dataclass(kw_only = True)
+@dataclass(kw_only = True, slots = True)
 class Exp(ASTNode):
     type: Type | None = None
 
-@dataclass
+@dataclass(slots = True)
 class Constant(Exp):
     constant: Const
 
-@dataclass
+@dataclass(slots = True)
 class Var(Exp):
     identifier: str
 
-@dataclass
+@dataclass(slots = True)
 class Cast(Exp):
     target_type: Type
     exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class Unary(Exp):
     unary_operator: UnaryOperator
     exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class Binary(Exp):
     binary_operator: BinaryOperator
     left_exp: Exp
     right_exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class Assignment(Exp):
     left: Exp
     right: Exp
 
-@dataclass
+@dataclass(slots = True)
 class Conditional(Exp):
     condition: Exp
     then_exp: Exp
     else_exp: Exp
 
-@dataclass
+@dataclass(slots = True)
 class FunctionCall(Exp):
     identifier: str
     args: List[Exp]
@@ -280,20 +282,20 @@ class BinaryOperator(Enum):
 
 
 class Const(ASTNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class ConstInt(Const):
     int: int
     
-@dataclass
+@dataclass(slots = True)
 class ConstLong(Const):
     int: int
     
-@dataclass
+@dataclass(slots = True)
 class ConstUInt(Const):
     int: int
     
-@dataclass
+@dataclass(slots = True)
 class ConstULong(Const):
     int: int
\ No newline at end of file
@@ -1,21 +1,32 @@
+import io
 from .assembly_ast import *
 from .semantic_analysis.symbol_table import IntInit, LongInit
-from .asm_allocator import backend_symbol_table
+from .time_trace import traced, function_definition
 
-def emit_program_code(program):
-    res = []
+_SECTION_FOOTER = '   .section .note.GNU-stack,"",@progbits\n'
+
+@traced()
+def emit_program_code(ctx, program):
+    out = io.StringIO()
+    write_program_code(ctx, program, out)
+    return out.getvalue()
+
+@traced()
+def write_program_code(ctx, program, out):
+    """Writes the assembly code for program to the text stream out, one top level at a time."""
     for top_level in program.top_levels:
         if isinstance(top_level, AsmFunctionDef):
-            res.extend(emit_function(top_level))
+            lines = emit_function(ctx, top_level)
         elif isinstance(top_level, AsmStaticVar):
-            res.extend(emit_static_var(top_level))
+            lines = emit_static_var(top_level)
         else:
             raise NotImplementedError(f"Can't generate assembly code for {top_level}")
-        res.append("")
-    res.append('   .section .note.GNU-stack,"",@progbits')
-    return "\n".join(res) + "\n"
+        lines.append("\n")
+        out.write("\n".join(lines))
+    out.write(_SECTION_FOOTER)
 
-def emit_function(func_def):
+@traced(function_definition)
+def emit_function(ctx, func_def):
     res = []
     if func_def.global_:
         res.append(f"   .globl {func_def.name}")
@@ -24,25 +35,26 @@ def emit_function(func_def):
         f"{func_def.name}:",
         f"   pushq  %rbp",
         f"   movq   %rsp, %rbp"])
+    formats = _INSTRUCTION_FORMATS
     for instr in func_def.instructions:
-        lines = emit_instruction(instr)
-        if isinstance(lines, list):
-            res.extend("   " + line for line in lines)
-        else:
-            res.append("   " + lines)
+        try:
+            format_instruction = formats[type(instr)]
+        except KeyError:
+            raise NotImplementedError(f"Can't generate assembly code for {instr}") from None
+        res.append(format_instruction(ctx, instr))
     return res
 
 def emit_static_var(static_var: AsmStaticVar):
     res = []
     if static_var.global_:
         res.append(f"   .globl {static_var.name}")
-        
+
     section = ".data" if static_var.init.int != 0 else ".bss"
     res.append(f"   {section}")
 
     res.append(f"   .align {static_var.alignment}")
     res.append(f"{static_var.name}:")
-    
+
     match static_var.init:
         case IntInit(0):
             init_line = f"   .zero 4"
@@ -56,61 +68,56 @@ def emit_static_var(static_var: AsmStaticVar):
             raise RuntimeError(f"Compiler error, cannot emit code for {static_var.init}")
     res.append(init_line)
     return res
-        
-def emit_instruction(ast_node):
-    match ast_node:
-        case AsmMov(t, src, dst):
-            return f"mov{t.value}   {emit_operand(src, t.value)}, {emit_operand(dst, t.value)}"
-        case AsmRet():
-            return [
-                f"movq   %rbp, %rsp",
-                f"popq   %rbp",
-                f"ret"
-            ]
-        case AsmMovsx(src, dst):
-            return f"movslq   {emit_operand(src, 'l')}, {emit_operand(dst, 'q')}"
-        case AsmUnary(unop, t, operand):
-            return f"{unop.value}{t.value}   {emit_operand(operand, t.value)}"
-        case AsmBinary(binop, t, src, dst):
-            return f"{binop.value}{t.value}   {emit_operand(src, t.value)}, {emit_operand(dst, t.value)}"
-        case AsmIdiv(t, operand):
-            return f"idiv{t.value}  {emit_operand(operand, t.value)}"
-        case AsmCdq(AssemblyType.Longword):
-            return f"cdq"
-        case AsmCdq(AssemblyType.Quadword):
-            return f"cqo"
-        case AsmCmp(t, op1, op2):
-            return f"cmp{t.value}   {emit_operand(op1, t.value)}, {emit_operand(op2, t.value)}"
-        case AsmJmp(label):
-            return f"jmp    .L{label}"
-        case AsmJmpCC(cc, label):
-            return f"j{cc.value}    .L{label}"
-        case AsmSetCC(cc, operand):
-            return f"set{cc.value}  {emit_operand(operand, 'byte')}"
-        case AsmLabel(label):
-            return f".L{label}:"
-        case AsmPush(operand):
-            return f"pushq   {emit_operand(operand, 'q')}"
-        case AsmCall(func):
-            suffix = "@PLT" if func in backend_symbol_table else ""
-            return f"call   {func}{suffix}"
-        case _:
-            raise NotImplementedError(f"Can't generate assembly code for {ast_node}")
+
+def emit_instruction(ctx, ast_node):
+    """Returns the indented line, or lines joined by newlines, for one instruction."""
+    format_instruction = _INSTRUCTION_FORMATS.get(type(ast_node))
+    if format_instruction is None:
+        raise NotImplementedError(f"Can't generate assembly code for {ast_node}")
+    return format_instruction(ctx, ast_node)
 
 def emit_operand(operand, size):
-    match operand:
-        case AsmReg(reg):
-            if size == "byte":
-                return reg.as_byte()
-            if size == "l":
-                return reg.as_dword()
-            if size == "q":
-                return reg.as_qword()
-        case AsmStack(offset):
-            return f"{offset}(%rbp)"
-        case AsmData(name):
-            return f"{name}(%rip)"
-        case AsmImm(int):
-            return f"${int}"
-        case _:
-            raise NotImplementedError(f"Cant generate assembly code for {operand}")
\ No newline at end of file
+    kind = type(operand)
+    if kind is AsmReg:
+        return _REGISTER_NAMES[operand.reg, size]
+    if kind is AsmStack:
+        return f"{operand.int}(%rbp)"
+    if kind is AsmData:
+        return f"{operand.identifier}(%rip)"
+    if kind is AsmImm:
+        return f"${operand.int}"
+    raise NotImplementedError(f"Cant generate assembly code for {operand}")
+
+
+# Register names by register and operand size, so rendering a register is a lookup.
+_REGISTER_NAMES = {}
+for _reg in AsmRegs:
+    _REGISTER_NAMES[_reg, "byte"] = _reg.as_byte()
+    _REGISTER_NAMES[_reg, AssemblyType.Longword.value] = _reg.as_dword()
+    _REGISTER_NAMES[_reg, AssemblyType.Quadword.value] = _reg.as_qword()
+del _reg
+
+def _format_cdq(ctx, instr):
+    return "   cdq" if instr.type_ == AssemblyType.Longword else "   cqo"
+
+def _format_call(ctx, instr):
+    suffix = "@PLT" if instr.identifier in ctx.backend_symbol_table else ""
+    return f"   call   {instr.identifier}{suffix}"
+
+# One format callable per instruction class, each returning the indented text of an instruction.
+_INSTRUCTION_FORMATS = {
+    AsmMov    : lambda ctx, i: f"   mov{i.type_.value}   {emit_operand(i.src, i.type_.value)}, {emit_operand(i.dst, i.type_.value)}",
+    AsmRet    : lambda ctx, i: "   movq   %rbp, %rsp\n   popq   %rbp\n   ret",
+    AsmMovsx  : lambda ctx, i: f"   movslq   {emit_operand(i.src, 'l')}, {emit_operand(i.dst, 'q')}",
+    AsmUnary  : lambda ctx, i: f"   {i.unary_operator.value}{i.type_.value}   {emit_operand(i.operand, i.type_.value)}",
+    AsmBinary : lambda ctx, i: f"   {i.binary_operator.value}{i.type_.value}   {emit_operand(i.src, i.type_.value)}, {emit_operand(i.dst, i.type_.value)}",
+    AsmIdiv   : lambda ctx, i: f"   idiv{i.type_.value}  {emit_operand(i.src, i.type_.value)}",
+    AsmCdq    : _format_cdq,
+    AsmCmp    : lambda ctx, i: f"   cmp{i.type_.value}   {emit_operand(i.operand1, i.type_.value)}, {emit_operand(i.operand2, i.type_.value)}",
+    AsmJmp    : lambda ctx, i: f"   jmp    .L{i.identifier}",
+    AsmJmpCC  : lambda ctx, i: f"   j{i.cond_code.value}    .L{i.identifier}",
+    AsmSetCC  : lambda ctx, i: f"   set{i.cond_code.value}  {emit_operand(i.operand, 'byte')}",
+    AsmLabel  : lambda ctx, i: f"   .L{i.identifier}:",
+    AsmPush   : lambda ctx, i: f"   pushq   {emit_operand(i.operand, 'q')}",
+    AsmCall   : _format_call,
+}
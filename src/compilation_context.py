@@ -0,0 +1,21 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from .utils import NameGenerator
+
+if TYPE_CHECKING:
+    from .semantic_analysis.symbol_table import SymbolEntry
+    from .asm_allocator import BackendSymEntry
+
+@dataclass
+class CompilationContext:
+    """
+    Owns all mutable compiler state for one translation unit. Every stage takes the
+    context explicitly, so units compiled with separate contexts never share symbols
+    or name counters and can run back to back or concurrently in one process.
+    """
+    symbol_table: dict[str, SymbolEntry] = field(default_factory=dict)
+    backend_symbol_table: dict[str, BackendSymEntry] = field(default_factory=dict)
+    name_generator: NameGenerator = field(default_factory=NameGenerator)
+    stack_slots: dict[str, int] = field(default_factory=dict)
+    stack_counter: int = 0
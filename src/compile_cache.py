@@ -0,0 +1,212 @@
+import gc
+import io
+import os
+import hashlib
+import pickle
+import shutil
+import tempfile
+from functools import lru_cache
+
+CACHE_DIR_ENV_VAR = "COMPILER_CACHE_DIR"
+CACHE_SIZE_ENV_VAR = "COMPILER_CACHE_SIZE"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# The cache is only walked for eviction once the entries written since the last walk add up to
+# max_bytes / TRIM_SLACK, so it may exceed max_bytes by that much in between.
+TRIM_SLACK = 16
+# Bytes each compile wrote, one line per compile, since the last walk.
+_WRITTEN_LOG = ".written"
+
+@lru_cache(maxsize=None)
+def compiler_fingerprint():
+    """Hash of the compiler's own sources, so editing the compiler invalidates every entry."""
+    digest = hashlib.sha256()
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(root, name)
+                digest.update(os.path.relpath(path, package_dir).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+def default_max_bytes():
+    """The size set by CACHE_SIZE_ENV_VAR, or DEFAULT_MAX_BYTES if it is unset or not a positive number."""
+    try:
+        max_bytes = int(os.environ.get(CACHE_SIZE_ENV_VAR, DEFAULT_MAX_BYTES))
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+    return max_bytes if max_bytes > 0 else DEFAULT_MAX_BYTES
+
+def default_cache_dir():
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return os.environ[CACHE_DIR_ENV_VAR]
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "c-compiler")
+
+class CompileCache:
+    """
+    Content addressed store of compiler outputs, keyed on the preprocessed source, the
+    stage, the optimizations and the compiler fingerprint, or on a single function (see incremental.py).
+    Entries are written atomically, so concurrent compiles may share a cache, and trim
+    evicts the least recently used ones once the cache grows past max_bytes. Compiles call
+    trim_if_grown instead, which only trims once enough was written to matter.
+    Creating the cache raises OSError if its directory cannot be created; after that, failing
+    to write an entry or to trim is not an error, the entry is just not cached.
+    """
+    def __init__(self, root = None, max_bytes = None):
+        self.root = root or default_cache_dir()
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.written = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def key(self, preprocessed, stage, optimizations = ()):
+        digest = hashlib.sha256()
+        digest.update(compiler_fingerprint().encode())
+        digest.update(stage.name.encode())
+        digest.update(",".join(optimizations).encode())
+        digest.update(preprocessed.encode())
+        return digest.hexdigest()
+
+    def assembly_path(self, key):
+        """Path of the cached assembly file, or None on a miss."""
+        return self._lookup(key, ".s")
+
+    def write_assembly(self, key, write):
+        """
+        Stores what write(out) writes to the text stream out as the assembly for key, returning
+        its path, or None if it could not be stored.
+        """
+        def store(f):
+            out = io.TextIOWrapper(f)
+            write(out)
+            out.flush()
+            out.detach()
+        if not self._store(key, ".s", store):
+            return None
+        return self._path(key, ".s")
+
+    def get_object(self, key, destination):
+        """Copies the cached object file to destination. Returns False on a miss."""
+        path = self._lookup(key, ".o")
+        if path is None:
+            return False
+        shutil.copyfile(path, destination)
+        return True
+
+    def put_object(self, key, object_file):
+        with open(object_file, "rb") as src:
+            self._store(key, ".o", lambda f: shutil.copyfileobj(src, f))
+
+    def get_function(self, key):
+        path = self._lookup(key, ".fn")
+        if path is None:
+            return None
+        # Fragments are acyclic trees of many small nodes, so collecting while they load only costs time.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def put_function(self, key, fragment):
+        self._store(key, ".fn", lambda f: pickle.dump(fragment, f, pickle.HIGHEST_PROTOCOL))
+
+    def _path(self, key, suffix):
+        return os.path.join(self.root, key[:2], key + suffix)
+
+    def _lookup(self, key, suffix):
+        path = self._path(key, suffix)
+        try:
+            # The mtime doubles as the last use time for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError:
+            # A cache shared read-only still hits, it just does not track use.
+            pass
+        return path
+
+    def _store(self, key, suffix, write):
+        """Writes the entry with write(f). Returns False if the cache could not be written."""
+        path = self._path(key, suffix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                self.written += f.tell()
+            os.replace(tmp_path, path)
+        except OSError:
+            _remove(tmp_path)
+            return False
+        except BaseException:
+            _remove(tmp_path)
+            raise
+        return True
+
+    def trim_if_grown(self):
+        """
+        Records what this cache object wrote in the log, and trims once the log adds up to
+        max_bytes / TRIM_SLACK. A new cache has no log, and is trimmed on its first use.
+        """
+        try:
+            self._trim_if_grown()
+        except OSError:
+            # The next compile that can write the cache trims it.
+            pass
+
+    def _trim_if_grown(self):
+        log = os.path.join(self.root, _WRITTEN_LOG)
+        new = not os.path.exists(log)
+        if not self.written and not new:
+            return
+        # Appends of one short line are atomic, so concurrent compiles can share the log.
+        with open(log, "a+") as f:
+            f.write(f"{self.written}\n")
+            f.flush()
+            f.seek(0)
+            written = sum(int(line) for line in f if line.strip().isdigit())
+        self.written = 0
+        if new or written >= self.max_bytes // TRIM_SLACK:
+            self.trim()
+            # Compiles finishing during the walk may lose their line, which only delays the next one.
+            with open(log, "w"):
+                pass
+
+    def trim(self):
+        """Evicts least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                if name.startswith("."):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,44 @@
+"""
+Thin client for the compile server, a drop-in replacement for run.sh:
+
+    python -m src.compile_client --codegen file.c
+
+Forwards its arguments, working directory and environment to the server started
+with `python -m src.compiler_driver --serve`, so a request uses the same cache
+directory and size, gcc and temporary directory as a local run would, and falls
+back to compiling in-process when no server is listening. Only the standard library is imported on the fast path.
+"""
+import json
+import os
+import socket
+import sys
+import tempfile
+
+SOCKET_ENV_VAR = "COMPILER_SERVER_SOCKET"
+
+def default_socket_path():
+    return os.environ.get(SOCKET_ENV_VAR) or os.path.join(tempfile.gettempdir(), f"c-compiler-{os.getuid()}.sock")
+
+def request(socket_path, argv, cwd, env = None):
+    """Sends one compile request and returns the server's response dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps({"argv": argv, "cwd": cwd, "env": env}).encode() + b"\n")
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile("rb") as f:
+            return json.loads(f.readline())
+
+def main(argv):
+    try:
+        response = request(default_socket_path(), argv, os.getcwd(), dict(os.environ))
+    except (FileNotFoundError, ConnectionRefusedError):
+        from .compiler_driver import main as compile_in_process
+        compile_in_process(argv, prog_name="compiler_driver")
+        return
+    sys.stdout.write(response["stdout"])
+    sys.stderr.write(response["stderr"])
+    sys.exit(response["exit_code"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import tempfile
+import traceback
+from contextlib import redirect_stdout, redirect_stderr
+from .compiler_driver import main
+from .compiler import import_stages
+
+class _CompileServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    # Each request runs in a forked child, so compiles never see each other's
+    # state (working directory, streams, CompilationContext) and the parent stays pristine.
+    pass
+
+class _CompileRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        response = run_request(request["argv"], request["cwd"], request.get("env"))
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+def run_request(argv, cwd, env = None):
+    """Runs the compiler driver on argv in cwd with the environment env, if given, capturing its output and exit code."""
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            os.chdir(cwd)
+            if env is not None:
+                os.environ.clear()
+                os.environ.update(env)
+                # The temporary directory is looked up once per process, possibly before the fork.
+                tempfile.tempdir = None
+            main(argv, prog_name="compiler_driver")
+        except SystemExit as e:
+            match e.code:
+                case None:
+                    exit_code = 0
+                case int():
+                    exit_code = e.code
+                case _:
+                    # Like the interpreter: any other code is printed to stderr, and the exit status is 1.
+                    print(e.code, file=sys.stderr)
+                    exit_code = 1
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+    return {"stdout": stdout.getvalue(), "stderr": stderr.getvalue(), "exit_code": exit_code}
+
+def _remove_stale_socket(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.remove(socket_path)
+            return
+    raise RuntimeError(f"A compile server is already listening on {socket_path}")
+
+def serve(socket_path, max_workers):
+    """Serves compile requests on a Unix socket with at most max_workers compiles in flight."""
+    _remove_stale_socket(socket_path)
+    # Imported once here so forked workers start warm.
+    import_stages()
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    server = _CompileServer(socket_path, _CompileRequestHandler)
+    server.max_children = max_workers
+    try:
+        print(f"Compile server listening on {socket_path}", file=sys.stderr)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(socket_path)
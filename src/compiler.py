@@ -1,68 +1,417 @@
-from collections import deque
-import sys, os, click
-from . import pretty_printer, lexer, parser, emitter, asm_generator, asm_allocator, code_emitter
-from .semantic_analysis.semantic_analyser import validate_program
+import sys, os, io
+from dataclasses import dataclass
+from contextlib import contextmanager, redirect_stdout, redirect_stderr, ExitStack
 from .compiler_stages import CompilerStage
-from .gcc_runner import preprocess, assemble, assemble_object
+from .compilation_context import CompilationContext
+from . import time_trace
 
-def run_compiler(input_files, stage):
+# The stage modules, gcc_runner, the caches and the pretty printer are imported where they
+# are first needed, so a run only pays for the stages it reaches (see import_stages).
+
+# Stages whose assembly is handed to gcc.
+ASSEMBLED_STAGES = {CompilerStage.ALL, CompilerStage.TESTALL, CompilerStage.C}
+
+# Inputs larger than this go to gcc -E even with the built-in preprocessor enabled. The built-in one
+# saves starting gcc (about 8 ms), but its pure Python expansion is several times slower per line, so
+# beyond a few hundred lines of macro-heavy code gcc -E is faster, and its output is streamed.
+BUILTIN_PREPROCESSOR_MAX_SIZE = 16 * 1024
+
+# CompileOptions fields that enable a TACKY pass, see optimizations/optimizer.py.
+OPTIMIZATIONS = ("fold_constants", "eliminate_unreachable_code", "propagate_copies", "eliminate_dead_stores")
+# The passes each -O level enables.
+OPTIMIZATION_LEVELS = {
+    0: (),
+    1: ("fold_constants", "eliminate_unreachable_code"),
+    2: OPTIMIZATIONS,
+}
+
+@dataclass
+class CompileOptions:
+    """Per-file settings shared by every input of one compiler run."""
+    use_cache: bool = True
+    incremental: bool = False
+    save_temps: bool = False
+    builtin_preprocessor: bool = True
+    include_dirs: tuple[str, ...] = ()
+    builtin_assembler: bool = True
+    print_assembly: bool = False
+    time_trace: bool = False
+    profile: str | None = None
+    optimization_level: int = 0
+    # None leaves a pass to the optimization level.
+    fold_constants: bool | None = None
+    eliminate_unreachable_code: bool | None = None
+    propagate_copies: bool | None = None
+    eliminate_dead_stores: bool | None = None
+    optimization_stats: bool = False
+    # Per function budget of the optimizer, in rounds of every pass and in milliseconds.
+    optimization_iterations: int = 10
+    optimization_time_budget: int = 1000
+
+    def optimizations(self):
+        """The names of the enabled TACKY passes."""
+        level = OPTIMIZATION_LEVELS[self.optimization_level]
+        return tuple(name for name in OPTIMIZATIONS
+                     if (name in level if getattr(self, name) is None else getattr(self, name)))
+
+    def optimization_key(self):
+        """
+        What the generated code depends on besides the source, for the caches. The time budget
+        is left out: running out of it is rare, and the code is correct either way.
+        """
+        optimizations = self.optimizations()
+        return optimizations + (str(self.optimization_iterations),) if optimizations else ()
+
+    def optimizer(self):
+        """An Optimizer running the enabled passes (see optimizations/optimizer.py), or None if there are none."""
+        optimizations = self.optimizations()
+        if not optimizations:
+            return None
+        from .optimizations.optimizer import Optimizer
+        return Optimizer(optimizations, self.optimization_iterations, self.optimization_time_budget / 1000)
+
+def run_compiler(input_files, stage, jobs = 1, fail_fast = True, options = None, output = None):
+    """
+    Compiles each input file, with up to jobs files in flight at once. Diagnostics are
+    reported in input order and the exit code is 1 if any attempted file failed.
+    With fail_fast, files after the first failing one are not reported or attempted, except
+    that in parallel those already being compiled alongside it still finish.
+    With output, the files are compiled to assembly only and then linked together into
+    the executable output by a single gcc invocation, if all of them compiled.
+    """
+    if options is None:
+        options = CompileOptions()
+    assembly_codes = [] if output is not None else None
+    if jobs > 1 and len(input_files) > 1:
+        failed = _run_parallel(input_files, stage, jobs, fail_fast, options, assembly_codes)
+    else:
+        failed = _run_serial(input_files, stage, fail_fast, options, assembly_codes)
+    if not failed and output is not None:
+        failed = not _link(assembly_codes, output)
+    if failed:
+        sys.exit(1)
+
+def _run_serial(input_files, stage, fail_fast, options, assembly_codes):
+    failed = False
     for file in input_files:
-        preprocessed = None
+        if not compile_file(file, stage, options, assembly_codes):
+            failed = True
+            if fail_fast:
+                break
+    return failed
+
+def _run_parallel(input_files, stage, jobs, fail_fast, options, assembly_codes):
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    # Files are submitted in input order as workers free up, rather than all at once: the pool
+    # starts queued files ahead of time and they can then no longer be cancelled. So with
+    # fail_fast, a failure stops every later file from starting as in a serial run, except
+    # the at most jobs - 1 already being compiled alongside it.
+    results = {}
+    pending = {}
+    submitted = reported = 0
+    failed = stopped = False
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while pending or (submitted < len(input_files) and not stopped):
+            while submitted < len(input_files) and len(pending) < jobs and not stopped:
+                future = executor.submit(_compile_file_captured, input_files[submitted], stage, options,
+                                         assembly_codes is not None)
+                pending[future] = submitted
+                submitted += 1
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                results[index] = future.result()
+                stopped = stopped or (fail_fast and not results[index][0])
+            while reported in results and not (failed and fail_fast):
+                ok, codes, stdout, stderr = results.pop(reported)
+                reported += 1
+                sys.stdout.write(stdout)
+                sys.stderr.write(stderr)
+                if assembly_codes is not None:
+                    assembly_codes.extend(codes)
+                failed = failed or not ok
+    return failed
+
+def _compile_file_captured(file, stage, options, collect_assembly):
+    stdout, stderr = io.StringIO(), io.StringIO()
+    codes = [] if collect_assembly else None
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        ok = compile_file(file, stage, options, codes)
+    return ok, codes, stdout.getvalue(), stderr.getvalue()
+
+def _link(assembly_codes, output):
+    from .gcc_runner import assemble, link
+    try:
+        if len(assembly_codes) == 1:
+            assemble(assembly_codes[0], output)
+        else:
+            link(assembly_codes, output)
+    except RuntimeError as err:
+        print(f"Error: {err}", file=sys.stderr)
+        return False
+    return True
+
+def compile_file(file, stage, options = None, assembly_codes = None):
+    """
+    Preprocesses, compiles and assembles a single file. Returns False if it failed.
+    The preprocessor output and the assembly are piped between gcc and the compiler, or
+    the assembly is written to the cache and assembled from there. They are only written
+    next to the source with options.save_temps. With options.incremental,
+    unchanged functions are taken from the cache even if options.use_cache is off.
+    If assembly_codes is a list, the assembly is appended to it instead of assembled.
+    With options.time_trace, where the time went is written to a Chrome trace next to the source,
+    and with options.profile a profile in that mode (see profiler.py).
+    """
+    if options is None:
+        options = CompileOptions()
+    base, _ = os.path.splitext(file)
+    with ExitStack() as stack:
+        if options.time_trace:
+            stack.enter_context(time_trace.recording(base + ".trace.json", f"compiler_driver {file}"))
+            stack.enter_context(time_trace.span(file))
+        if options.profile is not None:
+            from .profiler import profiling
+            stack.enter_context(profiling(options.profile, base, file))
+        return _compile_file(file, stage, options, assembly_codes)
+
+def _compile_file(file, stage, options, assembly_codes):
+    try:
+        cache = functions = None
+        optimizer = options.optimizer()
+        use_cache = options.use_cache and stage in ASSEMBLED_STAGES
+        if use_cache or options.incremental:
+            # The stages that only print their result never touch the cache.
+            from .compile_cache import CompileCache
+            try:
+                cache = CompileCache()
+            except OSError:
+                # Without a usable cache directory, compile as with --no-cache.
+                use_cache = False
+        if options.incremental and cache is not None:
+            from .incremental import FunctionCache
+            functions = FunctionCache(cache, options.optimization_key())
+        if stage == CompilerStage.C and options.builtin_assembler and not options.save_temps:
+            _compile_object(cache if use_cache else None, file, functions, optimizer, options)
+        elif use_cache:
+            _compile_cached(cache, file, stage, functions, optimizer, options, assembly_codes)
+        else:
+            _compile_uncached(file, stage, functions, optimizer, options, assembly_codes)
+        if optimizer is not None and options.optimization_stats:
+            optimizer.report(file)
+        if functions is not None:
+            functions.save()
+        if cache is not None:
+            cache.trim_if_grown()
+    except RuntimeError as err:
+        print(f"Error: {err}", file=sys.stderr)
+        return False
+    return True
+
+@contextmanager
+def _open_source(file, options):
+    if options.save_temps or _use_builtin_preprocessor(file, options):
+        yield io.StringIO(_preprocess(file, options))
+    else:
+        from .gcc_runner import preprocess_stream
+        with preprocess_stream(file, options.include_dirs) as source:
+            yield source
+
+def _needs_assembly_text(options, assembly_codes):
+    return options.save_temps or options.print_assembly or assembly_codes is not None
+
+def _compile_uncached(file, stage, functions, optimizer, options, assembly_codes):
+    if stage in ASSEMBLED_STAGES and not _needs_assembly_text(options, assembly_codes):
+        # gcc starts while the compiler runs and is fed the assembly one function at a time.
+        from .gcc_runner import assemble_stream
+        with _open_source(file, options) as source, \
+             assemble_stream(_output_path(file, stage), stage == CompilerStage.C) as out:
+            compile_c(source, stage, functions = functions, optimizer = optimizer, out = out)
+        return
+    with _open_source(file, options) as source:
+        assembly_code = compile_c(source, stage, functions = functions, optimizer = optimizer)
+    _report_assembly(options, assembly_code)
+    _assemble(file, stage, assembly_code, options.save_temps, assembly_codes)
+
+def _compile_cached(cache, file, stage, functions, optimizer, options, assembly_codes):
+    """
+    Like the uncached path in compile_file, but a cache hit skips every compiler stage,
+    and for -c the assembler as well.
+    """
+    preprocessed = _preprocess(file, options)
+    key = cache.key(preprocessed, stage, options.optimization_key())
+    base, _ = os.path.splitext(file)
+    if stage == CompilerStage.C and cache.get_object(key, base + ".o"):
+        return
+
+    path = cache.assembly_path(key)
+    if path is None:
+        path = cache.write_assembly(key, lambda out: compile_c(io.StringIO(preprocessed), stage, functions = functions,
+                                                               optimizer = optimizer, out = out))
+        if path is None:
+            # The cache could not be written, so compile without it.
+            _compile_uncached(file, stage, functions, optimizer, options, assembly_codes)
+            return
+    if _needs_assembly_text(options, assembly_codes):
+        with open(path) as f:
+            assembly_code = f.read()
+        _report_assembly(options, assembly_code)
+        output = _assemble(file, stage, assembly_code, options.save_temps, assembly_codes)
+    else:
+        from .gcc_runner import assemble_file
+        output = assemble_file(path, _output_path(file, stage), stage == CompilerStage.C)
+    if stage == CompilerStage.C:
+        cache.put_object(key, output)
+
+def _compile_object(cache, file, functions, optimizer, options):
+    """Compiles file for -c, encoding the object file with object_emitter instead of running as."""
+    preprocessed = _preprocess(file, options)
+    base, _ = os.path.splitext(file)
+    output = base + ".o"
+    key = None
+    if cache is not None:
+        # The encoding matches as byte for byte, so objects are shared with the assembler path.
+        key = cache.key(preprocessed, CompilerStage.C, options.optimization_key())
+        if cache.get_object(key, output):
+            return
+    object_code = compile_c(io.StringIO(preprocessed), CompilerStage.C, functions = functions, optimizer = optimizer,
+                            object_code = True)
+    with open(output, "wb") as f:
+        f.write(object_code)
+    if key is not None:
+        cache.put_object(key, output)
+
+def _use_builtin_preprocessor(file, options):
+    try:
+        return options.builtin_preprocessor and os.path.getsize(file) <= BUILTIN_PREPROCESSOR_MAX_SIZE
+    except OSError:
+        # gcc reports the missing file.
+        return False
+
+def _preprocess(file, options):
+    """Runs the built-in preprocessor, or gcc -E if it is disabled, the file is large or needs it."""
+    preprocessed = None
+    if _use_builtin_preprocessor(file, options):
+        from . import preprocessor
         try:
-            preprocessed = preprocess(file)
-            compiled = compile_c(preprocessed, stage)
-            if stage in [CompilerStage.ALL, CompilerStage.TESTALL]:
-                assemble(compiled)
-            if stage == CompilerStage.C:
-                assemble_object(compiled)
-        except RuntimeError as err:
-            click.echo(f"Error: {err}", err=True)
-            sys.exit(1)
-        finally:
-            if preprocessed and os.path.exists(preprocessed):
-                os.remove(preprocessed)
-
-def compile_c(file, flag):
-    tokens = lexer.lex(file)
+            preprocessed = preprocessor.preprocess(file, options.include_dirs)
+        except (preprocessor.PreprocessorFallback, OSError, UnicodeDecodeError):
+            pass
+    if preprocessed is None:
+        from .gcc_runner import preprocess
+        preprocessed = preprocess(file, options.include_dirs)
+    if options.save_temps:
+        _save_temp(file, ".i", preprocessed)
+    return preprocessed
+
+def _assemble(file, stage, assembly_code, save_temps, assembly_codes = None):
+    """
+    Assembles or links the code for stages that produce a binary, returning its path.
+    If assembly_codes is a list, the code is collected there to be linked by run_compiler.
+    """
+    if assembly_code is None:
+        return None
+    if save_temps:
+        _save_temp(file, ".s", assembly_code)
+    if assembly_codes is not None:
+        assembly_codes.append(assembly_code)
+        return None
+    from .gcc_runner import assemble, assemble_object
+    if stage == CompilerStage.C:
+        return assemble_object(assembly_code, _output_path(file, stage))
+    return assemble(assembly_code, _output_path(file, stage))
+
+def _output_path(file, stage):
+    base, _ = os.path.splitext(file)
+    return base + ".o" if stage == CompilerStage.C else base
+
+def _save_temp(file, suffix, contents):
+    base, _ = os.path.splitext(file)
+    with open(base + suffix, "w") as f:
+        f.write(contents)
+
+def _report_assembly(options, assembly_code):
+    if options.print_assembly and assembly_code is not None:
+        from .pretty_printer import printer
+        print("Assembly code:")
+        printer(assembly_code)
+
+def compile_c(source, flag, ctx = None, functions = None, object_code = False, out = None, optimizer = None):
+    """
+    Compiles preprocessed C read from source, an iterable of lines. Stages up to CODEGEN print
+    their result, the later ones return the generated assembly code, or with object_code
+    the contents of an ELF object file. Given a text stream out, the assembly code is
+    written to it function by function instead of returned. The TACKY is optimized by
+    optimizer, if given (see CompileOptions.optimizer).
+    """
+    if ctx is None:
+        ctx = CompilationContext()
+
+    from . import lexer
     if flag == CompilerStage.LEX:
+        with time_trace.span("lex"):
+            tokens = list(lexer.stream_tokens(source))
         [print(token) for token in tokens]
         return
     
-    c_ast = parser.Parser(deque(tokens)).parse_program()
+    from .parser import Parser
+    from .pretty_printer import printer
+    tokens = lexer.stream_tokens(source)
+    if time_trace.is_recording():
+        # Lexing is otherwise interleaved with parsing, and would not get a span of its own.
+        with time_trace.span("lex"):
+            tokens = list(tokens)
+    c_ast = Parser(tokens).parse_program()
     if flag == CompilerStage.PARSE:
         print("C AST:")
-        pretty_printer.printer(c_ast)
+        printer(c_ast)
         return
     
-    analysed_ast = validate_program(c_ast)
+    from .semantic_analysis.semantic_analyser import validate_program
+    analysed_ast = validate_program(ctx, c_ast)
     if flag == CompilerStage.VALIDATE:
         print("Validated C AST:")
-        pretty_printer.printer(analysed_ast)
+        printer(analysed_ast)
         return
 
-    emitted_ir = emitter.emit_program(analysed_ast)
+    if functions is None:
+        from .emitter import emit_program
+        emitted_ir = emit_program(ctx, analysed_ast)
+    else:
+        emitted_ir = functions.emit_program(ctx, analysed_ast)
+    if optimizer is not None:
+        # Functions reused from the incremental cache were optimized before they were stored.
+        emitted_ir = optimizer.optimize_program(ctx, emitted_ir, functions.reused if functions is not None else ())
     if flag == CompilerStage.TACKY:
         print("Tacky AST:")
-        pretty_printer.printer(emitted_ir)
+        printer(emitted_ir)
         return
 
-    asm = asm_generator.lower_program(emitted_ir)
-    asm_allocator.legalize(asm)
+    if functions is None:
+        from .asm_generator import lower_program
+        from .asm_allocator import legalize
+        asm = lower_program(ctx, emitted_ir)
+        legalize(ctx, asm)
+    else:
+        asm = functions.lower_program(ctx, emitted_ir)
     if flag == CompilerStage.CODEGEN:
         print("Assembly AST:")
-        pretty_printer.printer(asm)
+        printer(asm)
         return
 
-    output = file[:-2] + ".s"
-    with open(output, "w") as f:
-        assembly_code = code_emitter.emit_program_code(asm)
-        if flag == CompilerStage.ALL:
-            print("Assembly code:")
-            pretty_printer.printer(assembly_code)
-        f.write(assembly_code)
-
-    #if flag in ["all", "c"]:
-    #    print("Assembly code:")
-    #    print(assembly_code)
-    
-    return output
\ No newline at end of file
+    if object_code:
+        from .object_emitter import emit_object
+        return emit_object(ctx, asm)
+    from .code_emitter import emit_program_code, write_program_code
+    if out is not None:
+        write_program_code(ctx, asm, out)
+        return
+    return emit_program_code(ctx, asm)
+
+
+def import_stages():
+    """Imports every module a compile can need, for processes that fork a worker per compile."""
+    from . import (lexer, parser, emitter, asm_generator, asm_allocator, code_emitter, object_emitter,
+                   preprocessor, pretty_printer, gcc_runner, compile_cache, incremental)
+    from .semantic_analysis import semantic_analyser
+    from .optimizations import optimizer
+    from concurrent.futures import ProcessPoolExecutor
\ No newline at end of file
@@ -1,32 +1,209 @@
+import os
 import sys
-import click
-from .compiler import run_compiler
 from .compiler_stages import CompilerStage
+from .utils import enable_tracing
+from .profiler import PROFILE_MODES
 
-@click.command()
-@click.option("--lex", "stage", flag_value=CompilerStage.LEX, help="Run lexer only.")
-@click.option("--parse", "stage", flag_value=CompilerStage.PARSE, help="Parse C into AST.")
-@click.option("--validate", "stage", flag_value=CompilerStage.VALIDATE, help="Validate C AST.")
-@click.option("--tacky", "stage", flag_value=CompilerStage.TACKY, help="Generate Tacky IR.")
-@click.option("--codegen", "stage", flag_value=CompilerStage.CODEGEN, help="Generate assembly code.")
-@click.option("--all", "stage", flag_value=CompilerStage.ALL, help="Run all stages.")
-@click.option("--testall", "stage", flag_value=CompilerStage.TESTALL, help="Run all stages and print intermediate results.")
-@click.option("-c", "stage", flag_value=CompilerStage.C, help="Compile to object file.")
-@click.argument("input_files", nargs=-1, type=click.Path(exists=True))
-def main(stage, input_files):
-    if isinstance(stage, str) and stage.startswith("CompilerStage."):
-        stage = CompilerStage[stage.split(".")[-1]]
+# Every command line option, in --help order: (names, parameter, kind, default, metavar, help).
+# kind is the CompilerStage a stage flag selects, "flag" for booleans (an "--on/--off" pair or
+# a single name that sets True, or None when not given if that is the default), "text" or
+# "multiple" for options taking a string, "count" for a number of at least 1, "file" for a path that is not a directory, or the tuple of values a
+# choice accepts. {…_env} in the help is filled in with the environment variable names when
+# click builds the command.
+_OPTIONS = [
+    (("--lex",), "stage", CompilerStage.LEX, None, None, "Run lexer only."),
+    (("--parse",), "stage", CompilerStage.PARSE, None, None, "Parse C into AST."),
+    (("--validate",), "stage", CompilerStage.VALIDATE, None, None, "Validate C AST."),
+    (("--tacky",), "stage", CompilerStage.TACKY, None, None, "Generate Tacky IR."),
+    (("--codegen",), "stage", CompilerStage.CODEGEN, None, None, "Generate assembly code."),
+    (("--all",), "stage", CompilerStage.ALL, None, None, "Run all stages."),
+    (("--testall",), "stage", CompilerStage.TESTALL, None, None, "Run all stages and print intermediate results."),
+    (("-c",), "stage", CompilerStage.C, None, None, "Compile to object file."),
+    (("-o",), "output", "file", None, "FILE",
+     "Link all input files into the single executable FILE with one gcc invocation."),
+    (("--print-asm",), "print_assembly", "flag", False, None, "Print the generated assembly code."),
+    (("-O",), "optimization_level", ("0", "1", "2"), "0", "LEVEL",
+     "Optimize TACKY. -O1: fold + unreachable; -O2: all passes; explicit pass flags override."),
+    (("--fold-constants/--no-fold-constants",), "fold_constants", "flag", None, None,
+     "Evaluate TACKY instructions on constant operands at compile time, and resolve conditional jumps on constants."),
+    (("--eliminate-unreachable-code/--no-eliminate-unreachable-code",), "eliminate_unreachable_code", "flag", None, None,
+     "Remove TACKY that no path reaches, jumps to the next instruction and labels nothing jumps to."),
+    (("--propagate-copies/--no-propagate-copies",), "propagate_copies", "flag", None, None,
+     "Replace variables with the value last copied into them, where that copy reaches every use."),
+    (("--eliminate-dead-stores/--no-eliminate-dead-stores",), "eliminate_dead_stores", "flag", None, None,
+     "Remove TACKY instructions that only write a variable no later instruction reads."),
+    (("--optimization-stats",), "optimization_stats", "flag", False, None,
+     "Print how many changes each TACKY pass made, and the functions whose budget ran out."),
+    (("--optimization-iterations",), "optimization_iterations", "count", 10, "N",
+     "Run the TACKY passes over a function at most N times, even if they still change it."),
+    (("--optimization-time-budget",), "optimization_time_budget", "count", 1000, "MS",
+     "Stop optimizing a function after the round of passes that takes it past MS milliseconds."),
+    (("--trace",), "trace", "multiple", (), "MODULE",
+     "Log calls in MODULE (e.g. emitter, typechecker or all). Repeatable, also read from ${trace_env}."),
+    (("-j", "--jobs"), "jobs", "count", 1, None, "Number of files to compile in parallel."),
+    (("--fail-fast/--keep-going",), "fail_fast", "flag", True, None,
+     "Stop at the first file that fails to compile (default), or compile all files."),
+    (("--cache/--no-cache",), "use_cache", "flag", True, None,
+     "Reuse assembly and object files of unchanged sources from an on-disk cache (default). Location and size are set by ${cache_dir_env} and ${cache_size_env}."),
+    (("--incremental",), "incremental", "flag", False, None, "Reuse TACKY and assembly of unchanged functions from the cache."),
+    (("--save-temps",), "save_temps", "flag", False, None, "Also write the preprocessed source (.i) and assembly (.s) next to each input."),
+    (("-I",), "include_dirs", "multiple", (), "DIR", "Add DIR to the #include search path. Repeatable."),
+    (("--builtin-cpp/--gcc-cpp",), "builtin_preprocessor", "flag", True, None,
+     "Preprocess inputs of up to 16 KiB with the built-in preprocessor, which saves starting gcc but is slower on "
+     "larger inputs, falling back to gcc -E when it does not support the input (default), or always use gcc -E."),
+    (("--builtin-as/--gcc-as",), "builtin_assembler", "flag", True, None,
+     "With -c, encode object files directly (default), or print assembly and run it through gcc's assembler."),
+    (("--time-trace",), "time_trace", "flag", False, None,
+     "Write a Chrome trace of the time spent per stage and function to FILE.trace.json for each input FILE.c, for Perfetto or chrome://tracing."),
+    (("--profile",), "profile", PROFILE_MODES, None, None,
+     "Profile each input FILE.c, writing FILE.prof for pstats and FILE.folded stacks rooted at their stage for flamegraph.pl or speedscope. cprofile traces every call, sample records the stack every millisecond at a fraction of the cost."),
+    (("--serve",), "serve", "flag", False, None, "Run as a compile server on a Unix socket (see src/compile_client.py). -j limits concurrent compiles."),
+    (("--socket",), "socket_path", "text", None, "PATH",
+     "Socket for --serve. Defaults to ${socket_env} or a per-user path in the temp directory."),
+]
 
-    if not stage and not input_files:
-        click.echo(main.get_help(click.Context(main)))
-        sys.exit(0)
+def _option_names():
+    """Maps each option name to (parameter, kind, value), value being what a flag sets."""
+    names = {}
+    for declarations, parameter, kind, _, _, _ in _OPTIONS:
+        for declaration in declarations:
+            on, _, off = declaration.partition("/")
+            names[on] = (parameter, kind, kind if isinstance(kind, CompilerStage) else True)
+            if off:
+                names[off] = (parameter, kind, False)
+    return names
 
-    if stage is None:
-        stage = CompilerStage.ALL
+_OPTION_NAMES = _option_names()
+_LINKING_STAGES = (CompilerStage.ALL, CompilerStage.TESTALL)
 
-    run_compiler(input_files, stage)
+
+def main(argv = None, prog_name = None):
+    """
+    Runs the compiler on the command line argv (sys.argv[1:] by default). Well-formed command
+    lines are parsed here so click is not imported; --help, no arguments and every error are
+    handed to the click command, which prints the help and diagnostics.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    params = _parse_fast(argv)
+    if params is None:
+        _click_command().main(args=argv, prog_name=prog_name)
+        return
+    try:
+        _run(**params)
+    except BrokenPipeError:
+        # Like click, exit quietly when the reader of the output went away, e.g. `| head`.
+        sys.stdout = open(os.devnull, "w")
+        sys.exit(1)
+
+def _parse_fast(argv):
+    """Returns the parameters for _run, or None if argv needs click to parse or report on it."""
+    params = {parameter: default for _, parameter, _, default, _, _ in _OPTIONS}
+    params["input_files"] = []
+    args = iter(argv)
+    for arg in args:
+        if not arg.startswith("-") or arg == "-":
+            if not os.path.exists(arg):
+                return None
+            params["input_files"].append(arg)
+            continue
+        if arg.startswith("--"):
+            name, has_value, value = arg.partition("=")
+        else:
+            name, value = arg[:2], arg[2:]
+            has_value = bool(value)
+        if name not in _OPTION_NAMES:
+            return None
+        parameter, kind, setting = _OPTION_NAMES[name]
+        if isinstance(kind, CompilerStage) or kind == "flag":
+            if has_value:
+                return None
+            params[parameter] = setting
+            continue
+        if not has_value:
+            value = next(args, None)
+            if value is None or value.startswith("-"):
+                return None
+        match kind:
+            case "multiple":
+                params[parameter] += (value,)
+            case "count":
+                if not value.isdecimal() or int(value) < 1:
+                    return None
+                params[parameter] = int(value)
+            case "file":
+                if os.path.isdir(value):
+                    return None
+                params[parameter] = value
+            case tuple():
+                if value not in kind:
+                    return None
+                params[parameter] = value
+            case _:
+                params[parameter] = value
+
+    params["input_files"] = tuple(params["input_files"])
+    if not params["serve"]:
+        if params["stage"] is None and not params["input_files"]:
+            return None
+        if params["output"] is not None and params["stage"] not in (None, *_LINKING_STAGES):
+            return None
+    return params
+
+def _click_command():
+    """Builds the click command for _OPTIONS, which also prints --help and reports usage errors."""
+    import click
+    from .utils import TRACE_ENV_VAR
+    from .compile_client import SOCKET_ENV_VAR
+    from .compile_cache import CACHE_DIR_ENV_VAR, CACHE_SIZE_ENV_VAR
+    env_vars = {"trace_env": TRACE_ENV_VAR, "socket_env": SOCKET_ENV_VAR,
+                "cache_dir_env": CACHE_DIR_ENV_VAR, "cache_size_env": CACHE_SIZE_ENV_VAR}
+
+    def run(stage, output, input_files, **params):
+        if isinstance(stage, str) and stage.startswith("CompilerStage."):
+            stage = CompilerStage[stage.split(".")[-1]]
+        if not params["serve"]:
+            if not stage and not input_files:
+                click.echo(command.get_help(click.Context(command)))
+                sys.exit(0)
+            if output is not None and stage not in (None, *_LINKING_STAGES):
+                raise click.UsageError("-o is only supported when linking (--all or --testall).")
+        _run(stage, output, input_files = input_files, **params)
+
+    run = click.argument("input_files", nargs=-1, type=click.Path(exists=True))(run)
+    for declarations, parameter, kind, default, metavar, help_text in reversed(_OPTIONS):
+        attributes = {"help": help_text.format(**env_vars), "metavar": metavar}
+        match kind:
+            case CompilerStage():
+                attributes["flag_value"] = kind
+            case "flag":
+                attributes |= {"is_flag": True, "default": default}
+            case "multiple":
+                attributes["multiple"] = True
+            case "count":
+                attributes |= {"type": click.IntRange(min=1), "default": default}
+            case "file":
+                attributes["type"] = click.Path(dir_okay=False)
+            case tuple():
+                attributes["type"] = click.Choice(kind)
+        run = click.option(*declarations, parameter, **attributes)(run)
+    command = click.command("compiler_driver")(run)
+    return command
+
+def _run(stage, output, trace, jobs, fail_fast, serve, socket_path, input_files, **options):
+    # Tracing is fixed when the stage modules are decorated, so enable it before importing them.
+    enable_tracing(trace)
+    if serve:
+        from .compile_server import serve as run_server
+        from .compile_client import default_socket_path
+        run_server(socket_path or default_socket_path(), jobs)
+        return
+
+    from .compiler import run_compiler, CompileOptions
+    options["optimization_level"] = int(options["optimization_level"])
+    run_compiler(input_files, stage or CompilerStage.ALL, jobs, fail_fast, CompileOptions(**options), output)
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,6 +1,8 @@
 from .ir_ast import *
 from .c_ast import *
-from .utils import NameGenerator, log
+from .utils import log
+from .time_trace import traced, function_definition
+from .compilation_context import CompilationContext
 from copy import deepcopy
 from typing import Any, List, Optional
 from .semantic_analysis.symbol_table import *
@@ -27,9 +29,9 @@ _BINOP_MAP = {
 }
 
 @log
-def make_tacky_variable(var_type: Type) -> IRVar:
-    var_name = NameGenerator.make_temporary()
-    symbol_table[var_name] = SymbolEntry(type = var_type, attrs = LocalAttr())
+def make_tacky_variable(ctx: CompilationContext, var_type: Type) -> IRVar:
+    var_name = ctx.name_generator.make_temporary()
+    ctx.symbol_table[var_name] = SymbolEntry(type = var_type, attrs = LocalAttr())
     return IRVar(var_name)
 
 def emit_binary_operator(ast_node: BinaryOperator) -> IRBinaryOperator:
@@ -45,15 +47,15 @@ def emit_unary_operator(ast_node: UnaryOperator) -> IRUnaryOperator:
         raise RuntimeError(f"Unary operator {ast_node} not implemented")
 
 @log
-def emit_unary_instructions(instructions: List[IRInstruction], result_type: Type, unop: UnaryOperator, exp: Exp) -> IRVar:
-    src = emit_exp(instructions, exp)
-    dst = make_tacky_variable(result_type)
+def emit_unary_instructions(ctx: CompilationContext, instructions: List[IRInstruction], result_type: Type, unop: UnaryOperator, exp: Exp) -> IRVar:
+    src = emit_exp(ctx, instructions, exp)
+    dst = make_tacky_variable(ctx, result_type)
     tacky_op = emit_unary_operator(unop)
     instructions.append(IRUnary(tacky_op,src,dst))
     return dst
 
 @log
-def emit_short_circuit_instructions(instructions: List[IRInstruction], result_type: Type, binop: BinaryOperator, e1: Exp, e2: Exp) -> IRVar:
+def emit_short_circuit_instructions(ctx: CompilationContext, instructions: List[IRInstruction], result_type: Type, binop: BinaryOperator, e1: Exp, e2: Exp) -> IRVar:
     if binop == BinaryOperator.And:
         short_circuit_value = 0
         jump_instr = IRJumpIfZero
@@ -62,17 +64,17 @@ def emit_short_circuit_instructions(instructions: List[IRInstruction], result_ty
         jump_instr = IRJumpIfNotZero
 
     # Evaluate first expression
-    val1 = emit_exp(instructions, e1)
-    sc_label = NameGenerator.make_label(f"sc_{binop.name.lower()}")
+    val1 = emit_exp(ctx, instructions, e1)
+    sc_label = ctx.name_generator.make_label(f"sc_{binop.name.lower()}")
     instructions.append(jump_instr(val1, sc_label))
 
     # Evaluate second expression only if needed
-    val2 = emit_exp(instructions, e2)
+    val2 = emit_exp(ctx, instructions, e2)
     instructions.append(jump_instr(val2, sc_label))
 
     # Compute the result
-    result = make_tacky_variable(result_type)
-    end_label = NameGenerator.make_label("end_sc")
+    result = make_tacky_variable(ctx, result_type)
+    end_label = ctx.name_generator.make_label("end_sc")
 
     instructions.extend([
         IRCopy(IRConstant(ConstInt(1 - short_circuit_value)), result),
@@ -85,28 +87,28 @@ def emit_short_circuit_instructions(instructions: List[IRInstruction], result_ty
     return result
     
 @log
-def emit_binary_instructions(instructions: List[IRInstruction], result_type: Type, binop: BinaryOperator, e1: Exp, e2: Exp) -> IRVar:
-    v1 = emit_exp(instructions, e1)
-    v2 = emit_exp(instructions, e2)
-    dst = make_tacky_variable(result_type)
+def emit_binary_instructions(ctx: CompilationContext, instructions: List[IRInstruction], result_type: Type, binop: BinaryOperator, e1: Exp, e2: Exp) -> IRVar:
+    v1 = emit_exp(ctx, instructions, e1)
+    v2 = emit_exp(ctx, instructions, e2)
+    dst = make_tacky_variable(ctx, result_type)
     tacky_op = emit_binary_operator(binop)
     instructions.append(IRBinary(tacky_op, v1, v2, dst))
     return dst
 
 @log
-def emit_function_call(instructions: List[IRInstruction], result_type: Type, identifier: str, args: List[Exp]) -> IRVar:
-    new_args = [emit_exp(instructions, arg) for arg in args]
-    result = make_tacky_variable(result_type)
+def emit_function_call(ctx: CompilationContext, instructions: List[IRInstruction], result_type: Type, identifier: str, args: List[Exp]) -> IRVar:
+    new_args = [emit_exp(ctx, instructions, arg) for arg in args]
+    result = make_tacky_variable(ctx, result_type)
     instructions.append(IRFunCall(identifier, new_args, result))
     return result
 
 @log
-def emit_cast(instructions: List[IRInstruction], target_type: Type, inner_exp: Exp) -> IRVar:
-    result = emit_exp(instructions, inner_exp)
+def emit_cast(ctx: CompilationContext, instructions: List[IRInstruction], target_type: Type, inner_exp: Exp) -> IRVar:
+    result = emit_exp(ctx, instructions, inner_exp)
     inner_type = get_type(inner_exp)
     if target_type == inner_type:
         return result
-    dst = make_tacky_variable(target_type)
+    dst = make_tacky_variable(ctx, target_type)
     if target_type.size() == inner_type.size():
         instructions.append(IRCopy(result, dst))
     elif target_type.size() < inner_type.size():
@@ -118,101 +120,101 @@ def emit_cast(instructions: List[IRInstruction], target_type: Type, inner_exp: E
     return dst
         
 @log
-def emit_exp(instructions: List[IRInstruction], ast_node: Exp) -> IRVal:
+def emit_exp(ctx: CompilationContext, instructions: List[IRInstruction], ast_node: Exp) -> IRVal:
     match ast_node:
         case Constant(constant):
             return IRConstant(constant)
         case Unary(unop, exp):
-            return emit_unary_instructions(instructions, get_type(ast_node), unop, exp)
+            return emit_unary_instructions(ctx, instructions, get_type(ast_node), unop, exp)
         case Binary(BinaryOperator.And | BinaryOperator.Or as binop, e1, e2):
-            return emit_short_circuit_instructions(instructions, get_type(ast_node), binop, e1, e2)
+            return emit_short_circuit_instructions(ctx, instructions, get_type(ast_node), binop, e1, e2)
         case Binary(binop, e1, e2):
-            return emit_binary_instructions(instructions, get_type(ast_node), binop, e1, e2)
+            return emit_binary_instructions(ctx, instructions, get_type(ast_node), binop, e1, e2)
         case Var(v):
             return IRVar(v)
         case Assignment(Var(v), rhs):
-            result = emit_exp(instructions, rhs)
+            result = emit_exp(ctx, instructions, rhs)
             lhs = IRVar(v)
             instructions.append(IRCopy(result, lhs))
             return lhs
         case Conditional(cond, then, else_):
-            return emit_conditional(instructions, get_type(ast_node), cond, then, else_)
+            return emit_conditional(ctx, instructions, get_type(ast_node), cond, then, else_)
         case FunctionCall(identifier, args):
-            return emit_function_call(instructions, get_type(ast_node), identifier, args)
+            return emit_function_call(ctx, instructions, get_type(ast_node), identifier, args)
         case Cast(target_type, inner):
-            return emit_cast(instructions, target_type, inner)
+            return emit_cast(ctx, instructions, target_type, inner)
         case _:
             raise RuntimeError(f"Expression {ast_node} not implemented")
 
 @log      
-def emit_conditional(instructions: List[IRInstruction], result_type: Type, cond: Exp, then: Exp, else_: Exp) -> IRVar:
+def emit_conditional(ctx: CompilationContext, instructions: List[IRInstruction], result_type: Type, cond: Exp, then: Exp, else_: Exp) -> IRVar:
     # Evaluate condition
-    cond_tmp = emit_exp_to_temp(instructions, cond)
+    cond_tmp = emit_exp_to_temp(ctx, instructions, cond)
 
-    result = make_tacky_variable(result_type)
+    result = make_tacky_variable(ctx, result_type)
 
-    else_label = NameGenerator.make_label("else")
-    end_label = NameGenerator.make_label("end")
+    else_label = ctx.name_generator.make_label("else")
+    end_label = ctx.name_generator.make_label("end")
 
     # Conditional jump to else
     instructions.append(IRJumpIfZero(cond_tmp, else_label))
 
     # Then branch
-    then_tmp = emit_exp_to_temp(instructions, then)
+    then_tmp = emit_exp_to_temp(ctx, instructions, then)
     instructions.append(IRCopy(then_tmp, result))
     instructions.append(IRJump(end_label))
 
     # Else branch
     instructions.append(IRLabel(else_label))
-    else_tmp = emit_exp_to_temp(instructions, else_)
+    else_tmp = emit_exp_to_temp(ctx, instructions, else_)
     instructions.append(IRCopy(else_tmp, result))
 
     instructions.append(IRLabel(end_label))
     return result
 
 @log
-def emit_exp_to_temp(instructions: List[IRInstruction], exp: Exp) -> IRVar:
-    exp_val = emit_exp(instructions, exp)
-    exp_tmp = make_tacky_variable(get_type(exp))
+def emit_exp_to_temp(ctx: CompilationContext, instructions: List[IRInstruction], exp: Exp) -> IRVar:
+    exp_val = emit_exp(ctx, instructions, exp)
+    exp_tmp = make_tacky_variable(ctx, get_type(exp))
     instructions.append(IRCopy(exp_val, exp_tmp))
     return exp_tmp
 
 @log
-def emit_if(instructions: List[IRInstruction], cond: Exp, then: Statement, else_: Optional[Statement]) -> None:
+def emit_if(ctx: CompilationContext, instructions: List[IRInstruction], cond: Exp, then: Statement, else_: Optional[Statement]) -> None:
     # Evaluate condition
-    cond_tmp = emit_exp_to_temp(instructions, cond)
+    cond_tmp = emit_exp_to_temp(ctx, instructions, cond)
 
-    end_label = NameGenerator.make_label("end")
+    end_label = ctx.name_generator.make_label("end")
 
     if else_ is None:
         instructions.append(IRJumpIfZero(cond_tmp, end_label))
-        emit_statement(instructions, then)
+        emit_statement(ctx, instructions, then)
     else:
         # With else branch
-        else_label = NameGenerator.make_label("else")
+        else_label = ctx.name_generator.make_label("else")
         instructions.append(IRJumpIfZero(cond_tmp, else_label))
-        emit_statement(instructions, then)
+        emit_statement(ctx, instructions, then)
         instructions.append(IRJump(end_label))
         instructions.append(IRLabel(else_label))
-        emit_statement(instructions, else_)
+        emit_statement(ctx, instructions, else_)
 
     instructions.append(IRLabel(end_label))  
 
 @log
-def emit_for_init(instructions: List[IRInstruction], for_init: ForInit) -> Optional[Any]: # TODO: return none?
+def emit_for_init(ctx: CompilationContext, instructions: List[IRInstruction], for_init: ForInit) -> Optional[Any]: # TODO: return none?
     match for_init:
         case InitDecl(decl):
-            return emit_variable_declaration(instructions, decl)
+            return emit_variable_declaration(ctx, instructions, decl)
         case InitExp(None):
             pass
         case InitExp(exp):
-            return emit_exp(instructions, exp)
+            return emit_exp(ctx, instructions, exp)
         case _:
             raise RuntimeError(f"ForInit {for_init} not implemented")
 
 @log
-def emit_conditional_jump(instructions: List[IRInstruction], cond: Exp, jump_label: str, invert: bool = False) -> None:
-    v = emit_exp_to_temp(instructions, cond)
+def emit_conditional_jump(ctx: CompilationContext, instructions: List[IRInstruction], cond: Exp, jump_label: str, invert: bool = False) -> None:
+    v = emit_exp_to_temp(ctx, instructions, cond)
     if invert:
         instructions.append(IRJumpIfNotZero(v, jump_label))
     else:
@@ -227,117 +229,119 @@ def make_loop_labels(label: str) -> tuple[IRLabel, IRLabel, IRLabel]:
     )
 
 @log
-def emit_loop(instructions: List[IRInstruction], loop: While | DoWhile | For) -> None:
+def emit_loop(ctx: CompilationContext, instructions: List[IRInstruction], loop: While | DoWhile | For) -> None:
     match loop:
         case While(cond, body, label):
             _, continue_, break_ = make_loop_labels(label)
             instructions.append(continue_)
-            emit_conditional_jump(instructions, cond, f"break_{label}")
-            emit_statement(instructions, body)
+            emit_conditional_jump(ctx, instructions, cond, f"break_{label}")
+            emit_statement(ctx, instructions, body)
             instructions.append(IRJump(f"continue_{label}"))
             instructions.append(break_)
         case DoWhile(body, cond, label):
             start, continue_, break_ = make_loop_labels(label)
             instructions.append(start)
-            emit_statement(instructions, body)
+            emit_statement(ctx, instructions, body)
             instructions.append(continue_)
-            emit_conditional_jump(instructions, cond, f"start_{label}", True)
+            emit_conditional_jump(ctx, instructions, cond, f"start_{label}", True)
             instructions.append(break_)
         case For(init, cond, post, body, label):
             start, continue_, break_ = make_loop_labels(label)
-            emit_for_init(instructions, init)
+            emit_for_init(ctx, instructions, init)
             instructions.append(start)
             if cond is not None:
-                emit_conditional_jump(instructions, cond, f"break_{label}")
-            emit_statement(instructions, body)
+                emit_conditional_jump(ctx, instructions, cond, f"break_{label}")
+            emit_statement(ctx, instructions, body)
             instructions.append(continue_)
             if post is not None:
-                emit_exp(instructions, post)
+                emit_exp(ctx, instructions, post)
             instructions.append(IRJump(f"start_{label}"))
             instructions.append(break_)
 
 @log
-def emit_variable_declaration(instructions: List[IRInstruction], decl: VariableDeclaration) -> Optional[IRVar]:
+def emit_variable_declaration(ctx: CompilationContext, instructions: List[IRInstruction], decl: VariableDeclaration) -> Optional[IRVar]:
     if decl.storage_class is not None:
         return None
     if decl.init is None:
         return None
-    result = emit_exp(instructions, decl.init)
+    result = emit_exp(ctx, instructions, decl.init)
     lhs = IRVar(decl.name)
     instructions.append(IRCopy(result, lhs))
     return lhs
 
 @log
-def emit_statement(instructions: List[IRInstruction], statement: Statement) -> None:
+def emit_statement(ctx: CompilationContext, instructions: List[IRInstruction], statement: Statement) -> None:
     match statement:
         case Return(exp):
-            ret = emit_exp(instructions, exp)
+            ret = emit_exp(ctx, instructions, exp)
             instructions.append(IRReturn(ret))
         case Expression(exp):
-            emit_exp(instructions, exp)
+            emit_exp(ctx, instructions, exp)
         case If(cond, then, else_):
-            emit_if(instructions, cond, then, else_)
+            emit_if(ctx, instructions, cond, then, else_)
         case Compound(block):
-            emit_block(instructions, block)
+            emit_block(ctx, instructions, block)
         case Break(label):
             instructions.append(IRJump(f"break_{label}"))
         case Continue(label):
             instructions.append(IRJump(f"continue_{label}"))
         case While() | DoWhile() | For():
-            emit_loop(instructions, statement)
+            emit_loop(ctx, instructions, statement)
         case Null():
             pass
         case _:
             raise RuntimeError(f"Statement {statement} not implemented")
 
 @log
-def emit_declaration(instructions: List[IRInstruction], decl: Declaration) -> None:
+def emit_declaration(ctx: CompilationContext, instructions: List[IRInstruction], decl: Declaration) -> None:
     match decl:
         case FunDecl(fun_decl):
-            emit_function_declaration(fun_decl)
+            emit_function_declaration(ctx, fun_decl)
         case VarDecl(var_decl):
-            emit_variable_declaration(instructions, var_decl)
+            emit_variable_declaration(ctx, instructions, var_decl)
         case _:
             raise RuntimeError(f"Declaration {decl} not implemented")
 
 @log
-def emit_block_item(instructions: List[IRInstruction], item: BlockItem) -> None:
+def emit_block_item(ctx: CompilationContext, instructions: List[IRInstruction], item: BlockItem) -> None:
     match item:
         case D(declaration):
-            emit_declaration(instructions, declaration)
+            emit_declaration(ctx, instructions, declaration)
         case S(statement):
-            emit_statement(instructions, statement)
+            emit_statement(ctx, instructions, statement)
         case _:
             raise RuntimeError(f"BlockItem {item} not implemented")
 
 @log
-def emit_block(instructions: List[IRInstruction], block: Block) -> None:
+def emit_block(ctx: CompilationContext, instructions: List[IRInstruction], block: Block) -> None:
     for block_item in block.block_items:
-        emit_block_item(instructions, block_item)
+        emit_block_item(ctx, instructions, block_item)
 
 @log
-def emit_function_declaration(fun_decl: FunctionDeclaration) -> Optional[IRFunctionDefinition]:
+@traced(function_definition)
+def emit_function_declaration(ctx: CompilationContext, fun_decl: FunctionDeclaration) -> Optional[IRFunctionDefinition]:
     if fun_decl.body is None:
         return
     instructions = []
-    emit_block(instructions, fun_decl.body)
+    with ctx.name_generator.function_scope(fun_decl.name):
+        emit_block(ctx, instructions, fun_decl.body)
     instructions.append(IRReturn(IRConstant(ConstInt(0))))
-    global_ = symbol_table[fun_decl.name].attrs.global_
+    global_ = ctx.symbol_table[fun_decl.name].attrs.global_
     return IRFunctionDefinition(fun_decl.name, global_, fun_decl.params, deepcopy(instructions))
 
 @log
-def emit_toplevel(decl: Declaration) -> Optional[IRFunctionDefinition]:
+def emit_toplevel(ctx: CompilationContext, decl: Declaration) -> Optional[IRFunctionDefinition]:
     match decl:
         case FunDecl(fun_decl):
-            return emit_function_declaration(fun_decl)
+            return emit_function_declaration(ctx, fun_decl)
         case VarDecl():
             return None
         case _:
             raise RuntimeError(f"Declaration {decl} not implemented")
         
-def convert_symbols_to_tacky():
+def convert_symbols_to_tacky(ctx: CompilationContext):
     tacky_defs = []
-    for name, entry in symbol_table.items():
+    for name, entry in ctx.symbol_table.items():
         type_, attrs = entry.type, entry.attrs
         if not isinstance(attrs, StaticAttr):
             continue
@@ -367,7 +371,8 @@ def convert_symbols_to_tacky():
 #TODO: Move this method to top of file, and so on with the other methods
 #TODO: Add logging?
 @log("Emitting TACKY:")
-def emit_program(program: Program) -> IRProgram:
-    toplevels = [toplevel for decl in program.declarations if (toplevel := emit_toplevel(decl)) is not None]
-    toplevels.extend(convert_symbols_to_tacky())
+@traced()
+def emit_program(ctx: CompilationContext, program: Program) -> IRProgram:
+    toplevels = [toplevel for decl in program.declarations if (toplevel := emit_toplevel(ctx, decl)) is not None]
+    toplevels.extend(convert_symbols_to_tacky(ctx))
     return IRProgram(toplevels)
@@ -1,57 +1,179 @@
 import os
+import signal
 import subprocess
-import click
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from .time_trace import traced, span, GCC_TRACK
 
-def preprocess(file):
-    """Preprocess a C file to produce a .i file."""
-    base, _ = os.path.splitext(file)
-    output_file = f"{base}.i"
+def _preprocess_command(file, include_dirs):
+    return ["gcc", "-E", "-P", *(f"-I{directory}" for directory in include_dirs), file]
 
-    run_gcc(["gcc", "-E", "-P", file, "-o", output_file],
-            f"Preprocessing failed for {file}")
+@traced("preprocess (gcc)")
+def preprocess(file, include_dirs = ()):
+    """Preprocess a C file, returning the preprocessed source."""
+    return run_gcc(_preprocess_command(file, include_dirs),
+                   f"Preprocessing failed for {file}", capture_stdout=True)
 
-    return output_file
+@contextmanager
+def preprocess_stream(file, include_dirs = ()):
+    """
+    Preprocess a C file, yielding gcc's output line by line while gcc is still running.
+    The lines end by raising if gcc failed, so nothing downstream sees a truncated file as complete.
+    """
+    # gcc runs alongside the compiler reading from it, so its span goes on a track of its own.
+    with span("preprocess (gcc)", GCC_TRACK), _preprocess_stream(file, include_dirs) as lines:
+        yield lines
+
+@contextmanager
+def _preprocess_stream(file, include_dirs):
+    process = subprocess.Popen(_preprocess_command(file, include_dirs),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # Read stderr concurrently so a chatty gcc cannot block on a full pipe.
+    errors = []
+    reader = threading.Thread(target=lambda: errors.append(process.stderr.read()))
+    reader.start()
+
+    def finish():
+        if process.returncode is None:
+            process.stdout.read()
+            process.stdout.close()
+            process.wait()
+            reader.join()
+            if errors[0]:
+                print(errors[0], file=sys.stderr)
+        if process.returncode != 0:
+            raise RuntimeError(f"Preprocessing failed for {file}")
 
-def assemble(file):
-    """Assemble a file into an executable binary."""
-    base, _ = os.path.splitext(file)
-    output_file = base
-    run_gcc(["gcc", file, "-o", output_file],
-            f"Assembling failed for {file}")
+    def lines():
+        yield from process.stdout
+        finish()
 
     try:
-        os.remove(file)
-    except OSError as e:
-        click.echo(f"Warning: Could not remove {file}: {e}", err=True)
+        yield lines()
+    except Exception:
+        # A lexer or parser error on truncated output is only a symptom of the preprocessor failing.
+        finish()
+        raise
+    finish()
 
+@traced("assemble (gcc)")
+def assemble(assembly_code, output_file):
+    """Assemble and link assembly code into an executable binary."""
+    run_gcc(["gcc", "-x", "assembler", "-", "-o", output_file],
+            f"Assembling failed for {output_file}", input=assembly_code)
     return output_file
 
-def assemble_object(file):
-    """Assemble a file into an object (.o) file."""
-    base, _ = os.path.splitext(file)
-    output_file = f"{base}.o"
+@traced("assemble (gcc)")
+def assemble_object(assembly_code, output_file):
+    """Assemble assembly code into an object (.o) file."""
+    run_gcc(["gcc", "-c", "-x", "assembler", "-", "-o", output_file],
+            f"Assembling object failed for {output_file}", input=assembly_code)
+    return output_file
 
-    run_gcc(["gcc", "-c", file, "-o", output_file],
-            f"Assembling object failed for {file}")
+@traced("assemble (gcc)")
+def assemble_file(assembly_file, output_file, object_file = False):
+    """Assemble an assembly file into an executable binary, or with object_file an object file."""
+    compile_only = ["-c"] if object_file else []
+    run_gcc(["gcc", *compile_only, "-x", "assembler", assembly_file, "-o", output_file],
+            f"Assembling failed for {output_file}")
+    return output_file
+
+@contextmanager
+def assemble_stream(output_file, object_file = False):
+    """
+    Starts gcc on an assembly pipe and yields a buffered text stream to write the code to.
+    gcc assembles it into an executable binary, or with object_file an object file, when
+    the block ends. gcc writes to a temporary file that only replaces output_file once it
+    succeeded; if the block raises, gcc and the assembler it started are killed instead, so
+    output_file is left as it was.
+    """
+    with span("assemble (gcc)", GCC_TRACK), _assemble_stream(output_file, object_file) as stream:
+        yield stream
+
+@contextmanager
+def _assemble_stream(output_file, object_file):
+    compile_only = ["-c"] if object_file else []
+    directory, name = os.path.split(output_file)
+    partial_file = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    # gcc runs as and ld as children, so it gets a process group of its own for them to be killed with it.
+    process = subprocess.Popen(["gcc", *compile_only, "-x", "assembler", "-", "-o", partial_file],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                               start_new_session=True)
+    # gcc's output is drained concurrently so it cannot block on a full pipe while we write.
+    outputs = {}
+    readers = [threading.Thread(target=lambda name=name: outputs.update({name: getattr(process, name).read()}))
+               for name in ("stdout", "stderr")]
+    for reader in readers:
+        reader.start()
+
+    try:
+        yield process.stdin
+        process.stdin.close()
+    except BrokenPipeError:
+        # gcc exited early, its diagnostics and exit status below say why.
+        pass
+    except BaseException:
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        process.wait()
+        _remove(partial_file)
+        raise
+    finally:
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+        for reader in readers:
+            reader.join()
+    if outputs["stdout"]:
+        sys.stdout.write(outputs["stdout"])
+    if outputs["stderr"]:
+        print(outputs["stderr"], file=sys.stderr)
+    if process.returncode != 0:
+        _remove(partial_file)
+        raise RuntimeError(f"Assembling failed for {output_file}")
+    os.replace(partial_file, output_file)
 
+def _remove(path):
     try:
-        os.remove(file)
-    except OSError as e:
-        click.echo(f"Warning: Could not remove {file}: {e}", err=True)
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
+@traced("link (gcc)")
+def link(assembly_codes, output_file):
+    """
+    Assembles and links several assembly files into one executable in a single gcc invocation.
+    gcc reads only one input from stdin, so they are passed as temporary files.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i, assembly_code in enumerate(assembly_codes):
+            path = os.path.join(directory, f"{i}.s")
+            with open(path, "w") as f:
+                f.write(assembly_code)
+            paths.append(path)
+        run_gcc(["gcc", *paths, "-o", output_file], f"Linking failed for {output_file}")
     return output_file
 
-def run_gcc(command, error_message):
+def run_gcc(command, error_message, input = None, capture_stdout = False):
     result = subprocess.run(
         command,
+        input=input,
         capture_output=True,
         text=True
     )
 
-    if result.stdout:
-        click.echo(result.stdout, nl=False)
+    if result.stdout and not capture_stdout:
+        sys.stdout.write(result.stdout)
     if result.stderr:
-        click.echo(result.stderr, err=True)
+        print(result.stderr, file=sys.stderr)
 
     if result.returncode != 0:
-        raise RuntimeError(error_message)
\ No newline at end of file
+        raise RuntimeError(error_message)
+    return result.stdout
@@ -0,0 +1,155 @@
+import hashlib
+from enum import Enum
+from itertools import islice
+from dataclasses import dataclass, fields, is_dataclass
+from typing import Optional
+from . import emitter, asm_generator, asm_allocator
+from .time_trace import traced
+from .c_ast import *
+from .ir_ast import IRProgram, IRFunctionDefinition
+from .assembly_ast import AsmProgram, AsmFunctionDef
+from .compilation_context import CompilationContext
+from .compile_cache import CompileCache, compiler_fingerprint
+from .semantic_analysis.symbol_table import SymbolEntry
+
+
+@dataclass(slots = True)
+class FunctionFragment:
+    ir: IRFunctionDefinition
+    symbols: dict[str, SymbolEntry]
+    asm: Optional[AsmFunctionDef] = None
+
+
+# Fields naming identifiers whose symbol table entries a function depends on.
+_IDENTIFIER_FIELDS = {
+    Var                 : ("identifier",),
+    FunctionCall        : ("identifier",),
+    VariableDeclaration : ("name",),
+    FunctionDeclaration : ("name", "params"),
+}
+_FIELD_NAMES: dict[type, tuple[str, ...]] = {}
+
+def _field_names(cls) -> tuple[str, ...]:
+    names = _FIELD_NAMES.get(cls)
+    if names is None:
+        names = _FIELD_NAMES[cls] = tuple(field.name for field in fields(cls))
+    return names
+
+def _canonical(node, out: list[str], identifiers: set[str]) -> None:
+    """
+    Appends a deterministic rendering of node to out (repr would show the addresses of
+    attribute singletons like LocalAttr) and collects the identifiers it mentions.
+    """
+    cls = type(node)
+    if cls is str or cls is int or cls is bool or node is None:
+        out.append(repr(node))
+    elif cls is list or cls is tuple:
+        out.append("[")
+        for elem in node:
+            _canonical(elem, out, identifiers)
+        out.append("]")
+    elif isinstance(node, type):
+        out.append(node.__name__)
+    elif isinstance(node, Enum):
+        out.append(str(node))
+    elif is_dataclass(node):
+        for name in _IDENTIFIER_FIELDS.get(cls, ()):
+            value = getattr(node, name)
+            if isinstance(value, list):
+                identifiers.update(value)
+            else:
+                identifiers.add(value)
+        out.append(cls.__name__ + "(")
+        for name in _field_names(cls):
+            _canonical(getattr(node, name), out, identifiers)
+        out.append(")")
+    else:
+        out.append(cls.__name__)
+
+def function_fingerprint(ctx: CompilationContext, fun_decl: FunctionDeclaration, optimizations = ()) -> str:
+    """
+    Hashes a validated function definition with the symbol table entries of every
+    identifier it mentions, which covers the signatures and storage of its callees
+    and globals as well as its own linkage, and the optimizations it is compiled with.
+    """
+    identifiers = set()
+    out = [compiler_fingerprint(), ",".join(optimizations)]
+    _canonical(fun_decl, out, identifiers)
+    for name in sorted(identifiers):
+        out.append(name)
+        _canonical(ctx.symbol_table.get(name), out, set())
+    return hashlib.sha256("\x00".join(out).encode()).hexdigest()
+
+
+class FunctionCache:
+    """
+    Incremental TACKY emission and lowering. A function definition whose fingerprint
+    is cached reuses its TACKY and legalized assembly, only the others go through the
+    emitter, asm_generator and asm_allocator. New fragments are written by save.
+    The optimizations are part of the fingerprint, as they change the assembly, and the
+    cached TACKY is already optimized: reused holds the names of the functions taken from
+    the cache, which the optimizer skips.
+    """
+    def __init__(self, store: CompileCache, optimizations = ()):
+        self.store = store
+        self.optimizations = optimizations
+        self.hits = 0
+        self.misses = 0
+        self.reused: set[str] = set()
+        self._fragments: dict[str, tuple[str, FunctionFragment]] = {}
+        self._unsaved: set[str] = set()
+
+    @traced()
+    def emit_program(self, ctx: CompilationContext, program: Program) -> IRProgram:
+        toplevels = []
+        for decl in program.declarations:
+            match decl:
+                case FunDecl(fun_decl) if fun_decl.body is not None:
+                    toplevels.append(self._emit_function(ctx, fun_decl))
+                case _:
+                    if (toplevel := emitter.emit_toplevel(ctx, decl)) is not None:
+                        toplevels.append(toplevel)
+        toplevels.extend(emitter.convert_symbols_to_tacky(ctx))
+        return IRProgram(toplevels)
+
+    def _emit_function(self, ctx: CompilationContext, fun_decl: FunctionDeclaration) -> IRFunctionDefinition:
+        key = function_fingerprint(ctx, fun_decl, self.optimizations)
+        fragment = self.store.get_function(key)
+        if fragment is not None:
+            self.hits += 1
+            self.reused.add(fun_decl.name)
+            ctx.symbol_table.update(fragment.symbols)
+        else:
+            self.misses += 1
+            symbol_count = len(ctx.symbol_table)
+            ir = emitter.emit_function_declaration(ctx, fun_decl)
+            # The emitter only appends to the symbol table, so the new temporaries are at its end.
+            new_symbols = list(islice(reversed(ctx.symbol_table.items()), len(ctx.symbol_table) - symbol_count))
+            fragment = FunctionFragment(ir, dict(reversed(new_symbols)))
+            self._unsaved.add(fun_decl.name)
+        self._fragments[fun_decl.name] = (key, fragment)
+        return fragment.ir
+
+    @traced()
+    def lower_program(self, ctx: CompilationContext, program: IRProgram) -> AsmProgram:
+        asm_allocator.convert_symbol_table(ctx)
+        toplevels = []
+        for toplevel in program.toplevels:
+            if isinstance(toplevel, IRFunctionDefinition):
+                toplevels.append(self._lower_function(ctx, toplevel))
+            else:
+                toplevels.append(asm_generator.lower_toplevel(ctx, toplevel))
+        return AsmProgram(toplevels)
+
+    def _lower_function(self, ctx: CompilationContext, fun_def: IRFunctionDefinition) -> AsmFunctionDef:
+        key, fragment = self._fragments[fun_def.name]
+        if fragment.asm is None:
+            fragment.asm = asm_generator.lower_function_definition(ctx, fun_def)
+            asm_allocator.legalize_function(ctx, fragment.asm)
+            self._unsaved.add(fun_def.name)
+        return fragment.asm
+
+    def save(self) -> None:
+        for name in self._unsaved:
+            self.store.put_function(*self._fragments[name])
+        self._unsaved.clear()
@@ -7,25 +7,25 @@ from .c_ast import Type, Const
 from .semantic_analysis.typechecker import StaticInit
 
 class TackyNode(ABC):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class IRProgram(TackyNode):
     toplevels: List[IRTopLevel]
 
 
 
 class IRTopLevel(TackyNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class IRFunctionDefinition(IRTopLevel):
     name: str
     global_: bool
     params: List[str]
     body: List[IRInstruction]
 
-@dataclass
+@dataclass(slots = True)
 class IRStaticVariable(IRTopLevel):
     name: str
     global_: bool
@@ -35,64 +35,64 @@ class IRStaticVariable(IRTopLevel):
 
 
 class IRInstruction(TackyNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class IRReturn(IRInstruction):
     val: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRSignExtend(IRInstruction):
     src: IRVal
     dst: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRTruncate(IRInstruction):
     src: IRVal
     dst: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRZeroExtend(IRInstruction):
     src: IRVal
     dst: IRVal
     
-@dataclass
+@dataclass(slots = True)
 class IRUnary(IRInstruction):
     unary_operator: IRUnaryOperator
     src: IRVal
     dst: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRBinary(IRInstruction):
     binary_operator: IRBinaryOperator
     src1: IRVal
     src2: IRVal
     dst: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRCopy(IRInstruction):
     src: IRVal
     dst: IRVal
 
-@dataclass
+@dataclass(slots = True)
 class IRJump(IRInstruction):
     target: str
 
-@dataclass
+@dataclass(slots = True)
 class IRJumpIfZero(IRInstruction):
     condition: IRVal
     target: str
 
-@dataclass
+@dataclass(slots = True)
 class IRJumpIfNotZero(IRInstruction):
     condition: IRVal
     target: str
 
-@dataclass
+@dataclass(slots = True)
 class IRLabel(IRInstruction):
     identifier: str
 
-@dataclass
+@dataclass(slots = True)
 class IRFunCall(IRInstruction):
     fun_name: str
     args: List[IRVal]
@@ -101,13 +101,13 @@ class IRFunCall(IRInstruction):
 
 
 class IRVal(TackyNode):
-    pass
+    __slots__ = ()
 
-@dataclass
+@dataclass(slots = True)
 class IRConstant(IRVal):
     const: Const
     
-@dataclass
+@dataclass(slots = True)
 class IRVar(IRVal):
     identifier: str
 
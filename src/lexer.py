@@ -1,6 +1,7 @@
 import re
-from enum import Enum
+from enum import Enum, auto
 from dataclasses import dataclass
+from functools import lru_cache
 
 class TokenType(Enum):
     RETURN                  = r"return\b"
@@ -63,7 +64,10 @@ class TokenType(Enum):
     MISMATCH                = r"\S+"
 
 
-PATTERN = re.compile("|".join(f"(?P<{tt.name}>{tt.value})" for tt in list(TokenType)))
+@lru_cache(maxsize=None)
+def _pattern():
+    """The alternation of every TokenType, compiled on first use as only regex_tokenize needs it."""
+    return re.compile("|".join(f"(?P<{tt.name}>{tt.value})" for tt in list(TokenType)))
 
 @dataclass
 class Token:
@@ -102,24 +106,159 @@ class Token:
             return f"Token of type {self.token_type.name}"
 
 
-def lex(file):
+_KEYWORDS = {
+    tt.value.removesuffix(r"\b"): tt for tt in TokenType if tt.value.removesuffix(r"\b").isalpha()
+}
+_PUNCTUATORS = {
+    "(": TokenType.OPEN_PAREN,
+    ")": TokenType.CLOSE_PAREN,
+    "{": TokenType.OPEN_BRACE,
+    "}": TokenType.CLOSE_BRACE,
+    ";": TokenType.SEMICOLON,
+    "~": TokenType.TILDE,
+    "--": TokenType.DECREMENT,
+    "-": TokenType.HYPHEN,
+    "+": TokenType.PLUS,
+    "*": TokenType.ASTERISK,
+    "/": TokenType.FORWARD_SLASH,
+    "%": TokenType.PERCENT_SIGN,
+    "==": TokenType.TWO_EQUAL_SIGNS,
+    "!=": TokenType.EXCLAM_POINT_EQUAL,
+    "!": TokenType.EXCLAMATION_POINT,
+    "&&": TokenType.TWO_AMPERSANDS,
+    "||": TokenType.TWO_VERT_BARS,
+    "<=": TokenType.LESS_THAN_OR_EQ,
+    "<": TokenType.LESS_THAN,
+    ">=": TokenType.GREATER_THAN_OR_EQ,
+    ">": TokenType.GREATER_THAN,
+    "=": TokenType.EQUAL_SIGN,
+    "?": TokenType.QUESTION_MARK,
+    ":": TokenType.COLON,
+    ",": TokenType.COMMA,
+}
+_NUMBER_SUFFIXES = {
+    None: TokenType.CONSTANT,
+    "l": TokenType.LONG_CONSTANT,
+    "u": TokenType.UNSIGNED_INT_CONSTANT,
+    "ul": TokenType.UNSIGNED_LONG_CONSTANT,
+    "lu": TokenType.UNSIGNED_LONG_CONSTANT,
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_IDENTIFIER_RE = re.compile(r"[a-zA-Z_]\w*")
+_NUMBER_RE = re.compile(r"([0-9]+)([lL]|[uU]|[uU][lL]|[lL][uU])?\b")
+_MISMATCH_RE = re.compile(r"\S+")
+
+class _CharClass(Enum):
+    SPACE   = auto()
+    WORD    = auto()
+    DIGIT   = auto()
+    PUNCT   = auto()
+
+_CHAR_CLASS = {
+    **{chr(c): _CharClass.SPACE for c in range(128) if chr(c).isspace()},
+    **{c: _CharClass.WORD for c in "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_"},
+    **{c: _CharClass.DIGIT for c in "0123456789"},
+    **{p[0]: _CharClass.PUNCT for p in _PUNCTUATORS},
+}
+_FIXED_TOKENS = {lexeme: Token(tt) for lexeme, tt in (_KEYWORDS | _PUNCTUATORS).items()}
+
+
+def _make_token(token_type, value):
+    # Scanner output is well-formed by construction, so skip __post_init__ validation.
+    token = object.__new__(Token)
+    token.token_type = token_type
+    token.value = value
+    return token
+
+def _mismatch(code, pos):
+    return RuntimeError(f"Unexpected token {_MISMATCH_RE.match(code, pos).group()}")
+
+def _scan(code, tokens):
+    """Split source text into tokens with a character-class dispatch scanner.
+
+    Tokens carry no position, so equal lexemes share the Token instance cached in tokens.
+    """
     result = []
+    append = result.append
+    pos, end = 0, len(code)
+    while pos < end:
+        char = code[pos]
+        match _CHAR_CLASS.get(char):
+            case _CharClass.SPACE:
+                pos = _WHITESPACE_RE.match(code, pos).end()
+                continue
+            case _CharClass.WORD:
+                lexeme = _IDENTIFIER_RE.match(code, pos).group()
+                token = tokens.get(lexeme)
+                if token is None:
+                    token = tokens[lexeme] = _make_token(TokenType.IDENTIFIER, lexeme)
+            case _CharClass.DIGIT:
+                mo = _NUMBER_RE.match(code, pos)
+                if mo is None:
+                    raise _mismatch(code, pos)
+                lexeme = mo.group()
+                token = tokens.get(lexeme)
+                if token is None:
+                    digits, suffix = mo.groups()
+                    token_type = _NUMBER_SUFFIXES[suffix and suffix.lower()]
+                    token = tokens[lexeme] = _make_token(token_type, int(digits))
+            case _CharClass.PUNCT:
+                lexeme = code[pos:pos + 2]
+                token = tokens.get(lexeme)
+                if token is None:
+                    lexeme = char
+                    token = tokens.get(lexeme)
+                    if token is None:
+                        raise _mismatch(code, pos)
+            case _ if char.isspace():
+                pos = _WHITESPACE_RE.match(code, pos).end()
+                continue
+            case _:
+                raise _mismatch(code, pos)
+        append(token)
+        pos += len(lexeme)
+    return result
+
+def tokenize(code):
+    return _scan(code, dict(_FIXED_TOKENS))
+
+def stream_tokens(lines):
+    """Lazily lex an iterable of lines, such as an open file or a pipe."""
+    # No token spans a newline, so scanning line by line yields the same stream.
+    tokens = dict(_FIXED_TOKENS)
+    for line in lines:
+        yield from _scan(line, tokens)
+
+def _stream_file_tokens(file):
+    with open(file, "r") as f:
+        yield from stream_tokens(f)
+
+def lex(file, stream = False):
+    """Lex a file into a list of tokens, or lazily into a generator when stream is set."""
+    if stream:
+        return _stream_file_tokens(file)
     with open(file, "r") as f:
-        code = f.read()
-        for mo in re.finditer(PATTERN, code):
-            token = mo.lastgroup
-            match token:
-                case TokenType.MISMATCH.name:
-                    raise RuntimeError(f"Unexpected token {mo.group()}")
-                case TokenType.IDENTIFIER.name | TokenType.CONSTANT.name:
-                    value = mo.group()
-                    result.append(Token(TokenType[token], value))
-                case TokenType.LONG_CONSTANT.name | TokenType.UNSIGNED_INT_CONSTANT.name:
-                    value = mo.group()[:-1]
-                    result.append(Token(TokenType[token], value))
-                case TokenType.UNSIGNED_LONG_CONSTANT.name:
-                    value = mo.group()[:-2]
-                    result.append(Token(TokenType[token], value))
-                case _:
-                    result.append(Token(TokenType[token]))
+        return tokenize(f.read())
+
+
+def regex_tokenize(code):
+    """Reference lexer matching the TokenType alternation one by one, kept for benchmarks."""
+    result = []
+    for mo in _pattern().finditer(code):
+        token = mo.lastgroup
+        match token:
+            case TokenType.MISMATCH.name:
+                raise RuntimeError(f"Unexpected token {mo.group()}")
+            case TokenType.IDENTIFIER.name | TokenType.CONSTANT.name:
+                value = mo.group()
+                result.append(Token(TokenType[token], value))
+            case TokenType.LONG_CONSTANT.name | TokenType.UNSIGNED_INT_CONSTANT.name:
+                value = mo.group()[:-1]
+                result.append(Token(TokenType[token], value))
+            case TokenType.UNSIGNED_LONG_CONSTANT.name:
+                value = mo.group()[:-2]
+                result.append(Token(TokenType[token], value))
+            case _:
+                result.append(Token(TokenType[token]))
     return result
@@ -0,0 +1,530 @@
+"""
+Encodes an AsmProgram straight into a relocatable x86-64 ELF object, so -c does not have
+to print the assembly and run it through as. Instruction selection, branch relaxation,
+symbols, relocations and file layout all follow what GNU as produces for the text that
+code_emitter prints, which lets the output be compared byte for byte.
+"""
+import struct
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+from .assembly_ast import *
+from .c_ast import Int
+from .semantic_analysis.symbol_table import IntInit, LongInit
+from .time_trace import traced, function_definition
+
+R_X86_64_PC32 = 2
+R_X86_64_PLT32 = 4
+
+_REGISTER_NUMBERS = {
+    AsmRegs.AX  : 0,
+    AsmRegs.CX  : 1,
+    AsmRegs.DX  : 2,
+    AsmRegs.SP  : 4,
+    AsmRegs.SI  : 6,
+    AsmRegs.DI  : 7,
+    AsmRegs.R8  : 8,
+    AsmRegs.R9  : 9,
+    AsmRegs.R10 : 10,
+    AsmRegs.R11 : 11,
+}
+_RBP = 5
+
+_COND_CODES = {
+    AsmCondCode.E  : 0x4,
+    AsmCondCode.NE : 0x5,
+    AsmCondCode.L  : 0xc,
+    AsmCondCode.GE : 0xd,
+    AsmCondCode.LE : 0xe,
+    AsmCondCode.G  : 0xf,
+}
+
+# (opcode of the r/m, reg form; of the reg, r/m form; /digit of the immediate forms; accumulator form)
+_ARITHMETIC_OPCODES = {
+    AsmBinaryOperator.Add : (0x01, 0x03, 0, 0x05),
+    AsmBinaryOperator.Sub : (0x29, 0x2b, 5, 0x2d),
+}
+_CMP_OPCODES = (0x39, 0x3b, 7, 0x3d)
+
+_PROLOGUE = bytes([0x55, 0x48, 0x89, 0xe5])             # pushq %rbp; movq %rsp, %rbp
+_EPILOGUE = bytes([0x48, 0x89, 0xec, 0x5d, 0xc3])       # movq %rbp, %rsp; popq %rbp; ret
+
+TEXT, DATA, BSS = ".text", ".data", ".bss"
+
+
+@dataclass(slots = True)
+class _Fixup:
+    """A 32 bit field at offset in an encoded instruction that refers to symbol."""
+    offset: int
+    symbol: str
+    reloc_type: int
+    trailing: int # Bytes of the instruction after the field, which PC-relative addends account for.
+
+@dataclass(slots = True)
+class _Code:
+    code: bytes
+    fixup: Optional[_Fixup] = None
+
+@dataclass(slots = True)
+class _Jump:
+    cond_code: Optional[AsmCondCode]
+    label: str
+    long: bool = False
+
+@dataclass(slots = True)
+class _Label:
+    name: str
+
+@dataclass(slots = True)
+class _Symbol:
+    name: str
+    section: Optional[str] = None # None while undefined.
+    value: int = 0
+    global_: bool = True
+
+
+def _imm8(value: int) -> bool:
+    return -128 <= value <= 127
+
+def _imm32(value: int) -> bytes:
+    return struct.pack("<I", value & 0xffffffff)
+
+def _is_byte_register(number: int) -> bool:
+    """spl, bpl, sil and dil are only reachable with a REX prefix."""
+    return 4 <= number <= 7
+
+def _encode(opcode: bytes, reg: int, rm: AsmOperand, wide: bool = False, imm: bytes = b"", byte: bool = False) -> _Code:
+    """Encodes opcode with a ModR/M byte, where reg is a register number or a /digit."""
+    kind = type(rm)
+    value = rm.reg if kind is AsmReg else rm.int if kind is AsmStack or kind is AsmImm else rm.identifier
+    return _encode_modrm(opcode, reg, kind, value, wide, imm, byte)
+
+# Functions keep reusing the same few registers and stack slots, so most encodings repeat.
+# The returned _Code is shared, which is fine as nothing modifies it.
+@lru_cache(maxsize=4096)
+def _encode_modrm(opcode: bytes, reg: int, kind: type, value, wide: bool, imm: bytes, byte: bool) -> _Code:
+    rex = 0x48 if wide else 0
+    if reg >= 8:
+        rex |= 0x44
+    if byte and _is_byte_register(reg):
+        rex |= 0x40
+    fixup = None
+    if kind is AsmReg:
+        number = _REGISTER_NUMBERS[value]
+        if number >= 8:
+            rex |= 0x41
+        if byte and _is_byte_register(number):
+            rex |= 0x40
+        modrm = bytes([0xc0 | (reg & 7) << 3 | (number & 7)])
+    elif kind is AsmStack and _imm8(value):
+        modrm = bytes([0x40 | (reg & 7) << 3 | _RBP]) + struct.pack("<b", value)
+    elif kind is AsmStack:
+        modrm = bytes([0x80 | (reg & 7) << 3 | _RBP]) + struct.pack("<i", value)
+    elif kind is AsmData:
+        modrm = bytes([(reg & 7) << 3 | _RBP]) + bytes(4)
+        fixup = _Fixup(0, value, R_X86_64_PC32, len(imm))
+    else:
+        raise NotImplementedError(f"Can't encode operand {kind.__name__}({value})")
+    prefix = bytes([rex]) if rex else b""
+    code = prefix + opcode + modrm + imm
+    if fixup is not None:
+        fixup.offset = len(code) - len(imm) - 4
+    return _Code(code, fixup)
+
+def _register(operand: AsmOperand) -> int:
+    if type(operand) is not AsmReg:
+        raise RuntimeError(f"Compiler error, expected a register operand, got {operand}")
+    return _REGISTER_NUMBERS[operand.reg]
+
+def _encode_register_opcode(opcode: int, number: int, wide: bool, imm: bytes = b"") -> _Code:
+    """Encodes an instruction that adds the register number to its opcode, like push or mov $imm."""
+    rex = (0x48 if wide else 0) | (0x41 if number >= 8 else 0)
+    prefix = bytes([rex]) if rex else b""
+    return _Code(prefix + bytes([opcode + (number & 7)]) + imm)
+
+def _encode_mov(t: AssemblyType, src: AsmOperand, dst: AsmOperand) -> _Code:
+    wide = t is AssemblyType.Quadword
+    if type(src) is AsmImm:
+        value = src.int
+        if type(dst) is not AsmReg:
+            return _encode(b"\xc7", 0, dst, wide, _imm32(value))
+        if not wide:
+            return _encode_register_opcode(0xb8, _register(dst), False, _imm32(value))
+        if not Int.MIN_VALUE <= value <= Int.MAX_VALUE:
+            return _encode_register_opcode(0xb8, _register(dst), True, struct.pack("<Q", value & 0xffffffffffffffff))
+        return _encode(b"\xc7", 0, dst, wide, _imm32(value))
+    if type(src) is AsmReg:
+        return _encode(b"\x89", _register(src), dst, wide)
+    return _encode(b"\x8b", _register(dst), src, wide)
+
+def _encode_arithmetic(opcodes: tuple, t: AssemblyType, src: AsmOperand, dst: AsmOperand) -> _Code:
+    """Encodes add, sub and cmp, for which dst is the left operand."""
+    rm_reg, reg_rm, digit, accumulator = opcodes
+    wide = t == AssemblyType.Quadword
+    match src, dst:
+        case AsmImm(value), _ if _imm8(value):
+            return _encode(b"\x83", digit, dst, wide, struct.pack("<b", value))
+        case AsmImm(value), AsmReg(AsmRegs.AX):
+            return _Code((b"\x48" if wide else b"") + bytes([accumulator]) + _imm32(value))
+        case AsmImm(value), _:
+            return _encode(b"\x81", digit, dst, wide, _imm32(value))
+        case AsmReg(), _:
+            return _encode(bytes([rm_reg]), _register(src), dst, wide)
+        case _, AsmReg():
+            return _encode(bytes([reg_rm]), _register(dst), src, wide)
+    raise RuntimeError(f"Compiler error, cannot encode {src}, {dst}")
+
+def _encode_imul(t: AssemblyType, src: AsmOperand, dst: AsmOperand) -> _Code:
+    wide = t == AssemblyType.Quadword
+    match src:
+        case AsmImm(value) if _imm8(value):
+            return _encode(b"\x6b", _register(dst), dst, wide, struct.pack("<b", value))
+        case AsmImm(value):
+            return _encode(b"\x69", _register(dst), dst, wide, _imm32(value))
+        case _:
+            return _encode(b"\x0f\xaf", _register(dst), src, wide)
+
+def _encode_push(operand: AsmOperand) -> _Code:
+    match operand:
+        case AsmReg(r):
+            return _encode_register_opcode(0x50, _REGISTER_NUMBERS[r], False)
+        case AsmImm(value) if _imm8(value):
+            return _Code(b"\x6a" + struct.pack("<b", value))
+        case AsmImm(value):
+            return _Code(b"\x68" + _imm32(value))
+        case _:
+            return _encode(b"\xff", 6, operand)
+
+def encode_instruction(instruction: AsmInstruction):
+    """Returns the _Code, _Jump or _Label for an instruction."""
+    match instruction:
+        case AsmMov(t, src, dst):
+            return _encode_mov(t, src, dst)
+        case AsmMovsx(src, dst):
+            return _encode(b"\x63", _register(dst), src, True)
+        case AsmUnary(AsmUnaryOperator.Neg, t, operand):
+            return _encode(b"\xf7", 3, operand, t == AssemblyType.Quadword)
+        case AsmUnary(AsmUnaryOperator.Not, t, operand):
+            return _encode(b"\xf7", 2, operand, t == AssemblyType.Quadword)
+        case AsmBinary(AsmBinaryOperator.Mult, t, src, dst):
+            return _encode_imul(t, src, dst)
+        case AsmBinary(binop, t, src, dst):
+            return _encode_arithmetic(_ARITHMETIC_OPCODES[binop], t, src, dst)
+        case AsmCmp(t, op1, op2):
+            return _encode_arithmetic(_CMP_OPCODES, t, op1, op2)
+        case AsmIdiv(t, operand):
+            return _encode(b"\xf7", 7, operand, t == AssemblyType.Quadword)
+        case AsmCdq(AssemblyType.Longword):
+            return _Code(b"\x99")
+        case AsmCdq(AssemblyType.Quadword):
+            return _Code(b"\x48\x99")
+        case AsmJmp(label):
+            return _Jump(None, label)
+        case AsmJmpCC(cc, label):
+            return _Jump(cc, label)
+        case AsmSetCC(cc, operand):
+            return _encode(bytes([0x0f, 0x90 | _COND_CODES[cc]]), 0, operand, byte=True)
+        case AsmLabel(label):
+            return _Label(label)
+        case AsmPush(operand):
+            return _encode_push(operand)
+        case AsmCall(func):
+            return _Code(b"\xe8" + bytes(4), _Fixup(1, func, R_X86_64_PLT32, 0))
+        case AsmRet():
+            return _Code(_EPILOGUE)
+        case _:
+            raise NotImplementedError(f"Can't encode {instruction}")
+
+def _jump_size(jump: _Jump) -> int:
+    if not jump.long:
+        return 2
+    return 5 if jump.cond_code is None else 6
+
+def _relax(items: list) -> dict[str, int]:
+    """
+    Picks short or near encodings for the jumps like as does: every jump starts short
+    and is widened while its target is out of reach. Returns the label offsets.
+    """
+    # Runs of code between jumps and labels have a fixed size, so only their length matters.
+    layout = []
+    run = 0
+    for item in items:
+        if type(item) is _Code:
+            run += len(item.code)
+        else:
+            layout.append(run)
+            layout.append(item)
+            run = 0
+
+    while True:
+        labels = {}
+        offset = 0
+        for entry in layout:
+            if type(entry) is int:
+                offset += entry
+            elif type(entry) is _Jump:
+                offset += _jump_size(entry)
+            else:
+                labels[entry.name] = offset
+        changed = False
+        offset = 0
+        for entry in layout:
+            if type(entry) is int:
+                offset += entry
+            elif type(entry) is _Jump:
+                offset += _jump_size(entry)
+                if not entry.long and not -128 <= labels[entry.label] - offset <= 127:
+                    entry.long = True
+                    changed = True
+        if not changed:
+            return labels
+
+
+class _ObjectBuilder:
+    def __init__(self):
+        self.sections = {TEXT: bytearray(), DATA: bytearray(), BSS: 0}
+        self.alignments = {TEXT: 1, DATA: 1, BSS: 1}
+        # Symbols in the order as first sees them, which becomes the symbol table order.
+        self.symbols: dict[str, _Symbol] = {}
+        self.text_items: list = []
+
+    def mention(self, name: str) -> _Symbol:
+        symbol = self.symbols.get(name)
+        if symbol is None:
+            symbol = self.symbols[name] = _Symbol(name)
+        return symbol
+
+    def define(self, name: str, global_: bool, section: str, value: int) -> None:
+        symbol = self.mention(name)
+        symbol.global_ = global_
+        symbol.section = section
+        symbol.value = value
+
+    @traced(function_definition)
+    def add_function(self, func_def: AsmFunctionDef) -> None:
+        self.mention(func_def.name)
+        self.text_items.append(_Label(func_def.name))
+        self.text_items.append(_Code(_PROLOGUE))
+        for instruction in func_def.instructions:
+            item = encode_instruction(instruction)
+            if isinstance(item, _Code) and item.fixup is not None:
+                self.mention(item.fixup.symbol)
+            self.text_items.append(item)
+        self.symbols[func_def.name].global_ = func_def.global_
+
+    def add_static_var(self, static_var: AsmStaticVar) -> None:
+        self.mention(static_var.name)
+        match static_var.init:
+            case IntInit(i):
+                size, contents = 4, struct.pack("<I", i & 0xffffffff)
+            case LongInit(i):
+                size, contents = 8, struct.pack("<Q", i & 0xffffffffffffffff)
+            case _:
+                raise RuntimeError(f"Compiler error, cannot emit code for {static_var.init}")
+        section = DATA if static_var.init.int != 0 else BSS
+        alignment = static_var.alignment
+        self.alignments[section] = max(self.alignments[section], alignment)
+        if section == DATA:
+            data = self.sections[DATA]
+            data.extend(bytes(-len(data) % alignment))
+            self.define(static_var.name, static_var.global_, DATA, len(data))
+            data.extend(contents)
+        else:
+            offset = self.sections[BSS] + (-self.sections[BSS] % alignment)
+            self.define(static_var.name, static_var.global_, BSS, offset)
+            self.sections[BSS] = offset + size
+
+    @traced()
+    def assemble_text(self) -> list[tuple[int, _Fixup]]:
+        """Lays out .text and resolves what as resolves itself. Returns the fixups left for the linker."""
+        labels = _relax(self.text_items)
+        for name, offset in labels.items():
+            if name in self.symbols:
+                self.symbols[name].section = TEXT
+                self.symbols[name].value = offset
+
+        text = self.sections[TEXT]
+        relocations = []
+        for item in self.text_items:
+            match item:
+                case _Code(code, fixup):
+                    start = len(text)
+                    text.extend(code)
+                    if fixup is None:
+                        continue
+                    symbol = self.symbols[fixup.symbol]
+                    if symbol.section == TEXT and not symbol.global_:
+                        # Calls to static functions need no relocation.
+                        end = start + fixup.offset + 4 + fixup.trailing
+                        text[start + fixup.offset:start + fixup.offset + 4] = struct.pack("<i", symbol.value - end)
+                    else:
+                        relocations.append((start + fixup.offset, fixup))
+                case _Jump(cc, label, long):
+                    end = len(text) + _jump_size(item)
+                    displacement = labels[label] - end
+                    if not long:
+                        opcode = bytes([0xeb if cc is None else 0x70 | _COND_CODES[cc]])
+                        text.extend(opcode + struct.pack("<b", displacement))
+                    elif cc is None:
+                        text.extend(b"\xe9" + struct.pack("<i", displacement))
+                    else:
+                        text.extend(bytes([0x0f, 0x80 | _COND_CODES[cc]]) + struct.pack("<i", displacement))
+        return relocations
+
+
+@traced()
+def emit_object(ctx, program: AsmProgram) -> bytes:
+    """Returns the contents of the .o file for program."""
+    builder = _ObjectBuilder()
+    for top_level in program.top_levels:
+        if isinstance(top_level, AsmFunctionDef):
+            builder.add_function(top_level)
+        elif isinstance(top_level, AsmStaticVar):
+            builder.add_static_var(top_level)
+        else:
+            raise NotImplementedError(f"Can't generate code for {top_level}")
+    relocations = builder.assemble_text()
+    return _ElfWriter(builder, relocations).write()
+
+
+# ELF constants
+_SHT_PROGBITS, _SHT_SYMTAB, _SHT_STRTAB, _SHT_RELA, _SHT_NOBITS = 1, 2, 3, 4, 8
+_SHF_WRITE, _SHF_ALLOC, _SHF_EXECINSTR, _SHF_INFO_LINK = 0x1, 0x2, 0x4, 0x40
+_STB_LOCAL, _STB_GLOBAL = 0, 1
+_STT_NOTYPE, _STT_SECTION = 0, 3
+_EHDR_SIZE, _SHDR_SIZE, _SYM_SIZE, _RELA_SIZE = 64, 64, 24, 24
+
+
+def _string_table(strings: list[str]) -> tuple[bytes, dict[str, int]]:
+    """
+    Builds a string table the way BFD does, storing a string that is a suffix of another
+    one inside it. Returns the table and the offset of each string.
+    """
+    unique = list(dict.fromkeys(strings))
+    # Sorted by reversed contents, so each string is followed by the ones that end in it.
+    by_suffix = sorted(unique, key=lambda s: s[::-1])
+    suffix_of: dict[str, str] = {}
+    kept = by_suffix[-1] if by_suffix else None
+    for s in reversed(by_suffix[:-1]):
+        if len(kept) > len(s) and kept.endswith(s):
+            suffix_of[s] = kept
+        else:
+            kept = s
+    offsets = {}
+    table = bytearray(b"\0")
+    for s in unique:
+        if s not in suffix_of:
+            offsets[s] = len(table)
+            table.extend(s.encode() + b"\0")
+    for s, longer in suffix_of.items():
+        offsets[s] = offsets[longer] + len(longer) - len(s)
+    return bytes(table), offsets
+
+
+@dataclass(slots = True)
+class _Section:
+    name: str
+    type: int
+    flags: int = 0
+    contents: bytes = b""
+    size: int = 0
+    alignment: int = 1
+    link: int = 0
+    info: int = 0
+    entry_size: int = 0
+    offset: int = 0
+
+
+class _ElfWriter:
+    def __init__(self, builder: _ObjectBuilder, relocations: list[tuple[int, _Fixup]]):
+        self.builder = builder
+        self.relocations = relocations
+
+    def write(self) -> bytes:
+        builder = self.builder
+        text = _Section(TEXT, _SHT_PROGBITS, _SHF_ALLOC | _SHF_EXECINSTR, bytes(builder.sections[TEXT]),
+                        alignment=builder.alignments[TEXT])
+        data = _Section(DATA, _SHT_PROGBITS, _SHF_WRITE | _SHF_ALLOC, bytes(builder.sections[DATA]),
+                        alignment=builder.alignments[DATA])
+        bss = _Section(BSS, _SHT_NOBITS, _SHF_WRITE | _SHF_ALLOC, size=builder.sections[BSS],
+                       alignment=builder.alignments[BSS])
+        note = _Section(".note.GNU-stack", _SHT_PROGBITS)
+        rela = _Section(".rela.text", _SHT_RELA, _SHF_INFO_LINK, alignment=8, entry_size=_RELA_SIZE)
+        symtab = _Section(".symtab", _SHT_SYMTAB, alignment=8, entry_size=_SYM_SIZE)
+        strtab = _Section(".strtab", _SHT_STRTAB)
+        shstrtab = _Section(".shstrtab", _SHT_STRTAB)
+
+        sections = [text] + ([rela] if self.relocations else []) + [data, bss, note, symtab, strtab, shstrtab]
+        index = {section.name: i + 1 for i, section in enumerate(sections)}
+
+        symtab.contents, strtab.contents, symbol_indices = self._symbol_table(index)
+        symtab.link = index[strtab.name]
+        symtab.info = self._local_count
+        rela.link = index[symtab.name]
+        rela.info = index[TEXT]
+        rela.contents = b"".join(self._relocation_entry(offset, fixup, symbol_indices)
+                                 for offset, fixup in self.relocations)
+
+        names = [symtab.name, strtab.name, shstrtab.name] + [s.name for s in sections[:-3]]
+        shstrtab.contents, name_offsets = _string_table(names)
+
+        # File order as in as: the program sections, the symbol and string tables, then the
+        # relocations, the section names and the section header table.
+        offset = _EHDR_SIZE
+        for section in [text, data, bss, note, symtab, strtab] + ([rela] if self.relocations else []) + [shstrtab]:
+            offset += -offset % section.alignment
+            section.offset = offset
+            if section.type != _SHT_NOBITS:
+                section.size = len(section.contents)
+                offset += section.size
+        section_headers = offset + (-offset % 8)
+
+        out = bytearray(section_headers + _SHDR_SIZE * (len(sections) + 1))
+        out[:_EHDR_SIZE] = struct.pack("<4sBBBBB7xHHIQQQIHHHHHH", b"\x7fELF", 2, 1, 1, 0, 0, 1, 62, 1, 0, 0,
+                                       section_headers, 0, _EHDR_SIZE, 0, 0, _SHDR_SIZE, len(sections) + 1,
+                                       index[shstrtab.name])
+        for section in sections:
+            if section.type != _SHT_NOBITS:
+                out[section.offset:section.offset + section.size] = section.contents
+        header = section_headers + _SHDR_SIZE
+        for section in sections:
+            out[header:header + _SHDR_SIZE] = struct.pack(
+                "<IIQQQQIIQQ", name_offsets[section.name], section.type, section.flags, 0, section.offset,
+                section.size, section.link, section.info, section.alignment, section.entry_size)
+            header += _SHDR_SIZE
+        return bytes(out)
+
+    def _relocation_target(self, fixup: _Fixup) -> tuple[str, int]:
+        """Relocations against local symbols use their section's symbol, as as does."""
+        symbol = self.builder.symbols[fixup.symbol]
+        addend = -4 - fixup.trailing
+        if symbol.section is not None and not symbol.global_:
+            return symbol.section, symbol.value + addend
+        return symbol.name, addend
+
+    def _symbol_table(self, index: dict[str, int]) -> tuple[bytes, bytes, dict[str, int]]:
+        symbols = self.builder.symbols.values()
+        section_symbols = {self._relocation_target(fixup)[0] for _, fixup in self.relocations} & {TEXT, DATA, BSS}
+        ordered = ([section for section in (TEXT, DATA, BSS) if section in section_symbols]
+                   + [symbol for symbol in symbols if not symbol.global_]
+                   + [symbol for symbol in symbols if symbol.global_])
+        self._local_count = 1 + len(ordered) - sum(symbol.global_ for symbol in symbols)
+        strings, string_offsets = _string_table([s.name for s in ordered if isinstance(s, _Symbol)])
+
+        entries = [bytes(_SYM_SIZE)]
+        symbol_indices = {}
+        for i, entry in enumerate(ordered, start=1):
+            if isinstance(entry, str):
+                symbol_indices[entry] = i
+                entries.append(struct.pack("<IBBHQQ", 0, _STB_LOCAL << 4 | _STT_SECTION, 0, index[entry], 0, 0))
+                continue
+            symbol_indices[entry.name] = i
+            binding = _STB_GLOBAL if entry.global_ else _STB_LOCAL
+            section_index = index[entry.section] if entry.section is not None else 0
+            entries.append(struct.pack("<IBBHQQ", string_offsets[entry.name], binding << 4 | _STT_NOTYPE, 0,
+                                       section_index, entry.value, 0))
+        return b"".join(entries), strings, symbol_indices
+
+    def _relocation_entry(self, offset: int, fixup: _Fixup, symbol_indices: dict[str, int]) -> bytes:
+        target, addend = self._relocation_target(fixup)
+        return struct.pack("<QQq", offset, symbol_indices[target] << 32 | fixup.reloc_type, addend)
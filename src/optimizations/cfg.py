@@ -0,0 +1,101 @@
+"""
+Control-flow graphs of TACKY function bodies. A basic block is a run of instructions that
+is only entered at its first and only left after its last: a label starts a new block, a
+jump or return ends one. The graph keeps the blocks in their original order, so converting
+it back to a list is a concatenation and falling through stays falling through.
+"""
+from dataclasses import dataclass, field
+from ..ir_ast import *
+
+# Pseudo blocks the function is entered from and returns to.
+ENTRY = -1
+EXIT = -2
+
+@dataclass(slots = True)
+class BasicBlock:
+    instructions: List[IRInstruction]
+    predecessors: set[int] = field(default_factory=set)
+    successors: set[int] = field(default_factory=set)
+
+@dataclass(slots = True)
+class ControlFlowGraph:
+    # Block ids in program order, which stay the same as blocks are removed.
+    blocks: dict[int, BasicBlock]
+    entry_successors: set[int] = field(default_factory=set)
+    exit_predecessors: set[int] = field(default_factory=set)
+
+    def successors(self, block_id: int) -> set[int]:
+        return self.entry_successors if block_id == ENTRY else self.blocks[block_id].successors
+
+    def predecessors(self, block_id: int) -> set[int]:
+        return self.exit_predecessors if block_id == EXIT else self.blocks[block_id].predecessors
+
+    def add_edge(self, source: int, target: int) -> None:
+        self.successors(source).add(target)
+        self.predecessors(target).add(source)
+
+    def remove_edge(self, source: int, target: int) -> None:
+        self.successors(source).discard(target)
+        self.predecessors(target).discard(source)
+
+    def remove_block(self, block_id: int) -> None:
+        block = self.blocks.pop(block_id)
+        for predecessor in block.predecessors:
+            self.successors(predecessor).discard(block_id)
+        for successor in block.successors:
+            self.predecessors(successor).discard(block_id)
+
+    def instructions(self) -> List[IRInstruction]:
+        """The function body the graph describes."""
+        return [instruction for block in self.blocks.values() for instruction in block.instructions]
+
+
+def _partition(instructions: List[IRInstruction]) -> List[List[IRInstruction]]:
+    blocks = []
+    current = []
+    for instruction in instructions:
+        match instruction:
+            case IRLabel():
+                if current:
+                    blocks.append(current)
+                current = [instruction]
+            case IRJump() | IRJumpIfZero() | IRJumpIfNotZero() | IRReturn():
+                current.append(instruction)
+                blocks.append(current)
+                current = []
+            case _:
+                current.append(instruction)
+    if current:
+        blocks.append(current)
+    return blocks
+
+def build_cfg(instructions: List[IRInstruction]) -> ControlFlowGraph:
+    cfg = ControlFlowGraph({block_id: BasicBlock(block) for block_id, block in enumerate(_partition(instructions))})
+    labels = {block.instructions[0].identifier: block_id
+              for block_id, block in cfg.blocks.items() if isinstance(block.instructions[0], IRLabel)}
+    cfg.add_edge(ENTRY, 0 if cfg.blocks else EXIT)
+    for block_id, block in cfg.blocks.items():
+        next_id = block_id + 1 if block_id + 1 in cfg.blocks else EXIT
+        match block.instructions[-1]:
+            case IRReturn():
+                cfg.add_edge(block_id, EXIT)
+            case IRJump(target):
+                cfg.add_edge(block_id, labels[target])
+            case IRJumpIfZero(_, target) | IRJumpIfNotZero(_, target):
+                cfg.add_edge(block_id, labels[target])
+                cfg.add_edge(block_id, next_id)
+            case _:
+                cfg.add_edge(block_id, next_id)
+    return cfg
+
+def reachable_blocks(cfg: ControlFlowGraph) -> set[int]:
+    """Ids of the blocks some path from the entry reaches."""
+    reached = set()
+    stack = list(cfg.entry_successors)
+    while stack:
+        block_id = stack.pop()
+        if block_id == EXIT or block_id in reached:
+            continue
+        reached.add(block_id)
+        stack.extend(cfg.blocks[block_id].successors)
+    return reached
@@ -0,0 +1,104 @@
+from ..ir_ast import *
+from ..c_ast import ConstInt, ConstLong, ConstUInt, ConstULong, Int, Long, UInt, ULong
+from ..compilation_context import CompilationContext
+
+CONST_TYPES = {
+    ConstInt    : Int,
+    ConstLong   : Long,
+    ConstUInt   : UInt,
+    ConstULong  : ULong,
+}
+_TYPE_CONSTS = {type_: const for const, type_ in CONST_TYPES.items()}
+
+_RELATIONAL_OPERATORS = {
+    IRBinaryOperator.Equal          : lambda a, b: a == b,
+    IRBinaryOperator.NotEqual       : lambda a, b: a != b,
+    IRBinaryOperator.LessThan       : lambda a, b: a < b,
+    IRBinaryOperator.LessOrEqual    : lambda a, b: a <= b,
+    IRBinaryOperator.GreaterThan    : lambda a, b: a > b,
+    IRBinaryOperator.GreaterOrEqual : lambda a, b: a >= b,
+}
+
+def make_constant(value: int, type_) -> IRConstant:
+    """The constant of type_ that value converts to, wrapping around like a C conversion."""
+    value %= type_.RANGE
+    if type_.is_signed() and value > type_.MAX_VALUE:
+        value -= type_.RANGE
+    return IRConstant(_TYPE_CONSTS[type_](value))
+
+def _divide(a: int, b: int) -> int:
+    """C division, which truncates toward zero."""
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def _traps(type_, a: int, b: int) -> bool:
+    """Whether a / b or a % b raises a divide error at run time, which folding must not remove."""
+    return b == 0 or (type_.is_signed() and a == type_.MIN_VALUE and b == -1)
+
+def _fold_unary(operator: IRUnaryOperator, a: int) -> int:
+    match operator:
+        case IRUnaryOperator.Negate:
+            return -a
+        case IRUnaryOperator.Complement:
+            return ~a
+        case IRUnaryOperator.Not:
+            return int(a == 0)
+        case _:
+            raise RuntimeError(f"Compiler error, cannot fold unary {operator}")
+
+def _fold_binary(operator: IRBinaryOperator, type_, a: int, b: int) -> int | None:
+    """The value of a operator b on operands of type_, or None if it has to be computed at run time."""
+    match operator:
+        case IRBinaryOperator.Add:
+            return a + b
+        case IRBinaryOperator.Subtract:
+            return a - b
+        case IRBinaryOperator.Multiply:
+            return a * b
+        case IRBinaryOperator.Divide if not _traps(type_, a, b):
+            return _divide(a, b)
+        case IRBinaryOperator.Remainder if not _traps(type_, a, b):
+            return a - b * _divide(a, b)
+        case IRBinaryOperator.Divide | IRBinaryOperator.Remainder:
+            return None
+        case relational if relational.is_relational:
+            return int(_RELATIONAL_OPERATORS[relational](a, b))
+        case _:
+            raise RuntimeError(f"Compiler error, cannot fold binary {operator}")
+
+def _fold(ctx: CompilationContext, instruction: IRInstruction) -> IRInstruction | None:
+    """What instruction folds to: itself if it cannot be folded, or None if it is removed."""
+    match instruction:
+        case IRUnary(operator, IRConstant(a), dst):
+            value = _fold_unary(operator, a.int)
+            return IRCopy(make_constant(value, ctx.symbol_table[dst.identifier].type), dst)
+        case IRBinary(operator, IRConstant(a), IRConstant(b), dst):
+            value = _fold_binary(operator, CONST_TYPES[type(a)], a.int, b.int)
+            if value is None:
+                return instruction
+            return IRCopy(make_constant(value, ctx.symbol_table[dst.identifier].type), dst)
+        case IRSignExtend(IRConstant(a), dst) | IRZeroExtend(IRConstant(a), dst) | IRTruncate(IRConstant(a), dst):
+            # The constant's value is already that of its own type, signed or not, so every
+            # conversion is a wrap into the destination's type.
+            return IRCopy(make_constant(a.int, ctx.symbol_table[dst.identifier].type), dst)
+        case IRCopy(IRConstant(a), dst) if CONST_TYPES[type(a)] is not ctx.symbol_table[dst.identifier].type:
+            return IRCopy(make_constant(a.int, ctx.symbol_table[dst.identifier].type), dst)
+        case IRJumpIfZero(IRConstant(a), target):
+            return IRJump(target) if a.int == 0 else None
+        case IRJumpIfNotZero(IRConstant(a), target):
+            return IRJump(target) if a.int != 0 else None
+        case _:
+            return instruction
+
+def fold_constants(ctx: CompilationContext, function: IRFunctionDefinition) -> int:
+    """Evaluates the instructions of function whose operands are all constants. Returns how many changed."""
+    body = []
+    changes = 0
+    for instruction in function.body:
+        folded = _fold(ctx, instruction)
+        if folded is not instruction:
+            changes += 1
+        if folded is not None:
+            body.append(folded)
+    function.body = body
+    return changes
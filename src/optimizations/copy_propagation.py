@@ -0,0 +1,163 @@
+"""
+Copy propagation driven by a reaching copies analysis. A copy dst = src reaches a point if
+every path from the entry to it passes the copy and then neither dst nor src is written;
+there, dst can be replaced by src. A call may write any variable with static storage, so
+it ends every copy to or from one.
+"""
+from collections import deque
+from ..ir_ast import *
+from ..compilation_context import CompilationContext
+from ..semantic_analysis.symbol_table import StaticAttr
+from .cfg import ControlFlowGraph, ENTRY, EXIT, build_cfg
+from .constant_folding import CONST_TYPES
+
+# A copy is identified by (dst, src key): the destination's name and _key(src).
+
+def _key(val: IRVal):
+    match val:
+        case IRVar(identifier):
+            return identifier
+        case IRConstant(const):
+            return (type(const), const.int)
+
+def _type(ctx: CompilationContext, val: IRVal):
+    match val:
+        case IRVar(identifier):
+            return ctx.symbol_table[identifier].type
+        case IRConstant(const):
+            return CONST_TYPES[type(const)]
+
+def _destination(instruction: IRInstruction) -> str | None:
+    match instruction:
+        case IRUnary(dst = IRVar(identifier)) | IRBinary(dst = IRVar(identifier)) | IRCopy(dst = IRVar(identifier)) \
+                | IRSignExtend(dst = IRVar(identifier)) | IRTruncate(dst = IRVar(identifier)) \
+                | IRZeroExtend(dst = IRVar(identifier)) | IRFunCall(dst = IRVar(identifier)):
+            return identifier
+        case _:
+            return None
+
+class _ReachingCopies:
+    def __init__(self, ctx: CompilationContext, cfg: ControlFlowGraph):
+        self.cfg = cfg
+        # Copies that change the type of their value, such as int to unsigned int, are
+        # conversions and never propagated.
+        self.sources = {}
+        for block in cfg.blocks.values():
+            for instruction in block.instructions:
+                match instruction:
+                    case IRCopy(src, IRVar(dst)) if _key(src) != dst and _type(ctx, src) is _type(ctx, instruction.dst):
+                        self.sources[(dst, _key(src))] = src
+        self.copies_to: dict[str, set] = {}
+        self.mentioning: dict[str, set] = {}
+        for copy in self.sources:
+            dst, src = copy
+            self.copies_to.setdefault(dst, set()).add(copy)
+            self.mentioning.setdefault(dst, set()).add(copy)
+            if isinstance(src, str):
+                self.mentioning.setdefault(src, set()).add(copy)
+        self.static = {copy for copy in self.sources
+                       if any(isinstance(getattr(ctx.symbol_table.get(name), "attrs", None), StaticAttr)
+                              for name in copy if isinstance(name, str))}
+        self.block_in = self._solve()
+
+    def source(self, name: str, reaching: set) -> IRVal | None:
+        """What the variable name is a copy of where the copies in reaching reach, if anything."""
+        for copy in self.copies_to.get(name, ()):
+            if copy in reaching:
+                return self.sources[copy]
+        return None
+
+    def transfer(self, instruction: IRInstruction, reaching: set) -> None:
+        """Updates the copies reaching instruction to those reaching the next one."""
+        if isinstance(instruction, IRFunCall):
+            reaching -= self.static
+        dst = _destination(instruction)
+        if dst is None:
+            return
+        copy = (dst, _key(instruction.src)) if isinstance(instruction, IRCopy) else None
+        if copy is not None and (copy[1] == dst or copy in reaching or (copy[1], dst) in reaching):
+            # Writes the value dst already has.
+            return
+        reaching -= self.mentioning.get(dst, set())
+        if copy in self.sources:
+            reaching.add(copy)
+
+    def _solve(self) -> dict[int, set]:
+        universe = set(self.sources)
+        block_out = {block_id: universe for block_id in self.cfg.blocks}
+        block_in = {}
+        worklist = deque(self.cfg.blocks)
+        pending = set(worklist)
+        while worklist:
+            block_id = worklist.popleft()
+            pending.discard(block_id)
+            predecessors = self.cfg.blocks[block_id].predecessors
+            reaching = set() if ENTRY in predecessors else set.intersection(
+                universe, *(block_out[predecessor] for predecessor in predecessors))
+            block_in[block_id] = set(reaching)
+            for instruction in self.cfg.blocks[block_id].instructions:
+                self.transfer(instruction, reaching)
+            if reaching != block_out[block_id]:
+                block_out[block_id] = reaching
+                for successor in self.cfg.blocks[block_id].successors:
+                    if successor != EXIT and successor not in pending:
+                        worklist.append(successor)
+                        pending.add(successor)
+        return block_in
+
+def _rewrite(instruction: IRInstruction, replace) -> int:
+    """Replaces the operands instruction reads with their copies' sources. Returns how many changed."""
+    match instruction:
+        case IRUnary() | IRCopy() | IRSignExtend() | IRTruncate() | IRZeroExtend():
+            operands = ("src",)
+        case IRBinary():
+            operands = ("src1", "src2")
+        case IRReturn():
+            operands = ("val",)
+        case IRJumpIfZero() | IRJumpIfNotZero():
+            operands = ("condition",)
+        case IRFunCall():
+            args = [replace(arg) for arg in instruction.args]
+            changes = sum(new is not old for new, old in zip(args, instruction.args))
+            instruction.args = args
+            return changes
+        case _:
+            return 0
+    changes = 0
+    for operand in operands:
+        old = getattr(instruction, operand)
+        new = replace(old)
+        if new is not old:
+            setattr(instruction, operand, new)
+            changes += 1
+    return changes
+
+def propagate_copies(ctx: CompilationContext, function: IRFunctionDefinition) -> int:
+    """
+    Replaces the variables function reads with the sources of the copies reaching them, and
+    removes copies of a value the destination already holds. Returns how many changed.
+    """
+    cfg = build_cfg(function.body)
+    analysis = _ReachingCopies(ctx, cfg)
+    changes = 0
+    for block_id, block in cfg.blocks.items():
+        reaching = analysis.block_in[block_id]
+
+        def replace(val):
+            if isinstance(val, IRVar):
+                return analysis.source(val.identifier, reaching) or val
+            return val
+
+        instructions = []
+        for instruction in block.instructions:
+            match instruction:
+                case IRCopy(src, IRVar(dst)) if (dst, _key(src)) in reaching or (_key(src), dst) in reaching \
+                        or _key(src) == dst:
+                    changes += 1
+                case _:
+                    changes += _rewrite(instruction, replace)
+                    instructions.append(instruction)
+            analysis.transfer(instruction, reaching)
+        block.instructions = instructions
+    function.body = cfg.instructions()
+    return changes
@@ -0,0 +1,97 @@
+"""
+Dead store elimination driven by a liveness analysis. A variable is live at a point if some
+path from there reads it before writing it; an instruction whose only effect is to write a
+variable that is dead right after it can go. Calls are always kept for their side effects,
+and so are writes to variables with static storage, which other functions may read. Like
+constant folding, the pass keeps divisions that may trap: a division by zero or of the
+smallest value by -1 is undefined behaviour that could be removed, but should still fail.
+"""
+from collections import deque
+from ..ir_ast import *
+from ..compilation_context import CompilationContext
+from ..semantic_analysis.symbol_table import StaticAttr
+from .cfg import ControlFlowGraph, EXIT, build_cfg
+
+def _reads(instruction: IRInstruction) -> List[IRVal]:
+    match instruction:
+        case IRUnary(src = src) | IRCopy(src = src) | IRSignExtend(src = src) | IRTruncate(src = src) \
+                | IRZeroExtend(src = src):
+            return [src]
+        case IRBinary(_, src1, src2):
+            return [src1, src2]
+        case IRReturn(val):
+            return [val]
+        case IRJumpIfZero(condition) | IRJumpIfNotZero(condition):
+            return [condition]
+        case IRFunCall(args = args):
+            return args
+        case _:
+            return []
+
+def _removable_destination(instruction: IRInstruction) -> str | None:
+    """The variable instruction writes, if writing it is all the instruction does."""
+    match instruction:
+        case IRUnary(dst = IRVar(identifier)) | IRBinary(dst = IRVar(identifier)) | IRCopy(dst = IRVar(identifier)) \
+                | IRSignExtend(dst = IRVar(identifier)) | IRTruncate(dst = IRVar(identifier)) \
+                | IRZeroExtend(dst = IRVar(identifier)):
+            return identifier
+        case _:
+            return None
+
+def _may_trap(instruction: IRInstruction) -> bool:
+    match instruction:
+        case IRBinary(IRBinaryOperator.Divide | IRBinaryOperator.Remainder, _, divisor):
+            return not (isinstance(divisor, IRConstant) and divisor.const.int not in (0, -1))
+        case _:
+            return False
+
+def _transfer(instruction: IRInstruction, live: set[str]) -> None:
+    """Updates the variables live after instruction to those live before it."""
+    match instruction:
+        case IRFunCall(dst = IRVar(identifier)):
+            live.discard(identifier)
+        case _:
+            if (dst := _removable_destination(instruction)) is not None:
+                live.discard(dst)
+    live.update(val.identifier for val in _reads(instruction) if isinstance(val, IRVar))
+
+def _live_out(cfg: ControlFlowGraph) -> dict[int, set[str]]:
+    """The variables live at the end of each block, solved backwards from the exit."""
+    block_in = {block_id: set() for block_id in cfg.blocks}
+    block_out = {}
+    worklist = deque(reversed(cfg.blocks))
+    pending = set(worklist)
+    while worklist:
+        block_id = worklist.popleft()
+        pending.discard(block_id)
+        block = cfg.blocks[block_id]
+        live = set().union(*(block_in[successor] for successor in block.successors if successor != EXIT))
+        block_out[block_id] = set(live)
+        for instruction in reversed(block.instructions):
+            _transfer(instruction, live)
+        if live != block_in[block_id]:
+            block_in[block_id] = live
+            for predecessor in block.predecessors:
+                if predecessor in cfg.blocks and predecessor not in pending:
+                    worklist.append(predecessor)
+                    pending.add(predecessor)
+    return block_out
+
+def eliminate_dead_stores(ctx: CompilationContext, function: IRFunctionDefinition) -> int:
+    """Removes the instructions of function that only write a dead variable. Returns how many were removed."""
+    cfg = build_cfg(function.body)
+    removed = 0
+    for block_id, live in _live_out(cfg).items():
+        block = cfg.blocks[block_id]
+        instructions = []
+        for instruction in reversed(block.instructions):
+            dst = _removable_destination(instruction)
+            if dst is not None and dst not in live and not isinstance(ctx.symbol_table[dst].attrs, StaticAttr) \
+                    and not _may_trap(instruction):
+                removed += 1
+                continue
+            _transfer(instruction, live)
+            instructions.append(instruction)
+        block.instructions = instructions[::-1]
+    function.body = cfg.instructions()
+    return removed
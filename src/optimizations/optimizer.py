@@ -0,0 +1,72 @@
+import sys
+import time
+from collections import Counter
+from ..ir_ast import IRProgram, IRFunctionDefinition
+from ..utils import log
+from ..time_trace import traced
+from ..compilation_context import CompilationContext
+from .constant_folding import fold_constants
+from .unreachable_code import eliminate_unreachable_code
+from .copy_propagation import propagate_copies
+from .dead_store_elimination import eliminate_dead_stores
+
+# Every TACKY pass by the name of the CompileOptions field that enables it, in the order they
+# run. A pass takes the context and a function definition, rewrites the function's body and
+# returns how many changes it made.
+PASSES = {
+    "fold_constants": fold_constants,
+    "eliminate_unreachable_code": eliminate_unreachable_code,
+    "propagate_copies": propagate_copies,
+    "eliminate_dead_stores": eliminate_dead_stores,
+}
+
+class Optimizer:
+    """
+    Runs the enabled passes over each function, again and again while they change it: each
+    pass creates work for the others, folding constants that copies propagated into it or
+    leaving stores dead. A function stops early once it used max_iterations rounds or
+    time_budget seconds, so huge functions cannot stall a build; it is then only less optimized.
+    """
+    def __init__(self, optimizations, max_iterations, time_budget):
+        self.passes = [(name, optimization) for name, optimization in PASSES.items() if name in optimizations]
+        self.max_iterations = max_iterations
+        self.time_budget = time_budget
+        self.changes = Counter()
+        self.functions = 0
+        self.iterations = 0
+        self.exhausted: list[tuple[str, str]] = []
+
+    @log("Optimizing TACKY:")
+    @traced()
+    def optimize_program(self, ctx: CompilationContext, program: IRProgram, optimized = ()) -> IRProgram:
+        """Optimizes the function definitions of program in place, except those named in optimized."""
+        for toplevel in program.toplevels:
+            if isinstance(toplevel, IRFunctionDefinition) and toplevel.name not in optimized:
+                self.optimize_function(ctx, toplevel)
+        return program
+
+    @traced(lambda self, ctx, function: function.name)
+    def optimize_function(self, ctx: CompilationContext, function: IRFunctionDefinition) -> None:
+        self.functions += 1
+        deadline = time.perf_counter() + self.time_budget
+        for _ in range(self.max_iterations):
+            self.iterations += 1
+            changed = False
+            for name, optimization in self.passes:
+                changes = optimization(ctx, function)
+                self.changes[name] += changes
+                changed = changed or changes > 0
+            if not changed:
+                return
+            if time.perf_counter() > deadline:
+                self.exhausted.append((function.name, "time"))
+                return
+        self.exhausted.append((function.name, "iterations"))
+
+    def report(self, label) -> None:
+        """Prints the changes each pass made, and the functions whose budget ran out."""
+        print(f"Optimized {self.functions} functions of {label} in {self.iterations} iterations:", file=sys.stderr)
+        for name, _ in self.passes:
+            print(f"  {name:<28}{self.changes[name]:8} changes", file=sys.stderr)
+        for function, budget in self.exhausted:
+            print(f"  stopped optimizing {function}: out of {budget}", file=sys.stderr)
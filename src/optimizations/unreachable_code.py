@@ -0,0 +1,40 @@
+from ..ir_ast import *
+from ..compilation_context import CompilationContext
+from .cfg import ControlFlowGraph, ENTRY, EXIT, build_cfg, reachable_blocks
+
+def _remove_unreachable_blocks(cfg: ControlFlowGraph) -> None:
+    reached = reachable_blocks(cfg)
+    for block_id in [block_id for block_id in cfg.blocks if block_id not in reached]:
+        cfg.remove_block(block_id)
+
+def _remove_redundant_jumps(cfg: ControlFlowGraph) -> None:
+    """Removes jumps whose every target is the block that follows anyway."""
+    block_ids = list(cfg.blocks)
+    for block_id, next_id in zip(block_ids, block_ids[1:] + [EXIT]):
+        block = cfg.blocks[block_id]
+        match block.instructions[-1]:
+            case IRJump() | IRJumpIfZero() | IRJumpIfNotZero() if block.successors == {next_id}:
+                # Conditions are values, so evaluating one has no effect that could be lost.
+                block.instructions.pop()
+
+def _remove_unused_labels(cfg: ControlFlowGraph) -> None:
+    """Removes labels only reached by falling through from the previous block."""
+    block_ids = list(cfg.blocks)
+    for previous_id, block_id in zip([ENTRY] + block_ids, block_ids):
+        block = cfg.blocks[block_id]
+        if block.instructions and isinstance(block.instructions[0], IRLabel) and block.predecessors <= {previous_id}:
+            block.instructions.pop(0)
+
+def eliminate_unreachable_code(ctx: CompilationContext, function: IRFunctionDefinition) -> int:
+    """
+    Removes the blocks of function no path from its entry reaches, jumps to the next block
+    and labels nothing jumps to. Returns how many instructions were removed.
+    """
+    cfg = build_cfg(function.body)
+    _remove_unreachable_blocks(cfg)
+    _remove_redundant_jumps(cfg)
+    _remove_unused_labels(cfg)
+    body = cfg.instructions()
+    removed = len(function.body) - len(body)
+    function.body = body
+    return removed
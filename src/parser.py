@@ -1,12 +1,15 @@
 from .lexer import TokenType, Token
 from dataclasses import dataclass
-from typing import List, Iterable
+from typing import List, Iterable, Iterator
 from .c_ast import *
 from collections import deque
+from .time_trace import traced
+
+LOOKAHEAD = 3
 
 @dataclass
 class Parser:
-    tokens: deque[Token]
+    tokens: Iterable[Token]
     type_specifiers = [TokenType.INT, TokenType.LONG, TokenType.SIGNED, TokenType.UNSIGNED]
     specifiers = type_specifiers + [TokenType.EXTERN, TokenType.STATIC]
     PRECEDENCE = {
@@ -48,9 +51,15 @@ class Parser:
     }
 
 
+    def __post_init__(self):
+        # Tokens are pulled from the iterator on demand, only peek() lookahead is buffered.
+        self.tokens: Iterator[Token] = iter(self.tokens)
+        self.lookahead: deque[Token] = deque()
+
+    @traced()
     def parse_program(self) -> Program:
         declarations = []
-        while len(self.tokens) != 0:
+        while not self.at_end():
             declarations.append(self.parse_declaration())
         return Program(declarations)
 
@@ -357,19 +366,34 @@ class Parser:
     def next_token_is(self, kind) -> bool:
         return self.peek().token_type == kind
     
+    def fill(self, n) -> bool:
+        if n > LOOKAHEAD:
+            raise RuntimeError(f"Compiler error, cannot look {n} tokens ahead")
+        while len(self.lookahead) < n:
+            token = next(self.tokens, None)
+            if token is None:
+                return False
+            self.lookahead.append(token)
+        return True
+
+    def at_end(self) -> bool:
+        return not self.fill(1)
+
     def peek(self, n = 0) -> Token:
-        if len(self.tokens) > n:
-            return self.tokens[n]
+        if self.fill(n + 1):
+            return self.lookahead[n]
         raise RuntimeError("No more tokens")
     
     def advance(self) -> Token:
-        return self.tokens.popleft()
+        if self.fill(1):
+            return self.lookahead.popleft()
+        raise RuntimeError("No more tokens")
         
     def expect(self, expected) -> Token:
         if not isinstance(expected, Iterable):
             expected = [expected]
         token = self.peek()
         if token.token_type not in expected:
-            raise RuntimeError(f"Expected '{expected}' but found '{token.token_type}' with {len(self.tokens)} tokens left")
+            raise RuntimeError(f"Expected '{expected}' but found '{token.token_type}'")
         token = self.advance()
         return token
@@ -0,0 +1,434 @@
+"""
+Built-in preprocessor for the C subset this compiler accepts: comments, line splicing,
+object-like and function-like macros, #include and conditional inclusion.
+
+Anything outside that subset raises PreprocessorFallback so the caller can run gcc -E
+instead. That includes every error, so diagnostics always come from gcc.
+"""
+from __future__ import annotations
+import os
+import re
+from dataclasses import dataclass
+from .time_trace import traced
+
+MAX_INCLUDE_DEPTH = 200
+
+# Predefined by gcc, so leaving them alone would change the meaning of a program.
+# Reserved names starting with a double underscore are treated the same way.
+_GCC_PREDEFINED = frozenset({"linux", "unix"})
+
+_PHASE3_RE = re.compile(r"""
+    //[^\n]*
+  | /\*.*?\*/
+  | (?P<unterminated>/\*)
+  | "(?:\\.|[^"\\\n])*"
+  | '(?:\\.|[^'\\\n])*'
+""", re.S | re.X)
+
+_PP_TOKEN_RE = re.compile(r"""
+    [A-Za-z_]\w*
+  | \.?[0-9](?:[eEpP][+-]|[\w.])*
+  | \.\.\.|<<=|>>=|->|\+\+|--|<<|>>|<=|>=|==|!=|&&|\|\||[*/%+\-&^|]=|\#\#|[][(){}.&*+\-~!/%<>^|?:;=,\#]
+""", re.X)
+# Everything _PP_TOKEN_RE neither matches nor may skip as whitespace: literals, stray and non-ASCII characters.
+_UNSUPPORTED_RE = re.compile(r"""[^A-Za-z0-9_ \t\f\v\r\][(){}.&*+\-~!/%<>^|?:;=,#]""")
+
+_DIRECTIVE_RE = re.compile(r"\s*#\s*(\w*)(.*)")
+_DEFINE_RE = re.compile(r"\s*([A-Za-z_]\w*)(\(([^)]*)\))?(.*)")
+_INCLUDE_RE = re.compile(r"""\s*(?:"([^"\n]*)"|<([^>\n]*)>)\s*$""")
+
+_NO_HIDESET = frozenset()
+
+
+class PreprocessorFallback(Exception):
+    """Raised on input the built-in preprocessor does not handle."""
+
+
+@dataclass(slots = True)
+class Macro:
+    params: list[str] | None # None for object-like macros.
+    body: list[str]
+
+def _tokenize(text: str) -> list[str]:
+    if (mo := _UNSUPPORTED_RE.search(text)) is not None:
+        raise PreprocessorFallback(f"Unsupported character {mo.group()!r}")
+    return _PP_TOKEN_RE.findall(text)
+
+def _text(token) -> str:
+    return token if type(token) is str else token[0]
+
+def _strip_comments(text: str) -> str:
+    def replace(mo):
+        if mo.group("unterminated"):
+            raise PreprocessorFallback("Unterminated comment")
+        token = mo.group()
+        return " " if token[0] == "/" else token
+    return _PHASE3_RE.sub(replace, text)
+
+
+class Preprocessor:
+    def __init__(self, include_dirs = ()):
+        self.include_dirs = list(include_dirs)
+        self.macros: dict[str, Macro] = {}
+        self.output: list[str] = []
+        self._depth = 0
+
+    def run(self, file: str) -> list[str]:
+        """Returns the preprocessed lines of file."""
+        self._process_file(file)
+        return self.output
+
+    def _process_file(self, file: str) -> None:
+        self._depth += 1
+        if self._depth > MAX_INCLUDE_DEPTH:
+            raise PreprocessorFallback("Include nesting too deep")
+        with open(file) as f:
+            text = f.read()
+        text = _strip_comments(text.replace("\\\n", ""))
+
+        # Each entry is [active, branch_taken, seen_else] for an open conditional.
+        conditionals = []
+        active = True
+        chunk = []
+        lines = text.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        for line in lines:
+            directive = _DIRECTIVE_RE.match(line) if line.lstrip().startswith("#") else None
+            if directive is None:
+                if active:
+                    chunk.extend(_tokenize(line))
+                    chunk.append("\n")
+                continue
+
+            # Function-like macro arguments may span lines, so text is expanded in chunks between directives.
+            # The chunk keeps "\n" tokens at the line ends, so each source line is still an output line.
+            self._flush(chunk)
+            chunk = []
+            name, rest = directive.groups()
+            if name in ("if", "ifdef", "ifndef", "elif", "else", "endif"):
+                active = self._conditional(name, rest, conditionals, active)
+            elif not active:
+                continue
+            elif name == "define":
+                self._define(rest)
+            elif name == "undef":
+                self.macros.pop(self._single_identifier(rest), None)
+            elif name == "include":
+                self._process_file(self._find_include(rest, file))
+            elif name or rest.strip():
+                raise PreprocessorFallback(f"Unsupported directive #{name}")
+        self._flush(chunk)
+
+        if conditionals:
+            raise PreprocessorFallback("Unterminated conditional")
+        self._depth -= 1
+
+    def _flush(self, chunk: list[str]) -> None:
+        if chunk:
+            line = []
+            for token in self._expand(chunk):
+                if token == "\n":
+                    self.output.append(" ".join(line) + "\n")
+                    line = []
+                else:
+                    line.append(token if type(token) is str else token[0])
+
+    def _conditional(self, name: str, rest: str, conditionals: list, active: bool) -> bool:
+        match name:
+            case "if" | "ifdef" | "ifndef":
+                enclosing = active
+                if not enclosing:
+                    taken = False
+                elif name == "if":
+                    taken = self._evaluate(rest) != 0
+                else:
+                    taken = self._is_defined(self._single_identifier(rest)) == (name == "ifdef")
+                # A skipped group counts as already taken so that none of its branches become active.
+                conditionals.append([enclosing, taken or not enclosing, False])
+                return taken
+            case "elif" | "else":
+                if not conditionals or conditionals[-1][2]:
+                    raise PreprocessorFallback(f"Unexpected #{name}")
+                state = conditionals[-1]
+                if state[1]:
+                    state[2] = name == "else"
+                    return False
+                taken = name == "else" or self._evaluate(rest) != 0
+                state[1], state[2] = taken, name == "else"
+                return taken
+            case "endif":
+                if not conditionals:
+                    raise PreprocessorFallback("Unexpected #endif")
+                return conditionals.pop()[0]
+
+    def _define(self, rest: str) -> None:
+        mo = _DEFINE_RE.match(rest)
+        if mo is None:
+            raise PreprocessorFallback("Malformed #define")
+        name, is_function, params, body = mo.groups()
+        self._check_not_predefined(name)
+        body_tokens = _tokenize(body)
+        if "#" in body_tokens or "##" in body_tokens:
+            raise PreprocessorFallback("Stringizing and token pasting are not supported")
+        if not is_function:
+            self.macros[name] = Macro(None, body_tokens)
+            return
+        param_tokens = _tokenize(params)
+        param_names = param_tokens[::2]
+        if (param_tokens and len(param_tokens) % 2 == 0) or any(sep != "," for sep in param_tokens[1::2]) \
+                or not all(p.isidentifier() for p in param_names) or len(set(param_names)) != len(param_names):
+            raise PreprocessorFallback("Unsupported macro parameter list")
+        self.macros[name] = Macro(param_names, body_tokens)
+
+    def _find_include(self, rest: str, current_file: str) -> str:
+        mo = _INCLUDE_RE.match(rest)
+        if mo is None:
+            raise PreprocessorFallback("Unsupported #include form")
+        quoted, bracketed = mo.groups()
+        search = self.include_dirs if quoted is None else [os.path.dirname(current_file) or "."] + self.include_dirs
+        for directory in search:
+            path = os.path.join(directory, quoted or bracketed)
+            if os.path.isfile(path):
+                return path
+        # System headers are left to gcc.
+        raise PreprocessorFallback(f"Include {quoted or bracketed} not found")
+
+    def _single_identifier(self, rest: str) -> str:
+        tokens = _tokenize(rest)
+        if not tokens or not tokens[0].isidentifier():
+            raise PreprocessorFallback("Expected an identifier")
+        return tokens[0]
+
+    def _is_defined(self, name: str) -> bool:
+        if name not in self.macros:
+            self._check_not_predefined(name)
+        return name in self.macros
+
+    def _check_not_predefined(self, name: str) -> None:
+        if name.startswith("__") or name in _GCC_PREDEFINED:
+            raise PreprocessorFallback(f"{name} may be predefined by gcc")
+
+    def _expand(self, tokens: list) -> list:
+        """
+        Macro-expands tokens, rescanning replacements with hidesets to stop recursion.
+        Source tokens are plain strings, tokens produced by a macro are (text, hideset) pairs.
+        """
+        macros = self.macros
+        names = set(tokens)
+        if (macros.keys().isdisjoint(names) and _GCC_PREDEFINED.isdisjoint(names)
+                and not any(type(name) is not str or name[:2] == "__" for name in names)):
+            # Most lines and macro arguments mention no macro at all.
+            return tokens
+        stack = tokens[::-1]
+        out = []
+        while stack:
+            token = stack.pop()
+            if type(token) is str:
+                text, hideset = token, _NO_HIDESET
+            else:
+                text, hideset = token
+            macro = macros.get(text)
+            if macro is None or text in hideset:
+                if macro is None and (text[:2] == "__" or text in _GCC_PREDEFINED):
+                    self._check_not_predefined(text)
+                out.append(token)
+                continue
+
+            if macro.params is None:
+                hideset = hideset | {text}
+                stack.extend((body_text, hideset) for body_text in reversed(macro.body))
+                continue
+
+            # The invocation's parenthesis may follow on a later line.
+            i = len(stack) - 1
+            while i >= 0 and stack[i] == "\n":
+                i -= 1
+            if i < 0 or _text(stack[i]) != "(":
+                out.append(token)
+                continue
+            newlines = stack[i + 1:]
+            del stack[i:]
+            args, rparen = self._collect_args(stack, newlines)
+            if len(args) != len(macro.params) and not (not macro.params and args == [[]]):
+                raise PreprocessorFallback(f"Wrong number of arguments for macro {text}")
+            rparen_hideset = _NO_HIDESET if type(rparen) is str else rparen[1]
+            hideset = (hideset & rparen_hideset) | {text}
+            expanded_args = dict(zip(macro.params, (self._expand(arg) for arg in args)))
+            replacement = []
+            for body_text in macro.body:
+                if body_text in expanded_args:
+                    replacement.extend((arg, hideset) if type(arg) is str else (arg[0], arg[1] | hideset)
+                                       for arg in expanded_args[body_text])
+                else:
+                    replacement.append((body_text, hideset))
+            # Line ends inside the invocation follow its replacement, so no output line goes missing.
+            stack.extend(newlines)
+            stack.extend(reversed(replacement))
+        return out
+
+    @staticmethod
+    def _collect_args(stack: list, newlines: list) -> tuple[list[list], object]:
+        """Pops the arguments of a macro invocation off stack, moving the line ends among them to newlines."""
+        args = [[]]
+        depth = 0
+        while stack:
+            token = stack.pop()
+            if token == "\n":
+                newlines.append(token)
+                continue
+            text = _text(token)
+            if text == ")" and depth == 0:
+                return args, token
+            if text == "," and depth == 0:
+                args.append([])
+                continue
+            if text == "(":
+                depth += 1
+            elif text == ")":
+                depth -= 1
+            args[-1].append(token)
+        raise PreprocessorFallback("Unterminated macro invocation")
+
+    def _evaluate(self, rest: str) -> int:
+        tokens = _tokenize(rest)
+        resolved = []
+        i = 0
+        while i < len(tokens):
+            if tokens[i] != "defined":
+                resolved.append(tokens[i])
+                i += 1
+                continue
+            if tokens[i + 1 : i + 2] == ["("] and tokens[i + 3 : i + 4] == [")"]:
+                name, i = tokens[i + 2], i + 4
+            elif i + 1 < len(tokens):
+                name, i = tokens[i + 1], i + 2
+            else:
+                raise PreprocessorFallback("Malformed defined")
+            if not name.isidentifier():
+                raise PreprocessorFallback("Malformed defined")
+            resolved.append("1" if self._is_defined(name) else "0")
+
+        expanded = [_text(token) for token in self._expand(resolved)]
+        if not expanded or "defined" in expanded:
+            raise PreprocessorFallback("Unsupported #if expression")
+        return _ExpressionEvaluator(expanded).evaluate()
+
+
+_INT64_MIN, _INT64_MAX = -2**63, 2**63 - 1
+_NUMBER_RE = re.compile(r"(0[xX][0-9a-fA-F]+|0[0-7]*|[1-9][0-9]*)([lL]{0,2})")
+
+# Binary operators by precedence, lowest first.
+_BINARY_PRECEDENCE = {
+    "||": 1, "&&": 2, "|": 3, "^": 4, "&": 5,
+    "==": 6, "!=": 6, "<": 7, ">": 7, "<=": 7, ">=": 7,
+    "<<": 8, ">>": 8, "+": 9, "-": 9, "*": 10, "/": 10, "%": 10,
+}
+
+class _ExpressionEvaluator:
+    """
+    Evaluates a macro-expanded #if expression in signed 64 bit arithmetic. Anything that
+    would need unsigned arithmetic or that gcc rejects raises PreprocessorFallback.
+    """
+    def __init__(self, tokens: list[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def evaluate(self) -> int:
+        value = self._conditional()
+        if self.pos != len(self.tokens):
+            raise PreprocessorFallback("Trailing tokens in #if")
+        return value
+
+    def _peek(self) -> str | None:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        token = self._peek()
+        if token is None:
+            raise PreprocessorFallback("Truncated #if expression")
+        self.pos += 1
+        return token
+
+    def _conditional(self) -> int:
+        cond = self._binary(1)
+        if self._peek() != "?":
+            return cond
+        self.pos += 1
+        then = self._conditional()
+        if self._next() != ":":
+            raise PreprocessorFallback("Malformed conditional in #if")
+        else_ = self._conditional()
+        return then if cond else else_
+
+    def _binary(self, min_precedence: int) -> int:
+        left = self._unary()
+        while (precedence := _BINARY_PRECEDENCE.get(self._peek(), 0)) >= min_precedence:
+            op = self._next()
+            right = self._binary(precedence + 1)
+            left = self._apply(op, left, right)
+        return left
+
+    def _unary(self) -> int:
+        token = self._next()
+        match token:
+            case "(":
+                value = self._conditional()
+                if self._next() != ")":
+                    raise PreprocessorFallback("Unbalanced parentheses in #if")
+                return value
+            case "-":
+                return self._checked(-self._unary())
+            case "+":
+                return self._unary()
+            case "!":
+                return int(not self._unary())
+            case "~":
+                return ~self._unary()
+        if token.isidentifier():
+            return 0
+        mo = _NUMBER_RE.fullmatch(token)
+        if mo is None:
+            raise PreprocessorFallback(f"Unsupported token {token} in #if")
+        digits = mo.group(1)
+        if digits[:2] in ("0x", "0X"):
+            return self._checked(int(digits, 16))
+        return self._checked(int(digits, 8 if digits[0] == "0" else 10))
+
+    def _apply(self, op: str, left: int, right: int) -> int:
+        match op:
+            case "||": return int(bool(left) or bool(right))
+            case "&&": return int(bool(left) and bool(right))
+            case "|": return left | right
+            case "^": return left ^ right
+            case "&": return left & right
+            case "==": return int(left == right)
+            case "!=": return int(left != right)
+            case "<": return int(left < right)
+            case ">": return int(left > right)
+            case "<=": return int(left <= right)
+            case ">=": return int(left >= right)
+            case "<<" | ">>":
+                if not 0 <= right < 64 or left < 0:
+                    raise PreprocessorFallback("Unsupported shift in #if")
+                return self._checked(left << right if op == "<<" else left >> right)
+            case "+": return self._checked(left + right)
+            case "-": return self._checked(left - right)
+            case "*": return self._checked(left * right)
+            case "/" | "%":
+                if right == 0:
+                    raise PreprocessorFallback("Division by zero in #if")
+                quotient = abs(left) // abs(right) * (1 if (left < 0) == (right < 0) else -1)
+                return self._checked(quotient if op == "/" else left - quotient * right)
+
+    @staticmethod
+    def _checked(value: int) -> int:
+        if not _INT64_MIN <= value <= _INT64_MAX:
+            raise PreprocessorFallback("Overflow in #if")
+        return value
+
+
+@traced("preprocess (built-in)")
+def preprocess(file: str, include_dirs = ()) -> str:
+    """Preprocesses file, raising PreprocessorFallback if gcc -E is needed instead."""
+    return "".join(Preprocessor(include_dirs).run(file))
@@ -0,0 +1,206 @@
+"""
+Profiles a compile for --profile, writing a pstats file and a folded stack file: one line
+per call stack with the time spent in it, for flamegraph.pl or speedscope. Every stack is
+rooted at the compiler stage it belongs to, the innermost stage entry point on it, so a
+flame graph splits first by stage.
+
+"cprofile" traces every call. Its pstats file is exact, but cProfile only keeps caller to
+callee edges, so the folded stacks are rebuilt from the call graph by splitting each
+function's time between its callers in proportion. "sample" instead records the stack
+every SAMPLE_INTERVAL seconds of wall time from a signal handler. This costs far less, and
+its stacks are exact; its pstats file is derived from the samples, so call counts are
+sample counts.
+"""
+import contextlib
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+PROFILE_MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.001
+
+# The stage of a stack is that of the innermost of these functions on it, by file and name.
+_STAGE_ENTRY_POINTS = {
+    ("preprocessor.py", "preprocess"): "preprocess",
+    ("gcc_runner.py", "preprocess"): "preprocess",
+    ("lexer.py", "stream_tokens"): "lex",
+    ("lexer.py", "tokenize"): "lex",
+    ("parser.py", "parse_program"): "parse",
+    ("semantic_analyser.py", "validate_program"): "validate",
+    ("emitter.py", "emit_program"): "tacky",
+    ("incremental.py", "emit_program"): "tacky",
+    ("optimizer.py", "optimize_program"): "optimize",
+    ("asm_generator.py", "lower_program"): "codegen",
+    ("asm_allocator.py", "legalize"): "codegen",
+    ("incremental.py", "lower_program"): "codegen",
+    ("code_emitter.py", "write_program_code"): "emit",
+    ("object_emitter.py", "emit_object"): "emit",
+    ("pretty_printer.py", "printer"): "print",
+    ("gcc_runner.py", "run_gcc"): "gcc",
+    ("gcc_runner.py", "lines"): "gcc",
+    ("gcc_runner.py", "_preprocess_stream"): "gcc",
+    ("gcc_runner.py", "_assemble_stream"): "gcc",
+    # The stage modules are imported by the first compile that needs them.
+    ("<frozen importlib._bootstrap>", "_find_and_load"): "import",
+}
+_OTHER_STAGE = "other"
+# Frames of the @traced wrappers are left out of the stacks, they only add a level to every stage.
+_HIDDEN_FILES = {"time_trace.py"}
+
+# The file pstats gives built-in functions, which have no line either.
+_BUILTIN_FILE = "~"
+
+
+@contextmanager
+def profiling(mode, path_base, label):
+    """Profiles the body, writing path_base.prof and path_base.folded and a per stage summary to stderr."""
+    if mode == "sample":
+        profile = _sample
+    else:
+        profile = _cprofile
+    stats, stacks = {}, Counter()
+    try:
+        with profile(stats, stacks):
+            yield
+    finally:
+        _write_stats(path_base + ".prof", stats)
+        _write_folded(path_base + ".folded", stacks)
+        _report(label, mode, stacks)
+
+@contextmanager
+def _cprofile(stats, stacks):
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        stats.update(pstats.Stats(profiler).stats)
+        stacks.update(_stacks_from_call_graph(stats))
+
+@contextmanager
+def _sample(stats, stacks):
+    import signal
+    samples = Counter()
+    outer = _profiled_frame_depth()
+
+    def record(signum, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        samples[tuple(reversed(codes))] += 1
+
+    previous = signal.signal(signal.SIGALRM, record)
+    signal.setitimer(signal.ITIMER_REAL, SAMPLE_INTERVAL, SAMPLE_INTERVAL)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        for codes, count in samples.items():
+            functions = [_function(code) for code in codes[outer:]]
+            if functions:
+                stacks[_folded(functions)] += count * SAMPLE_INTERVAL
+                _add_sample(stats, functions, count * SAMPLE_INTERVAL)
+
+def _profiled_frame_depth():
+    """How many frames deep the `with profiling(...)` statement runs, which every sample starts with."""
+    frame = sys._getframe(1)
+    while frame.f_code.co_filename in (contextlib.__file__, __file__):
+        frame = frame.f_back
+    depth = 0
+    while frame is not None:
+        depth += 1
+        frame = frame.f_back
+    return depth
+
+def _function(code):
+    return (code.co_filename, code.co_firstlineno, code.co_name)
+
+def _add_sample(stats, functions, seconds):
+    """Adds one stack to a pstats dict: self time to the innermost function, inclusive time to all."""
+    counted = set()
+    for i, function in enumerate(functions):
+        innermost = i == len(functions) - 1
+        cc, nc, tt, ct, callers = stats.get(function, (0, 0, 0.0, 0.0, {}))
+        first = function not in counted
+        counted.add(function)
+        stats[function] = (cc + first, nc + first, tt + seconds * innermost, ct + seconds * first, callers)
+        if i > 0:
+            caller = functions[i - 1]
+            ecc, enc, ett, ect = callers.get(caller, (0, 0, 0.0, 0.0))
+            callers[caller] = (ecc + 1, enc + 1, ett + seconds * innermost, ect + seconds)
+
+def _stacks_from_call_graph(stats):
+    """Approximate stacks from a pstats dict, splitting each function's time between its callers."""
+    callees = {}
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((function, edge[3]))
+    total = sum(tt for _, _, tt, _, _ in stats.values())
+    # Paths with less time than this are folded into their caller, which bounds the walk.
+    threshold = total * 1e-4
+    stacks = Counter()
+
+    def visit(function, path, seconds):
+        path.append(function)
+        _, _, tt, ct, _ = stats[function]
+        own = seconds * tt / ct if ct else seconds
+        # Recursive calls are left out: their time is already part of the outermost call's.
+        shares = [(callee, seconds * edge_seconds / ct) for callee, edge_seconds in callees.get(function, ())
+                  if ct and callee not in path]
+        # Inclusive times of recursive functions overlap or miss the recursive calls, so the
+        # shares are scaled to exactly what this path spends outside of the function itself.
+        total_shares = sum(share for _, share in shares)
+        if not total_shares:
+            own = seconds
+        scale = (seconds - own) / total_shares if total_shares else 0.0
+        for callee, share in shares:
+            share *= scale
+            if share < threshold:
+                own += share
+            else:
+                visit(callee, path, share)
+        stacks[_folded(path)] += own
+        path.pop()
+
+    for function, (_, _, _, ct, callers) in stats.items():
+        if not callers:
+            visit(function, [], ct)
+    return stacks
+
+def _folded(functions):
+    stage = _OTHER_STAGE
+    labels = []
+    for filename, line, name in functions:
+        basename = os.path.basename(filename)
+        stage = _STAGE_ENTRY_POINTS.get((basename, name), stage)
+        if basename in _HIDDEN_FILES:
+            continue
+        labels.append(name if filename == _BUILTIN_FILE else f"{name} ({basename}:{line})")
+    return ";".join([stage] + labels)
+
+def _write_stats(path, stats):
+    import marshal
+    with open(path, "wb") as f:
+        marshal.dump(stats, f)
+
+def _write_folded(path, stacks):
+    with open(path, "w") as f:
+        for stack, seconds in sorted(stacks.items()):
+            microseconds = round(seconds * 1e6)
+            if microseconds:
+                f.write(f"{stack} {microseconds}\n")
+
+def _report(label, mode, stacks):
+    by_stage = Counter()
+    for stack, seconds in stacks.items():
+        by_stage[stack.split(";", 1)[0]] += seconds
+    total = sum(by_stage.values()) or 1
+    print(f"Profile of {label} ({mode}), {total * 1000:.1f} ms:", file=sys.stderr)
+    for stage, seconds in by_stage.most_common():
+        print(f"  {stage:<12}{seconds * 1000:10.1f} ms{seconds / total:8.1%}", file=sys.stderr)
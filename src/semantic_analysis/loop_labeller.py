@@ -1,6 +1,7 @@
 from __future__ import annotations
 from ..c_ast import *
-from ..utils import log, NameGenerator
+from ..utils import log
+from ..time_trace import traced, function_definition
 
 @log
 def ensure_label(current_label, kind):
@@ -9,9 +10,9 @@ def ensure_label(current_label, kind):
     return current_label
 
 @log
-def label_loop(loop):
-    new_label = NameGenerator.make_label("loop")
-    labeled_body = label_statement(loop.body, new_label)
+def label_loop(ctx, loop):
+    new_label = ctx.name_generator.make_label("loop")
+    labeled_body = label_statement(ctx, loop.body, new_label)
     match loop:
         case While(cond, _):
             return While(cond, labeled_body, new_label)
@@ -21,7 +22,7 @@ def label_loop(loop):
             return For(init, cond, post, labeled_body, new_label)
 
 @log
-def label_statement(statement, current_label):
+def label_statement(ctx, statement, current_label):
     match statement:
         case Break():
             return Break(ensure_label(current_label, "Break"))
@@ -29,34 +30,39 @@ def label_statement(statement, current_label):
             return Continue(ensure_label(current_label, "Continue"))
         case If(cond, then, else_):
             return If(cond, 
-                        label_statement(then, current_label), 
-                        label_statement(else_, current_label) if else_ else None)
+                        label_statement(ctx, then, current_label), 
+                        label_statement(ctx, else_, current_label) if else_ else None)
         case Compound(block):
-            return Compound(label_block(block, current_label))
+            return Compound(label_block(ctx, block, current_label))
         case While() | DoWhile() | For() as loop:
-            return label_loop(loop)
+            return label_loop(ctx, loop)
         case _:
             return statement
 
 @log
-def label_block(block, current_label = None):
+def label_block(ctx, block, current_label = None):
     return Block([
-        S(label_statement(item.statement, current_label))
+        S(label_statement(ctx, item.statement, current_label))
         if isinstance(item, S) else item
         for item in block.block_items
     ])
 
 @log
-def label_function_declaration(fun_decl):
-    body = label_block(fun_decl.body) if fun_decl.body else None
+@traced(function_definition)
+def label_function_declaration(ctx, fun_decl):
+    body = None
+    if fun_decl.body:
+        with ctx.name_generator.function_scope(fun_decl.name):
+            body = label_block(ctx, fun_decl.body)
     return FunctionDeclaration(fun_decl.name, fun_decl.params, body, fun_decl.fun_type, fun_decl.storage_class)
 
 @log("Labelling loops:")
-def label_program(program):
+@traced()
+def label_program(ctx, program):
     new_decls = []
     for decl in program.declarations:
         if isinstance(decl, FunDecl):
-            labelled = FunDecl(label_function_declaration(decl.function_declaration))
+            labelled = FunDecl(label_function_declaration(ctx, decl.function_declaration))
         else:
             labelled = decl
         new_decls.append(labelled)
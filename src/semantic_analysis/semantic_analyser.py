@@ -1,12 +1,14 @@
 from __future__ import annotations
 from ..utils import log
+from ..time_trace import traced
 from .variable_resolver import resolve_program
 from .typechecker import typecheck_program
 from .loop_labeller import label_program
 
 @log("Validating program:")
-def validate_program(program):
-    program = resolve_program(program)
-    typecheck_program(program)
-    program = label_program(program)
+@traced()
+def validate_program(ctx, program):
+    program = resolve_program(ctx, program)
+    typecheck_program(ctx, program)
+    program = label_program(ctx, program)
     return program
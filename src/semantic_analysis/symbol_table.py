@@ -2,10 +2,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from ..c_ast import Type
 
-symbol_table: dict[str, SymbolEntry] = {}
 
-
-@dataclass
+@dataclass(slots = True)
 class SymbolEntry:
     type: Type
     defined: bool | None = None
@@ -13,41 +11,41 @@ class SymbolEntry:
 
 
 class IdentifierAttr:
-    pass
-@dataclass
+    __slots__ = ()
+@dataclass(slots = True)
 class FunAttr(IdentifierAttr):
     defined: bool
     global_: bool
-@dataclass
+@dataclass(slots = True)
 class StaticAttr(IdentifierAttr):
     init: InitialValue
     global_: bool
 class LocalAttr(IdentifierAttr):
-    pass
+    __slots__ = ()
 
 
 class InitialValue:
-    pass
+    __slots__ = ()
 class Tentative(InitialValue):
-    pass
-@dataclass
+    __slots__ = ()
+@dataclass(slots = True)
 class Initial(InitialValue):
     init: StaticInit
 class NoInitializer(InitialValue):
-    pass
+    __slots__ = ()
 
 
 class StaticInit:
-    pass
-@dataclass
+    __slots__ = ()
+@dataclass(slots = True)
 class IntInit(StaticInit):
     int: int
-@dataclass
+@dataclass(slots = True)
 class LongInit(StaticInit):
     int: int
-@dataclass
+@dataclass(slots = True)
 class UIntInit(StaticInit):
     int: int
-@dataclass
+@dataclass(slots = True)
 class ULongInit(StaticInit):
-    int: int
\ No newline at end of file
+    int: int
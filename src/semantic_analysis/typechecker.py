@@ -1,17 +1,20 @@
 from __future__ import annotations
 from ..c_ast import *
 from ..utils import log
+from ..time_trace import traced, function_definition
 from .symbol_table import *
+from ..compilation_context import CompilationContext
 
 @log
-def typecheck_function_declaration(decl: FunctionDeclaration):
+@traced(function_definition)
+def typecheck_function_declaration(ctx: CompilationContext, decl: FunctionDeclaration):
     fun_type = decl.fun_type
     has_body = decl.body is not None
     already_defined = False
     global_decl = decl.storage_class != StorageClass.static
 
-    if decl.name in symbol_table:
-        old_decl = symbol_table[decl.name]
+    if decl.name in ctx.symbol_table:
+        old_decl = ctx.symbol_table[decl.name]
         if old_decl.type != fun_type:
             raise RuntimeError(f"Incompatible function declarations {fun_type} and {old_decl.type}")
         already_defined = old_decl.defined
@@ -22,18 +25,18 @@ def typecheck_function_declaration(decl: FunctionDeclaration):
         global_decl = old_decl.attrs.global_
 
     attrs = FunAttr(defined=(already_defined or has_body), global_ = global_decl)
-    symbol_table[decl.name] = SymbolEntry(
+    ctx.symbol_table[decl.name] = SymbolEntry(
         type = fun_type, 
         defined = already_defined or has_body,
         attrs = attrs
     )
     if has_body:
         for param, param_type in zip(decl.params, fun_type.params):
-            symbol_table[param] = SymbolEntry(param_type)
-        typecheck_block(decl.body, fun_type.ret)
+            ctx.symbol_table[param] = SymbolEntry(param_type)
+        typecheck_block(ctx, decl.body, fun_type.ret)
 
 @log
-def typecheck_file_scope_variable_declaration(var_decl: VariableDeclaration):
+def typecheck_file_scope_variable_declaration(ctx: CompilationContext, var_decl: VariableDeclaration):
     name, init, type_, storage_class = var_decl.name, var_decl.init, var_decl.var_type, var_decl.storage_class
     if isinstance(init, Constant):
         initial_value = resolve_static_const_init(init, type_)
@@ -47,8 +50,8 @@ def typecheck_file_scope_variable_declaration(var_decl: VariableDeclaration):
     
     global_ = storage_class != StorageClass.static
 
-    if name in symbol_table:
-        old_decl = symbol_table[name]
+    if name in ctx.symbol_table:
+        old_decl = ctx.symbol_table[name]
         if old_decl.type != type_:
             raise RuntimeError(f"Conflicting types of variable {name}: {old_decl.type} and {type_}")
         if storage_class == StorageClass.extern:
@@ -64,22 +67,22 @@ def typecheck_file_scope_variable_declaration(var_decl: VariableDeclaration):
         elif not isinstance(initial_value, Initial) and isinstance(old_decl.attrs.init, Tentative):
             initial_value = Tentative()
     attrs = StaticAttr(init = initial_value, global_ = global_)
-    symbol_table[name] = SymbolEntry(
+    ctx.symbol_table[name] = SymbolEntry(
         type = type_, 
         attrs = attrs)
 
 @log
-def typecheck_local_variable_declaration(var_decl: VariableDeclaration):
+def typecheck_local_variable_declaration(ctx: CompilationContext, var_decl: VariableDeclaration):
     name, init, type_, storage_class = var_decl.name, var_decl.init, var_decl.var_type, var_decl.storage_class
     if storage_class == StorageClass.extern:
         if init is not None:
             raise RuntimeError(f"Initializer on local extern variable declaration {var_decl}")
-        if name in symbol_table:
-            old_decl = symbol_table[name]
+        if name in ctx.symbol_table:
+            old_decl = ctx.symbol_table[name]
             if old_decl.type != type_:
                 raise RuntimeError(f"Conflicting types of variable {name}: {old_decl.type} and {type_}")
         else:
-            symbol_table[name] = SymbolEntry(
+            ctx.symbol_table[name] = SymbolEntry(
                 type = type_,
                 attrs = StaticAttr(init = NoInitializer(), global_ = True)
             )
@@ -90,27 +93,27 @@ def typecheck_local_variable_declaration(var_decl: VariableDeclaration):
             initial_value = resolve_static_const_init(init, type_)
         else:
             raise RuntimeError(f"Non-constant initializer on local static variable {var_decl}")
-        symbol_table[name] = SymbolEntry(
+        ctx.symbol_table[name] = SymbolEntry(
             type = type_,
             attrs = StaticAttr(init = initial_value, global_ = False)
         )
     else:
-        symbol_table[name] = SymbolEntry(
+        ctx.symbol_table[name] = SymbolEntry(
             type = type_,
             attrs = LocalAttr())
         if init is not None:
-            typecheck_exp(var_decl.init)
+            typecheck_exp(ctx, var_decl.init)
             var_decl.init = convert_to(var_decl.init, type_)
     
 @log
-def typecheck_for_init_decl(decl: VariableDeclaration):
+def typecheck_for_init_decl(ctx: CompilationContext, decl: VariableDeclaration):
     if decl.storage_class is not None:
         raise RuntimeError(f"Cannot have storage class specifier in for init {decl}")
-    typecheck_local_variable_declaration(decl)
+    typecheck_local_variable_declaration(ctx, decl)
 
 @log
-def typecheck_variable(var: Var):
-    v_type = symbol_table[var.identifier].type
+def typecheck_variable(ctx: CompilationContext, var: Var):
+    v_type = ctx.symbol_table[var.identifier].type
     if isinstance(v_type, FunType):
         raise RuntimeError(f"Function name {var.identifier} used as variable")
     set_type(var, v_type)
@@ -130,22 +133,22 @@ def typecheck_constant(constant: Constant):
             raise RuntimeError(f"Compiler error, cant typecheck {constant}")
 
 @log
-def typecheck_cast(cast: Cast):
-    typecheck_exp(cast.exp)
+def typecheck_cast(ctx: CompilationContext, cast: Cast):
+    typecheck_exp(ctx, cast.exp)
     set_type(cast, cast.target_type)
 
 @log
-def typecheck_unary(unary: Unary):
-    typecheck_exp(unary.exp)
+def typecheck_unary(ctx: CompilationContext, unary: Unary):
+    typecheck_exp(ctx, unary.exp)
     if unary.unary_operator.is_logical:
         set_type(unary, Int)
     else:
         set_type(unary, get_type(unary.exp))
 
 @log
-def typecheck_binary(binary: Binary):
-    typecheck_exp(binary.left_exp)
-    typecheck_exp(binary.right_exp)
+def typecheck_binary(ctx: CompilationContext, binary: Binary):
+    typecheck_exp(ctx, binary.left_exp)
+    typecheck_exp(ctx, binary.right_exp)
     if binary.binary_operator.is_logical:
         set_type(binary, Int)
         return
@@ -160,18 +163,18 @@ def typecheck_binary(binary: Binary):
         set_type(binary, Int)
     
 @log
-def typecheck_assignment(assignment: Assignment):
-    typecheck_exp(assignment.left)
-    typecheck_exp(assignment.right)
+def typecheck_assignment(ctx: CompilationContext, assignment: Assignment):
+    typecheck_exp(ctx, assignment.left)
+    typecheck_exp(ctx, assignment.right)
     left_type = get_type(assignment.left)
     assignment.right = convert_to(assignment.right, left_type)
     set_type(assignment, left_type)
 
 @log
-def typecheck_conditional(conditional: Conditional):
-    typecheck_exp(conditional.condition)
-    typecheck_exp(conditional.then_exp)
-    typecheck_exp(conditional.else_exp)
+def typecheck_conditional(ctx: CompilationContext, conditional: Conditional):
+    typecheck_exp(ctx, conditional.condition)
+    typecheck_exp(ctx, conditional.then_exp)
+    typecheck_exp(ctx, conditional.else_exp)
     then_type = get_type(conditional.then_exp)
     else_type = get_type(conditional.else_exp)
     common_type = get_common_type(then_type, else_type)
@@ -180,22 +183,22 @@ def typecheck_conditional(conditional: Conditional):
     set_type(conditional, common_type)
 
 @log
-def typecheck_function_call(func_call: FunctionCall):
-    f_type = symbol_table[func_call.identifier].type
+def typecheck_function_call(ctx: CompilationContext, func_call: FunctionCall):
+    f_type = ctx.symbol_table[func_call.identifier].type
     if not isinstance(f_type, FunType):
         raise RuntimeError(f"Variable used as function name {func_call.identifier}")
     if len(f_type.params) != len(func_call.args):
         raise RuntimeError(f"Function {func_call.identifier} called with wrong number of arguments, expected {len(f_type.params)}, found {len(func_call.args)}")
     converted_args = []
     for arg, param_type in zip(func_call.args, f_type.params):
-        typecheck_exp(arg)
+        typecheck_exp(ctx, arg)
         converted_args.append(convert_to(arg, param_type))
     func_call.args = converted_args
     set_type(func_call, f_type.ret)
 
 @log
-def typecheck_return(return_stmt: Return, fun_ret_type: Type):
-    typecheck_exp(return_stmt.exp)
+def typecheck_return(ctx: CompilationContext, return_stmt: Return, fun_ret_type: Type):
+    typecheck_exp(ctx, return_stmt.exp)
     return_stmt.exp = convert_to(return_stmt.exp, fun_ret_type)
     
 @log
@@ -249,105 +252,106 @@ def resolve_static_const_init(constant: Constant, decl_type: IntegralType):
 
 
 @log("Typechecking:")
-def typecheck_program(program: Program):
+@traced()
+def typecheck_program(ctx: CompilationContext, program: Program):
     for decl in program.declarations:
-        typecheck_file_scope_declaration(decl)
+        typecheck_file_scope_declaration(ctx, decl)
 
 @log
-def typecheck_file_scope_declaration(decl: Declaration):
-    typecheck_declaration(decl, False)
+def typecheck_file_scope_declaration(ctx: CompilationContext, decl: Declaration):
+    typecheck_declaration(ctx, decl, False)
 
 @log
-def typecheck_local_declaration(decl: Declaration):
-    typecheck_declaration(decl, True)
+def typecheck_local_declaration(ctx: CompilationContext, decl: Declaration):
+    typecheck_declaration(ctx, decl, True)
         
 @log
-def typecheck_declaration(decl: Declaration, is_local: bool):
+def typecheck_declaration(ctx: CompilationContext, decl: Declaration, is_local: bool):
     match decl:
         case FunDecl(fun_decl):
-            typecheck_function_declaration(fun_decl)
+            typecheck_function_declaration(ctx, fun_decl)
         case VarDecl(var_decl):
             if is_local:
-                typecheck_local_variable_declaration(var_decl)
+                typecheck_local_variable_declaration(ctx, var_decl)
             else:
-                typecheck_file_scope_variable_declaration(var_decl)
+                typecheck_file_scope_variable_declaration(ctx, var_decl)
         case _:
             raise RuntimeError(f"Cannot typecheck declaration {decl}")
 
 @log
-def typecheck_block(block: Block, fun_ret_type: Type):
+def typecheck_block(ctx: CompilationContext, block: Block, fun_ret_type: Type):
     for block_item in block.block_items:
-        typecheck_block_item(block_item, fun_ret_type)
+        typecheck_block_item(ctx, block_item, fun_ret_type)
 
 @log
-def typecheck_block_item(item: BlockItem, fun_ret_type: Type):
+def typecheck_block_item(ctx: CompilationContext, item: BlockItem, fun_ret_type: Type):
     match item:
         case D(decl):
-            typecheck_local_declaration(decl)
+            typecheck_local_declaration(ctx, decl)
         case S(stmt):
-            typecheck_statement(stmt, fun_ret_type)
+            typecheck_statement(ctx, stmt, fun_ret_type)
         case _:
             raise RuntimeError(f"Cannot typecheck block item {item}")
         
 @log
-def typecheck_statement(stmt: Statement, fun_ret_type: Type):
+def typecheck_statement(ctx: CompilationContext, stmt: Statement, fun_ret_type: Type):
     match stmt:
         case Return():
-            typecheck_return(stmt, fun_ret_type)
+            typecheck_return(ctx, stmt, fun_ret_type)
         case Expression(exp):
-            typecheck_exp(exp)
+            typecheck_exp(ctx, exp)
         case If(cond, then, else_):
-            typecheck_exp(cond)
-            typecheck_statement(then, fun_ret_type)
+            typecheck_exp(ctx, cond)
+            typecheck_statement(ctx, then, fun_ret_type)
             if else_:
-                typecheck_statement(else_, fun_ret_type)
+                typecheck_statement(ctx, else_, fun_ret_type)
         case Compound(block):
-            typecheck_block(block, fun_ret_type)
+            typecheck_block(ctx, block, fun_ret_type)
         case Break() | Continue() | Null():
             pass
         case While(cond, body, _) | DoWhile(body, cond, _):
-            typecheck_exp(cond)
-            typecheck_statement(body, fun_ret_type)
+            typecheck_exp(ctx, cond)
+            typecheck_statement(ctx, body, fun_ret_type)
         case For(init, cond, post, body, _):
-            typecheck_for_init(init)
+            typecheck_for_init(ctx, init)
             if cond:
-                typecheck_exp(cond)
+                typecheck_exp(ctx, cond)
             if post:
-                typecheck_exp(post)
-            typecheck_statement(body, fun_ret_type)
+                typecheck_exp(ctx, post)
+            typecheck_statement(ctx, body, fun_ret_type)
         case _:
             raise RuntimeError(f"Cannot typecheck statement {stmt}")
 
 @log
-def typecheck_for_init(init: ForInit):
+def typecheck_for_init(ctx: CompilationContext, init: ForInit):
     match init:
         case InitDecl(decl):
-            typecheck_for_init_decl(decl)
+            typecheck_for_init_decl(ctx, decl)
         case InitExp(None):
             pass
         case InitExp(exp):
-            typecheck_exp(exp)
+            typecheck_exp(ctx, exp)
         case _:
             raise RuntimeError(f"Cannot typecheck for init {init}")
 
 @log
-def typecheck_exp(exp: Exp):
+def typecheck_exp(ctx: CompilationContext, exp: Exp):
     match exp:
         case Constant():
             typecheck_constant(exp)
         case Unary():
-            typecheck_unary(exp)
+            typecheck_unary(ctx, exp)
         case Binary():
-            typecheck_binary(exp)
+            typecheck_binary(ctx, exp)
         case Assignment():
-            typecheck_assignment(exp)
+            typecheck_assignment(ctx, exp)
         case Conditional():
-            typecheck_conditional(exp)
+            typecheck_conditional(ctx, exp)
         case FunctionCall():
-            typecheck_function_call(exp)
+            typecheck_function_call(ctx, exp)
         case Var():
-            typecheck_variable(exp)
+            typecheck_variable(ctx, exp)
         case Cast():
-            typecheck_cast(exp)
+            typecheck_cast(ctx, exp)
         case _:
             raise RuntimeError(f"Cannot typecheck exp {exp}")
@@ -1,19 +1,51 @@
 from __future__ import annotations
 from ..c_ast import *
 from typing import NamedTuple
-import copy
-from ..utils import log, NameGenerator
+from ..utils import log
+from ..time_trace import traced, function_definition
 
 class MapEntry(NamedTuple):
     name: str
     from_current_scope: bool
     has_linkage: bool
 
-@log
-def copy_identifier_map(identifier_map):
-    result = copy.deepcopy(identifier_map)
-    result = {k: MapEntry(v.name, False, v.has_linkage) for k, v in result.items()}
-    return result
+class IdentifierMap:
+    """
+    Chain of scopes mapping source identifiers to MapEntries. Entering a scope is O(1),
+    entries found in an enclosing scope are reported with from_current_scope = False.
+    """
+    __slots__ = ("entries", "parent")
+
+    def __init__(self, parent: IdentifierMap | None = None):
+        self.entries: dict[str, MapEntry] = {}
+        self.parent = parent
+
+    def new_scope(self) -> IdentifierMap:
+        return IdentifierMap(self)
+
+    def _lookup(self, name) -> MapEntry | None:
+        entry = self.entries.get(name)
+        if entry is not None:
+            return entry
+        scope = self.parent
+        while scope is not None:
+            entry = scope.entries.get(name)
+            if entry is not None:
+                return MapEntry(entry.name, False, entry.has_linkage)
+            scope = scope.parent
+        return None
+
+    def __contains__(self, name) -> bool:
+        return self._lookup(name) is not None
+
+    def __getitem__(self, name) -> MapEntry:
+        entry = self._lookup(name)
+        if entry is None:
+            raise KeyError(name)
+        return entry
+
+    def __setitem__(self, name, entry: MapEntry):
+        self.entries[name] = entry
 
 @log
 def register_function_decl(func_decl, identifier_map):
@@ -37,7 +69,7 @@ def register_file_scope_variable_decl(var_decl, identifier_map):
     )
 
 @log
-def register_local_variable_decl(var_decl, identifier_map):
+def register_local_variable_decl(ctx, var_decl, identifier_map):
     name = var_decl.name
     if name in identifier_map:
         prev_entry = identifier_map[name]
@@ -53,7 +85,7 @@ def register_local_variable_decl(var_decl, identifier_map):
         )
         return name
 
-    unique_name = NameGenerator.make_temporary(name)
+    unique_name = ctx.name_generator.make_temporary(name)
     identifier_map[name] = MapEntry(
         name = unique_name,
         from_current_scope = True,
@@ -75,10 +107,10 @@ def resolve_variable_name(var_name, identifier_map):
     return identifier_map[var_name].name
 
 @log
-def register_param(param, identifier_map):
+def register_param(ctx, param, identifier_map):
     if param in identifier_map and identifier_map[param].from_current_scope:
         raise RuntimeError("Duplicate variable declaration")
-    unique_name = NameGenerator.make_temporary(param)
+    unique_name = ctx.name_generator.make_temporary(param)
     identifier_map[param] = MapEntry(
         name = unique_name, 
         from_current_scope = True, 
@@ -102,20 +134,21 @@ def check_assignment_lvalue(left):
 
 
 @log
-def resolve_function_declaration(func_decl: FunctionDeclaration, identifier_map):
+@traced(function_definition)
+def resolve_function_declaration(ctx, func_decl: FunctionDeclaration, identifier_map):
     register_function_decl(func_decl, identifier_map)
 
-    inner_map = copy_identifier_map(identifier_map)
-    new_params = [register_param(param, inner_map) for param in func_decl.params]
+    inner_map = identifier_map.new_scope()
+    new_params = [register_param(ctx, param, inner_map) for param in func_decl.params]
     
     new_body = None
     if func_decl.body is not None:
-        new_body = resolve_block(func_decl.body, inner_map)
+        new_body = resolve_block(ctx, func_decl.body, inner_map)
     return FunctionDeclaration(func_decl.name, new_params, new_body, func_decl.fun_type, func_decl.storage_class)
      
 @log
-def resolve_local_variable_declaration(var_decl: VariableDeclaration, identifier_map):
-    new_name = register_local_variable_decl(var_decl, identifier_map)
+def resolve_local_variable_declaration(ctx, var_decl: VariableDeclaration, identifier_map):
+    new_name = register_local_variable_decl(ctx, var_decl, identifier_map)
     init = var_decl.init
     if init is not None:
         init = resolve_exp(init, identifier_map)
@@ -149,10 +182,10 @@ def resolve_exp(exp, identifier_map):
             raise RuntimeError(f"Could not validate semantics for expression {exp}")
 
 @log
-def resolve_for_init(init, identifier_map):
+def resolve_for_init(ctx, init, identifier_map):
     match init:
         case InitDecl(decl):
-            return InitDecl(resolve_local_variable_declaration(decl, identifier_map))
+            return InitDecl(resolve_local_variable_declaration(ctx, decl, identifier_map))
         case InitExp(None):
             return InitExp(None)
         case InitExp(exp):
@@ -161,7 +194,7 @@ def resolve_for_init(init, identifier_map):
             raise RuntimeError(f"Could not validate semantics for for_init {init}")
 
 @log
-def resolve_statement(statement, identifier_map):
+def resolve_statement(ctx, statement, identifier_map):
     match statement:
         case Return(exp):
             return Return(resolve_exp(exp, identifier_map))
@@ -169,60 +202,64 @@ def resolve_statement(statement, identifier_map):
             return Expression(resolve_exp(exp, identifier_map))
         case If(cond, then, else_):
             return If(resolve_exp(cond, identifier_map), 
-                        resolve_statement(then, identifier_map), 
-                        resolve_statement(else_, identifier_map) if else_ else None)
+                        resolve_statement(ctx, then, identifier_map), 
+                        resolve_statement(ctx, else_, identifier_map) if else_ else None)
         case Compound(block):
-            new_identifier_map = copy_identifier_map(identifier_map)
-            return Compound(resolve_block(block, new_identifier_map))
+            new_identifier_map = identifier_map.new_scope()
+            return Compound(resolve_block(ctx, block, new_identifier_map))
         case Break():
             return Break()
         case Continue():
             return Continue()
         case While(cond, body):
-            return While(resolve_exp(cond, identifier_map), resolve_statement(body, identifier_map))
+            return While(resolve_exp(cond, identifier_map), resolve_statement(ctx, body, identifier_map))
         case DoWhile(body, cond):
-            return DoWhile(resolve_statement(body, identifier_map), resolve_exp(cond, identifier_map))
+            return DoWhile(resolve_statement(ctx, body, identifier_map), resolve_exp(cond, identifier_map))
         case For(init, cond, post, body):
-            new_identifier_map = copy_identifier_map(identifier_map)
-            init = resolve_for_init(init, new_identifier_map)
+            new_identifier_map = identifier_map.new_scope()
+            init = resolve_for_init(ctx, init, new_identifier_map)
             cond = resolve_exp(cond, new_identifier_map) if cond else None
             post = resolve_exp(post, new_identifier_map) if post else None
-            body = resolve_statement(body, new_identifier_map)
+            body = resolve_statement(ctx, body, new_identifier_map)
             return For(init, cond, post, body)
         case Null():
             return Null()
         case _:
             raise RuntimeError(f"Could not validate semantics for statement {statement}")
 @log
-def resolve_block(block, identifier_map):
-    return Block([resolve_block_item(item, identifier_map) for item in block.block_items])
+def resolve_block(ctx, block, identifier_map):
+    return Block([resolve_block_item(ctx, item, identifier_map) for item in block.block_items])
 
 @log
-def resolve_block_item(blockitem, identifier_map):
+def resolve_block_item(ctx, blockitem, identifier_map):
     match blockitem:
         case D(decl):
-            return D(resolve_local_declaration(decl, identifier_map))
+            return D(resolve_local_declaration(ctx, decl, identifier_map))
         case S(stmt):
-            return S(resolve_statement(stmt, identifier_map))
+            return S(resolve_statement(ctx, stmt, identifier_map))
         case _:
             raise RuntimeError(f"Could not validate semantics for blockitem {blockitem}")
 
 @log
-def resolve_local_declaration(decl, identifier_map):
-    return resolve_declaration(decl, True, identifier_map)
+def resolve_local_declaration(ctx, decl, identifier_map):
+    return resolve_declaration(ctx, decl, True, identifier_map)
 
 @log
-def resolve_file_scope_declaration(decl, identifier_map):
-    return resolve_declaration(decl, False, identifier_map)
+def resolve_file_scope_declaration(ctx, decl, identifier_map):
+    match decl:
+        case FunDecl(function_declaration) if function_declaration.body is not None:
+            with ctx.name_generator.function_scope(function_declaration.name):
+                return resolve_declaration(ctx, decl, False, identifier_map)
+    return resolve_declaration(ctx, decl, False, identifier_map)
         
-def resolve_declaration(decl, is_local, identifier_map):
+def resolve_declaration(ctx, decl, is_local, identifier_map):
     match decl:
         case FunDecl(function_declaration):
             if is_local:
                 check_local_function_decl(function_declaration)
-            return FunDecl(resolve_function_declaration(function_declaration, identifier_map))
+            return FunDecl(resolve_function_declaration(ctx, function_declaration, identifier_map))
         case VarDecl(variable_declaration) if is_local:
-            return VarDecl(resolve_local_variable_declaration(variable_declaration, identifier_map))
+            return VarDecl(resolve_local_variable_declaration(ctx, variable_declaration, identifier_map))
         case VarDecl(variable_declaration):
             register_file_scope_variable_decl(variable_declaration, identifier_map)
             return VarDecl(variable_declaration)
@@ -230,7 +267,8 @@ def resolve_declaration(decl, is_local, identifier_map):
             raise RuntimeError(f"Could not validate semantics for declaration {decl}")
             
 @log("Resolving variables:")
-def resolve_program(program):
-    identifier_map: dict[str, MapEntry] = {}
-    resolved_declarations = [resolve_file_scope_declaration(decl, identifier_map) for decl in program.declarations]
+@traced()
+def resolve_program(ctx, program):
+    identifier_map = IdentifierMap()
+    resolved_declarations = [resolve_file_scope_declaration(ctx, decl, identifier_map) for decl in program.declarations]
     return Program(resolved_declarations)
@@ -0,0 +1,114 @@
+"""
+Records where a compile spends its time as Chrome trace events, written as JSON that
+Perfetto (ui.perfetto.dev) and chrome://tracing load. Nothing is recorded unless a
+recording is active, see recording(); span() and @traced functions then cost one check.
+The active recording is a context variable, so compiles running concurrently in one process,
+e.g. in threads, each record only their own spans.
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+
+# Tracks are shown as threads: the compiler's own work, and gcc running alongside it.
+COMPILER_TRACK = 0
+GCC_TRACK = 1
+_TRACK_NAMES = {COMPILER_TRACK: "compiler", GCC_TRACK: "gcc"}
+
+_NO_SPAN = nullcontext()
+_recording = ContextVar("time_trace_recording", default=None)
+
+class _Recording:
+    __slots__ = ("events", "start")
+
+    def __init__(self):
+        self.events = []
+        self.start = time.perf_counter_ns()
+
+class _Span:
+    __slots__ = ("recording", "name", "track", "args", "start")
+
+    def __init__(self, recording, name, track, args):
+        self.recording = recording
+        self.name = name
+        self.track = track
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter_ns()
+        event = {"name": self.name, "ph": "X", "tid": self.track,
+                 "ts": (self.start - self.recording.start) / 1000, "dur": (end - self.start) / 1000}
+        if self.args:
+            event["args"] = self.args
+        self.recording.events.append(event)
+
+def is_recording():
+    return _recording.get() is not None
+
+def span(name, track = COMPILER_TRACK, **args):
+    """A context manager recording the time spent in its body as a span called name."""
+    current = _recording.get()
+    if current is None:
+        return _NO_SPAN
+    return _Span(current, name, track, args)
+
+def traced(name = None):
+    """
+    Records a span for every call of the decorated function while recording. The span is
+    called name, by default the function's qualified name, or if name is callable, whatever
+    it returns for the call's arguments; returning None records no span for that call.
+    """
+    def decorator(func):
+        span_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            current = _recording.get()
+            if current is None:
+                return func(*args, **kwargs)
+            label = span_name(*args, **kwargs) if callable(span_name) else span_name
+            if label is None:
+                return func(*args, **kwargs)
+            with _Span(current, label, COMPILER_TRACK, None):
+                return func(*args, **kwargs)
+        # A code object of its own, so cProfile does not merge the callers of every wrapper into one.
+        names = {"co_name": func.__name__}
+        if sys.version_info >= (3, 11):
+            names["co_qualname"] = func.__qualname__
+        wrapper.__code__ = wrapper.__code__.replace(**names)
+        return wrapper
+    return decorator
+
+def function_definition(ctx, definition, *args, **kwargs):
+    """Span name for the passes that take one function at a time: the function, if this is its definition."""
+    if getattr(definition, "body", True) is None:
+        return None
+    return definition.name
+
+@contextmanager
+def recording(path, name):
+    """Records the spans of the body, and writes them to path as a trace of a process called name."""
+    current = _Recording()
+    token = _recording.set(current)
+    try:
+        yield
+    finally:
+        _recording.reset(token)
+        _write(path, name, current.events)
+
+def _write(path, name, events):
+    import json
+    pid = os.getpid()
+    metadata = [{"name": "process_name", "ph": "M", "pid": pid, "args": {"name": name}}]
+    metadata.extend({"name": "thread_name", "ph": "M", "pid": pid, "tid": track, "args": {"name": track_name}}
+                    for track, track_name in _TRACK_NAMES.items())
+    for event in events:
+        event["pid"] = pid
+    with open(path, "w") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
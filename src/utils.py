@@ -1,7 +1,6 @@
-
-import logging
-from functools import wraps
-import inspect
+import os
+from contextlib import contextmanager
+from functools import wraps, lru_cache
 
 LOG_COLORS = {
     'DEBUG': '\033[94m',     # Bright Blue
@@ -10,38 +9,92 @@ LOG_COLORS = {
 }
 RESET = '\033[0m'
 
-class ColorFormatter(logging.Formatter):
-    def format(self, record):
-        levelname = record.levelname
-        color = LOG_COLORS.get(levelname, '')
-        record.levelname = f"{color}{levelname}{RESET}"
-        record.msg = f"{record.msg}"
-        return super().format(record)
+TRACE_ENV_VAR = "COMPILER_TRACE"
 
-handler = logging.StreamHandler()
-formatter = ColorFormatter('%(levelname)s : %(message)s')
-handler.setFormatter(formatter)
-#TODO: Make the debugging level configurable
-logging.basicConfig(level=logging.WARNING, handlers=[handler])
+@lru_cache(maxsize=None)
+def _configure_logging():
+    """Sets up colored logging the first time a function is traced, so untraced runs never import logging."""
+    import logging
 
-def log(arg = None):
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            if isinstance(arg, str) and arg:
-                logging.debug(f"{LOG_COLORS['DEBUG']}{arg}{RESET}")
+    class ColorFormatter(logging.Formatter):
+        def format(self, record):
+            levelname = record.levelname
+            color = LOG_COLORS.get(levelname, '')
+            record.levelname = f"{color}{levelname}{RESET}"
+            record.msg = f"{record.msg}"
+            return super().format(record)
+
+    handler = logging.StreamHandler()
+    formatter = ColorFormatter('%(levelname)s : %(message)s')
+    handler.setFormatter(formatter)
+    logging.basicConfig(level=logging.WARNING, handlers=[handler])
+    return logging
+
+
+def _parse_trace_spec(spec):
+    return {name.strip() for name in spec.split(",") if name.strip()}
+
+_traced_modules: set[str] = _parse_trace_spec(os.environ.get(TRACE_ENV_VAR, ""))
+
+def enable_tracing(modules):
+    """
+    Enables call tracing for the given modules ("all" traces everything).
+    Tracing is decided when a function is decorated, so this must run before the
+    traced modules are imported.
+    """
+    for spec in modules:
+        _traced_modules.update(_parse_trace_spec(spec))
 
-            sig = inspect.signature(func)
-            params = list(sig.parameters)
-            log_args = args[1:] if params and params[0] in ('self', 'cls') else args
+def is_traced(module_name):
+    if not _traced_modules:
+        return False
+    return ("all" in _traced_modules
+            or module_name in _traced_modules
+            or module_name.rsplit(".", 1)[-1] in _traced_modules)
 
-            msg = f"Calling {func.__name__} with args: {log_args}"
-            if kwargs:
-                msg += f", kwargs: {kwargs}"
-            logging.debug(msg)
+class _CallArgs:
+    """Formats call arguments only if the log record is actually emitted."""
+    __slots__ = ("args", "kwargs")
 
-            return func(*args, **kwargs)
-        return wrapper
+    def __init__(self, args, kwargs):
+        self.args = args
+        self.kwargs = kwargs
+
+    def __str__(self):
+        msg = f"{self.args}"
+        if self.kwargs:
+            msg += f", kwargs: {self.kwargs}"
+        return msg
+
+def _trace(func, message):
+    import inspect
+    params = list(inspect.signature(func).parameters)
+    skip_first = bool(params) and params[0] in ('self', 'cls')
+    logging = _configure_logging()
+    logger = logging.getLogger(func.__module__)
+    logger.setLevel(logging.DEBUG)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if logger.isEnabledFor(logging.DEBUG):
+            if message:
+                logger.debug("%s%s%s", LOG_COLORS['DEBUG'], message, RESET)
+            log_args = args[1:] if skip_first else args
+            logger.debug("Calling %s with args: %s", func.__name__, _CallArgs(log_args, kwargs))
+        return func(*args, **kwargs)
+    return wrapper
+
+def log(arg = None):
+    """
+    Traces calls to the decorated function when its module is traced, see enable_tracing.
+    Otherwise the function is returned undecorated. Accepts an optional message: @log("...").
+    """
+    message = arg if isinstance(arg, str) else None
+
+    def decorator(func):
+        if not is_traced(func.__module__):
+            return func
+        return _trace(func, message)
 
     if callable(arg):
         return decorator(arg)
@@ -50,22 +103,43 @@ def log(arg = None):
     
 
 class NameGenerator:
-    _counter = 0
+    """
+    Inside function_scope the names are numbered per function and carry its name, so
+    they only depend on that function's body and stay stable when the rest of the file changes.
+    """
+    def __init__(self):
+        self._counter = 0
+        self._function_counters = {}
+        self._function = None
+
+    @contextmanager
+    def function_scope(self, function_name):
+        outer = self._function
+        self._function = function_name
+        try:
+            yield
+        finally:
+            self._function = outer
 
-    @classmethod
     @log
-    def _next_id(cls):
-        val = cls._counter
-        cls._counter += 1
+    def _next_id(self):
+        if self._function is not None:
+            val = self._function_counters.get(self._function, 0)
+            self._function_counters[self._function] = val + 1
+            return val
+        val = self._counter
+        self._counter += 1
         return val
     
-    @classmethod
     @log
-    def make_temporary(cls, name = "tmp"):
-        unique_name = f"{name}.{cls._next_id()}"
+    def make_temporary(self, name = "tmp"):
+        if self._function is not None:
+            return f"{name}.{self._function}.{self._next_id()}"
+        unique_name = f"{name}.{self._next_id()}"
         return unique_name
     
-    @classmethod
     @log
-    def make_label(cls, label_name):
-        return f"{label_name}{cls._next_id()}"
+    def make_label(self, label_name):
+        if self._function is not None:
+            return f"{label_name}.{self._function}.{self._next_id()}"
+        return f"{label_name}{self._next_id()}"
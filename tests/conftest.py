@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.c_ast import ConstInt, Int, Long
+from src.compilation_context import CompilationContext
+from src.ir_ast import IRConstant, IRFunctionDefinition
+from src.semantic_analysis.symbol_table import SymbolEntry, LocalAttr, StaticAttr, Initial, IntInit, Tentative
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def const(value):
+    """An int constant operand."""
+    return IRConstant(ConstInt(value))
+
+def make_context(ints = (), longs = (), statics = (), globals_ = ()):
+    """A context whose symbol table has the named int and long locals, int statics and int globals."""
+    ctx = CompilationContext()
+    for name in ints:
+        ctx.symbol_table[name] = SymbolEntry(Int, attrs=LocalAttr())
+    for name in longs:
+        ctx.symbol_table[name] = SymbolEntry(Long, attrs=LocalAttr())
+    for name in statics:
+        ctx.symbol_table[name] = SymbolEntry(Int, attrs=StaticAttr(Initial(IntInit(0)), False))
+    for name in globals_:
+        ctx.symbol_table[name] = SymbolEntry(Int, attrs=StaticAttr(Tentative(), True))
+    return ctx
+
+def run_pass(optimization, ctx, instructions, params = ()):
+    """Runs optimization over a function of instructions, returning the changes it reports and the new body."""
+    function = IRFunctionDefinition("f", True, list(params), list(instructions))
+    changes = optimization(ctx, function)
+    return changes, function.body
+
+
+@pytest.fixture
+def run_c(tmp_path):
+    """
+    Returns run(source, *flags, gcc = False), which builds the C source with the compiler given
+    flags, or with gcc -O0, runs it and returns its exit status (negative if killed by a signal).
+    """
+    def run(source, *flags, gcc = False):
+        path = tmp_path / "prog.c"
+        path.write_text(source)
+        executable = tmp_path / ("gcc_prog" if gcc else "prog")
+        if gcc:
+            subprocess.run(["gcc", "-O0", str(path), "-o", str(executable)], check=True)
+        else:
+            subprocess.run([sys.executable, "-m", "src.compiler_driver", "--no-cache", *flags, str(path)],
+                           cwd=ROOT, check=True)
+        return subprocess.run([str(executable)]).returncode
+    return run
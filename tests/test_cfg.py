@@ -0,0 +1,91 @@
+from conftest import const, make_context, run_pass
+from src.ir_ast import *
+from src.optimizations.cfg import ENTRY, EXIT, build_cfg, reachable_blocks
+from src.optimizations.unreachable_code import eliminate_unreachable_code
+
+
+def eliminate(*instructions):
+    """Runs eliminate_unreachable_code on instructions and returns the removed count and new body."""
+    return run_pass(eliminate_unreachable_code, make_context(ints=["x"]), instructions)
+
+
+def test_blocks_end_at_jumps_and_returns_and_start_at_labels():
+    cfg = build_cfg([
+        IRCopy(const(1), IRVar("x")),
+        IRJumpIfZero(IRVar("x"), "else"),
+        IRReturn(const(1)),
+        IRLabel("else"),
+        IRReturn(const(2)),
+    ])
+    assert [len(block.instructions) for block in cfg.blocks.values()] == [2, 1, 2]
+    assert cfg.entry_successors == {0}
+    assert cfg.blocks[0].successors == {1, 2}
+    assert cfg.blocks[2].predecessors == {0}
+    assert cfg.exit_predecessors == {1, 2}
+
+def test_code_after_return_is_unreachable():
+    cfg = build_cfg([IRReturn(const(1)), IRCopy(const(2), IRVar("x")), IRReturn(IRVar("x"))])
+    assert reachable_blocks(cfg) == {0}
+    assert eliminate(IRReturn(const(1)), IRCopy(const(2), IRVar("x")), IRReturn(IRVar("x"))) == (2, [IRReturn(const(1))])
+
+def test_block_only_reached_from_unreachable_code_is_removed():
+    removed, body = eliminate(
+        IRReturn(const(1)),
+        IRLabel("dead"),
+        IRJump("also_dead"),
+        IRLabel("also_dead"),
+        IRJump("dead"),
+    )
+    assert (removed, body) == (4, [IRReturn(const(1))])
+
+def test_jump_to_the_next_block_is_removed_with_its_label():
+    removed, body = eliminate(
+        IRCopy(const(1), IRVar("x")),
+        IRJump("next"),
+        IRLabel("next"),
+        IRReturn(IRVar("x")),
+    )
+    assert (removed, body) == (2, [IRCopy(const(1), IRVar("x")), IRReturn(IRVar("x"))])
+
+def test_conditional_jump_to_the_next_block_is_removed():
+    assert eliminate(IRJumpIfZero(IRVar("x"), "next"), IRLabel("next"), IRReturn(IRVar("x"))) \
+        == (2, [IRReturn(IRVar("x"))])
+
+def test_label_only_reached_by_falling_through_is_removed():
+    assert eliminate(IRCopy(const(1), IRVar("x")), IRLabel("unused"), IRReturn(IRVar("x"))) \
+        == (1, [IRCopy(const(1), IRVar("x")), IRReturn(IRVar("x"))])
+
+def test_loop_label_and_jumps_are_kept():
+    loop = [
+        IRLabel("loop"),
+        IRJumpIfZero(IRVar("x"), "end"),
+        IRBinary(IRBinaryOperator.Subtract, IRVar("x"), const(1), IRVar("x")),
+        IRJump("loop"),
+        IRLabel("end"),
+        IRReturn(IRVar("x")),
+    ]
+    assert eliminate(*loop) == (0, loop)
+
+def test_empty_function_has_only_an_edge_from_entry_to_exit():
+    cfg = build_cfg([])
+    assert cfg.blocks == {}
+    assert cfg.successors(ENTRY) == {EXIT}
+    assert eliminate() == (0, [])
+
+
+def test_program_with_unreachable_code_matches_gcc(run_c):
+    source = """
+int main(void) {
+    int x = 0;
+    for (int i = 0; i < 10; i = i + 1) {
+        if (i > 5)
+            continue;
+        x = x + i;
+        if (x > 100)
+            return 1;
+    }
+    return x;
+    x = 3;
+}
+"""
+    assert run_c(source, "--eliminate-unreachable-code") == run_c(source, gcc=True)
@@ -0,0 +1,82 @@
+import signal
+
+import pytest
+
+from conftest import const, make_context, run_pass
+from src.c_ast import ConstInt, ConstLong, Int, Long
+from src.ir_ast import *
+from src.optimizations.constant_folding import fold_constants
+
+INT_MIN = -2**31
+LONG_MIN = -2**63
+
+
+def fold(*instructions, dst_type = Int):
+    """Folds instructions writing tmp, of dst_type, and returns the changes and the new body."""
+    ctx = make_context(ints=["tmp"]) if dst_type is Int else make_context(longs=["tmp"])
+    return run_pass(fold_constants, ctx, instructions)
+
+def binary(operator, a, b, kind = ConstInt):
+    return IRBinary(operator, IRConstant(kind(a)), IRConstant(kind(b)), IRVar("tmp"))
+
+def folded_value(instruction, dst_type = Int):
+    changes, body = fold(instruction, dst_type=dst_type)
+    assert changes == 1
+    [copy] = body
+    assert isinstance(copy, IRCopy) and copy.dst == IRVar("tmp")
+    return copy.src.const
+
+@pytest.mark.parametrize("operator, a, b, expected", [
+    (IRBinaryOperator.Add, 2**31 - 1, 1, INT_MIN),
+    (IRBinaryOperator.Subtract, INT_MIN, 1, 2**31 - 1),
+    (IRBinaryOperator.Multiply, 65536, 65536, 0),
+    (IRBinaryOperator.Multiply, 65536, -32769, 2147418112),
+])
+def test_int_arithmetic_wraps_around_32_bits(operator, a, b, expected):
+    assert folded_value(binary(operator, a, b)) == ConstInt(expected)
+
+def test_long_arithmetic_wraps_around_64_bits():
+    assert folded_value(binary(IRBinaryOperator.Add, 2**63 - 1, 1, ConstLong), Long) == ConstLong(LONG_MIN)
+
+def test_unary_negate_of_int_min_wraps():
+    assert folded_value(IRUnary(IRUnaryOperator.Negate, const(INT_MIN), IRVar("tmp"))) == ConstInt(INT_MIN)
+
+def test_truncate_keeps_the_low_32_bits():
+    assert folded_value(IRTruncate(IRConstant(ConstLong(2**32 + 5)), IRVar("tmp"))) == ConstInt(5)
+    assert folded_value(IRTruncate(IRConstant(ConstLong(2**31)), IRVar("tmp"))) == ConstInt(INT_MIN)
+
+@pytest.mark.parametrize("a, b, quotient, remainder", [
+    (7, 2, 3, 1),
+    (-7, 2, -3, -1),
+    (7, -2, -3, 1),
+    (-7, -2, 3, -1),
+    (INT_MIN, 2, -2**30, 0),
+])
+def test_division_truncates_toward_zero(a, b, quotient, remainder):
+    assert folded_value(binary(IRBinaryOperator.Divide, a, b)) == ConstInt(quotient)
+    assert folded_value(binary(IRBinaryOperator.Remainder, a, b)) == ConstInt(remainder)
+
+@pytest.mark.parametrize("instruction", [
+    binary(IRBinaryOperator.Divide, 1, 0),
+    binary(IRBinaryOperator.Remainder, 1, 0),
+    binary(IRBinaryOperator.Divide, INT_MIN, -1),
+    binary(IRBinaryOperator.Remainder, INT_MIN, -1),
+    binary(IRBinaryOperator.Divide, LONG_MIN, -1, ConstLong),
+])
+def test_trapping_division_is_left_in_place(instruction):
+    assert fold(instruction) == (0, [instruction])
+
+def test_conditional_jumps_on_constants():
+    assert fold(IRJumpIfZero(const(0), "l")) == (1, [IRJump("l")])
+    assert fold(IRJumpIfZero(const(3), "l")) == (1, [])
+    assert fold(IRJumpIfNotZero(IRConstant(ConstLong(2**40)), "l")) == (1, [IRJump("l")])
+    assert fold(IRJumpIfNotZero(const(0), "l")) == (1, [])
+
+
+@pytest.mark.parametrize("expression", ["1 / 0", "1 % 0", "(-2147483647 - 1) / -1", "(-2147483647 - 1) % -1"])
+def test_folded_program_still_traps(run_c, expression):
+    assert run_c(f"int main(void) {{ return {expression}; }}\n", "--fold-constants") == -signal.SIGFPE
+
+def test_folded_program_matches_gcc(run_c):
+    source = "int main(void) { return (-7 / 2) * 10 + (-7 % 2) + 7 % -2 + (int) 4294967301L; }\n"
+    assert run_c(source, "--fold-constants") == run_c(source, gcc=True)
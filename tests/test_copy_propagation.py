@@ -0,0 +1,111 @@
+from conftest import const, make_context, run_pass
+from src.ir_ast import *
+from src.optimizations.copy_propagation import propagate_copies
+
+LOCALS = "abcrtxyz"
+
+
+def propagate(*instructions, ctx = None, params = ()):
+    """Runs propagate_copies on instructions until nothing changes and returns the new body."""
+    ctx = ctx or make_context(ints=LOCALS)
+    for _ in range(10):
+        changes, instructions = run_pass(propagate_copies, ctx, instructions, params)
+        if changes == 0:
+            return instructions
+    raise AssertionError("copy propagation did not converge")
+
+
+def test_constant_is_propagated_into_its_use():
+    assert propagate(IRCopy(const(3), IRVar("x")), IRReturn(IRVar("x"))) \
+        == [IRCopy(const(3), IRVar("x")), IRReturn(const(3))]
+
+def test_copy_back_to_the_source_is_removed():
+    assert propagate(IRCopy(IRVar("a"), IRVar("x")), IRCopy(IRVar("x"), IRVar("a")), IRReturn(IRVar("a")),
+                     params=["a"]) \
+        == [IRCopy(IRVar("a"), IRVar("x")), IRReturn(IRVar("a"))]
+
+def test_copy_cycle_in_a_loop_converges():
+    body = propagate(
+        IRCopy(IRVar("a"), IRVar("x")),
+        IRLabel("loop"),
+        IRCopy(IRVar("x"), IRVar("y")),
+        IRCopy(IRVar("y"), IRVar("x")),
+        IRJumpIfNotZero(IRVar("c"), "loop"),
+        IRReturn(IRVar("x")),
+        params=["a", "c"],
+    )
+    # x holds a on every path, y = x and x = y change nothing.
+    assert body[-1] == IRReturn(IRVar("a"))
+    assert IRCopy(IRVar("y"), IRVar("x")) not in body
+
+def test_copy_does_not_reach_past_a_join_with_another_value():
+    body = propagate(
+        IRCopy(const(1), IRVar("x")),
+        IRJumpIfZero(IRVar("c"), "join"),
+        IRCopy(const(2), IRVar("x")),
+        IRLabel("join"),
+        IRReturn(IRVar("x")),
+        params=["c"],
+    )
+    assert body[-1] == IRReturn(IRVar("x"))
+
+def test_writing_the_source_ends_the_copy():
+    assert propagate(IRCopy(IRVar("x"), IRVar("y")), IRCopy(const(1), IRVar("x")), IRReturn(IRVar("y")))[-1] \
+        == IRReturn(IRVar("y"))
+
+def test_call_ends_copies_from_a_static_variable():
+    ctx = make_context(ints=LOCALS, statics=["s"])
+    body = propagate(
+        IRCopy(IRVar("s"), IRVar("t")),
+        IRFunCall("g", [], IRVar("r")),
+        IRReturn(IRVar("t")),
+        ctx=ctx,
+    )
+    assert body[-1] == IRReturn(IRVar("t"))
+
+def test_call_ends_copies_to_a_static_variable():
+    ctx = make_context(ints=LOCALS, statics=["s"])
+    body = propagate(
+        IRCopy(const(5), IRVar("s")),
+        IRFunCall("g", [IRVar("s")], IRVar("r")),
+        IRReturn(IRVar("s")),
+        ctx=ctx,
+    )
+    # The argument is read before the call, which may then write s.
+    assert body[1] == IRFunCall("g", [const(5)], IRVar("r"))
+    assert body[-1] == IRReturn(IRVar("s"))
+
+def test_call_keeps_copies_between_locals():
+    ctx = make_context(ints=LOCALS, statics=["s"])
+    body = propagate(IRCopy(const(5), IRVar("x")), IRFunCall("g", [], IRVar("r")), IRReturn(IRVar("x")), ctx=ctx)
+    assert body[-1] == IRReturn(const(5))
+
+def test_type_changing_copy_is_not_propagated():
+    ctx = make_context(ints=LOCALS, longs=["l"])
+    body = propagate(IRCopy(IRVar("x"), IRVar("l")), IRReturn(IRVar("l")), ctx=ctx)
+    assert body[-1] == IRReturn(IRVar("l"))
+
+
+def test_program_with_statics_calls_and_swaps_matches_gcc(run_c):
+    source = """
+static int counter = 0;
+int bump(void) {
+    counter = counter + 1;
+    return 0;
+}
+int main(void) {
+    counter = 5;
+    int saved = counter;
+    bump();
+    int after = counter;
+    int a = 1;
+    int b = 2;
+    for (int i = 0; i < 5; i = i + 1) {
+        int t = a;
+        a = b;
+        b = t;
+    }
+    return saved * 10 + after + a;
+}
+"""
+    assert run_c(source, "--propagate-copies") == run_c(source, gcc=True)
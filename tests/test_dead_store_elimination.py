@@ -0,0 +1,77 @@
+import signal
+
+import pytest
+
+from conftest import const, make_context, run_pass
+from src.ir_ast import *
+from src.optimizations.dead_store_elimination import eliminate_dead_stores
+
+
+def eliminate(*instructions, params = ()):
+    """Runs eliminate_dead_stores on instructions and returns the removed count and new body."""
+    ctx = make_context(ints="acrxy", statics=["s"], globals_=["g"])
+    return run_pass(eliminate_dead_stores, ctx, instructions, params)
+
+
+def test_overwritten_store_is_removed():
+    assert eliminate(IRCopy(const(1), IRVar("x")), IRCopy(const(2), IRVar("x")), IRReturn(IRVar("x"))) \
+        == (1, [IRCopy(const(2), IRVar("x")), IRReturn(IRVar("x"))])
+
+def test_store_never_read_is_removed():
+    assert eliminate(IRBinary(IRBinaryOperator.Add, IRVar("a"), const(1), IRVar("x")), IRReturn(const(0)),
+                     params=["a"]) == (1, [IRReturn(const(0))])
+
+def test_store_read_in_a_later_loop_iteration_is_kept():
+    loop = [
+        IRCopy(const(0), IRVar("x")),
+        IRLabel("loop"),
+        IRBinary(IRBinaryOperator.Add, IRVar("x"), const(1), IRVar("x")),
+        IRJumpIfNotZero(IRVar("c"), "loop"),
+        IRReturn(IRVar("x")),
+    ]
+    assert eliminate(*loop, params=["c"]) == (0, loop)
+
+@pytest.mark.parametrize("name", ["s", "g"])
+def test_stores_to_static_and_global_variables_are_kept(name):
+    body = [IRCopy(const(1), IRVar(name)), IRReturn(const(0))]
+    assert eliminate(*body) == (0, body)
+
+def test_call_with_a_dead_result_is_kept():
+    body = [IRFunCall("h", [], IRVar("r")), IRReturn(const(0))]
+    assert eliminate(*body) == (0, body)
+
+@pytest.mark.parametrize("divisor", [IRVar("a"), const(0), const(-1)])
+@pytest.mark.parametrize("operator", [IRBinaryOperator.Divide, IRBinaryOperator.Remainder])
+def test_dead_division_that_may_trap_is_kept(operator, divisor):
+    body = [IRBinary(operator, IRVar("a"), divisor, IRVar("x")), IRReturn(const(0))]
+    assert eliminate(*body, params=["a"]) == (0, body)
+
+def test_dead_division_by_a_safe_constant_is_removed():
+    assert eliminate(IRBinary(IRBinaryOperator.Divide, IRVar("a"), const(2), IRVar("x")), IRReturn(const(0)),
+                     params=["a"]) == (1, [IRReturn(const(0))])
+
+
+@pytest.mark.parametrize("flags", [("--eliminate-dead-stores",), ("-O2",)])
+def test_dead_division_by_zero_still_traps(run_c, flags):
+    source = "int main(void) { int zero = 0; int x = 1 / zero; return 0; }\n"
+    assert run_c(source, *flags) == -signal.SIGFPE
+
+def test_program_with_globals_and_calls_matches_gcc(run_c):
+    source = """
+int total = 0;
+static int calls;
+int record(int x) {
+    calls = calls + 1;
+    total = total + x;
+    return x;
+}
+int main(void) {
+    int unused = record(3);
+    int dead = 7;
+    dead = record(4) * 2;
+    total = total + 1;
+    return total * 10 + calls;
+}
+"""
+    assert run_c(source, "--eliminate-dead-stores") == run_c(source, gcc=True)
+    assert run_c(source, "-O2") == run_c(source, gcc=True)
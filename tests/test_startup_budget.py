@@ -0,0 +1,61 @@
+"""The compiler driver's start-up against an import time budget.
+
+Runs the driver under `python -X importtime` for each stage in BUDGETS and fails if the total
+import time, the best of REPEAT runs, exceeds the stage's budget, or if a module the stage must
+not load is imported at all. Set STARTUP_BUDGET_SCALE to multiply every budget on slow machines.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE = os.path.join(ROOT, "tests", "test.c")
+REPEAT = 5
+SCALE = float(os.environ.get("STARTUP_BUDGET_SCALE", "1"))
+
+# Modules no stage should import unless asked to: the CLI library is only for --help and
+# usage errors, logging only for --trace.
+ALWAYS_LAZY = ["click", "logging"]
+BACKEND = ["src.asm_generator", "src.asm_allocator", "src.code_emitter", "src.object_emitter"]
+MIDDLE_END = ["src.parser", "src.semantic_analysis.semantic_analyser", "src.emitter", "src.incremental"]
+CACHE_AND_JOBS = ["src.compile_cache", "concurrent.futures.process", "src.gcc_runner"]
+
+# Stage flag: (total import time budget in ms, modules that must not be imported).
+BUDGETS = {
+    "--lex":     (120, ALWAYS_LAZY + MIDDLE_END + BACKEND + CACHE_AND_JOBS),
+    "--parse":   (160, ALWAYS_LAZY + BACKEND + CACHE_AND_JOBS + ["src.emitter"]),
+    "--codegen": (280, ALWAYS_LAZY + CACHE_AND_JOBS + ["src.code_emitter", "src.object_emitter"]),
+}
+
+
+def import_times(stage):
+    """Runs the driver on SOURCE and returns {module: self import time in us}."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "src.compiler_driver", stage, SOURCE],
+                            cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(self_us)
+    return times
+
+@pytest.fixture(scope="module", params=list(BUDGETS))
+def stage_imports(request):
+    return request.param, [import_times(request.param) for _ in range(REPEAT)]
+
+def test_stage_imports_no_forbidden_modules(stage_imports):
+    stage, runs = stage_imports
+    _, forbidden = BUDGETS[stage]
+    assert [name for name in forbidden if name in runs[0]] == []
+
+def test_stage_import_time_within_budget(stage_imports):
+    stage, runs = stage_imports
+    budget, _ = BUDGETS[stage]
+    total = min(sum(times.values()) for times in runs) / 1000
+    slowest = sorted(runs[0].items(), key=lambda item: item[1], reverse=True)[:3]
+    assert total <= budget * SCALE, (f"{stage} spends {total:.1f} ms importing, over its budget of "
+                                     f"{budget * SCALE:.0f} ms; slowest: "
+                                     + ", ".join(f"{name} {us / 1000:.1f} ms" for name, us in slowest))